@@ -1,17 +1,29 @@
 import os
 import io
+import copy
 import time
 import datetime
 import platform
+import threading
 import logging
 import logging.config
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from enum import Enum
 from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json
 from PIL import Image, ImageDraw
 from pathlib import Path
+from typing import Iterator
+from noisseur.cache import LruCache, frame_hash, pixel_hash
+from noisseur.cfg import AppConfig
+from noisseur.deadline import Deadline
 from noisseur.hocr import HocrParser
+from noisseur.incremental import FrameState, IncrementalTracker
+from noisseur.model import ModelFactory
 from noisseur.ocr import OcrService, OcrFactory, OcrScreenData
+from noisseur.reloader import ReloaderFactory
+from noisseur.worker import OcrWorkerPool, QueueFullError, warmup_task
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +38,9 @@ class GetScreenDataResponse:
     errors: list[str] = None
     type: str = None
     data: dict = None
+    stats: dict = None
+    timed_out: bool = False  # deadline expired, data is partial
+    model_version: str = None
 
     def add_error(self, s: str):
         if not self.errors:
@@ -33,34 +48,272 @@ class GetScreenDataResponse:
         self.errors.append(s)
 
 
+def ocr_screen_task(image: bytes, path: str, incremental: bool, prev: FrameState,
+                    deadline: Deadline = None) -> tuple:
+    """OCR screen task executed in request thread or OCR worker, returns
+    (OcrScreenData, FrameState) tuple, state is None for non-incremental
+    processing. Image is encoded data or already decoded PIL image.
+    Models are not changed by reload during the task.
+    """
+    svc: OcrService = OcrFactory.get_service()
+    frame = image if image else path
+    with ModelFactory.snapshot():
+        if not incremental:
+            osd = svc.ocr_screen(frame, ApiService.SCREEN_CHAIN, ApiService.SCREEN_SCALE,
+                                 ApiService.SCREEN_BORDER, deadline=deadline)
+            return osd, None
+
+        return svc.ocr_screen_incremental(frame, ApiService.SCREEN_CHAIN,
+                                          ApiService.SCREEN_SCALE,
+                                          ApiService.SCREEN_BORDER, prev, deadline)
+
+
 class ApiService:
 
+    #: screen preprocessing chain, scale and border used by get_screen_data
+    SCREEN_CHAIN: str = "prisma(3,30)"  # "scale(3.0,nearest)|bw|border(30)"
+    SCREEN_SCALE: float = 3.0
+    SCREEN_BORDER: int = 0
+
+    WARMUP_PENDING: str = "pending"
+    WARMUP_RUNNING: str = "running"
+    WARMUP_READY: str = "ready"
+    WARMUP_FAILED: str = "failed"
+
     def __init__(self):
         logger.debug("ApiService()")
+        cfg = AppConfig.instance
+        self.cache = LruCache(cfg.CACHE_MAX_ENTRIES, cfg.CACHE_MAX_BYTES,
+                              cfg.CACHE_TTL_SEC)
+        self.frames = IncrementalTracker(cfg.INCREMENTAL_MAX_SOURCES)
+        # results and frame states of previous configuration and models
+        ReloaderFactory.get_reloader().listeners += [self.cache.clear, self.frames.clear]
+        warmup = None
+        if cfg.WARMUP_ENABLED:
+            warmup = (self.SCREEN_CHAIN, self.SCREEN_SCALE, self.SCREEN_BORDER)
+        self.pool = None
+        if cfg.WORKER_POOL_SIZE > 0:
+            self.pool = OcrWorkerPool(cfg.WORKER_POOL_TYPE, cfg.WORKER_POOL_SIZE,
+                                      cfg.WORKER_QUEUE_SIZE, warmup)
+        self.warmup_state = self.WARMUP_PENDING if warmup else self.WARMUP_READY
+        self.warmup_info = {}
+        self._warmup_lock = threading.Lock()
+
+    def get_stats(self) -> dict:
+        return {
+            "cache": self.cache.stats(),
+            "incremental": self.frames.stats(),
+            "workers": self.pool.stats() if self.pool else None,
+            "warmup": self.get_warmup_status(),
+            "models": ReloaderFactory.get_reloader().stats()
+        }
 
-    def get_screen_data(self, image: bytes, path: str) -> GetScreenDataResponse:
-        res: GetScreenDataResponse = GetScreenDataResponse(None, None, None, False, None, None, None)
+    @property
+    def ready(self) -> bool:
+        return self.warmup_state == self.WARMUP_READY
+
+    def get_warmup_status(self) -> dict:
+        return {"ready": self.ready, "state": self.warmup_state, **self.warmup_info}
+
+    def start_warmup(self) -> None:
+        """Starts warm-up in background thread, server is ready when it
+        is done, see warmup.
+        """
+        with self._warmup_lock:
+            if self.warmup_state != self.WARMUP_PENDING:
+                return
+            self.warmup_state = self.WARMUP_RUNNING
+        threading.Thread(target=self.warmup, name="warmup", daemon=True).start()
+
+    def warmup(self) -> None:
+        """Runs full pipeline over each model image in every OCR worker
+        process (or in this process without process pool), see
+        OcrWorkerPool.warmup. Warm-up is failed and server is not ready
+        when any process or model failed.
+        """
+        self.warmup_state = self.WARMUP_RUNNING
         dt = time.time()
-        ts = str(datetime.datetime.now())
+        try:
+            if self.pool:
+                results = self.pool.warmup()
+            else:
+                results = [warmup_task(self.SCREEN_CHAIN, self.SCREEN_SCALE,
+                                       self.SCREEN_BORDER)]
+            errors = [f"{pid} {r['model']}: {r['error']}"
+                      for pid, models in results for r in models if r.get("error")]
+            self.warmup_info = {
+                "dt_ms": int((time.time() - dt) * 1000),
+                "processes": len(results),
+                "models": results[0][1]
+            }
+            if errors:
+                self.warmup_info["errors"] = errors
+                self.warmup_state = self.WARMUP_FAILED
+                logger.error(f"warm-up failed: {str(self.warmup_info)}")
+                return
+            self.warmup_state = self.WARMUP_READY
+            logger.info(f"warm-up done: {str(self.warmup_info)}")
+        except Exception as ex:
+            logger.error(f"warm-up failed: {str(ex)}")
+            self.warmup_info = {"dt_ms": int((time.time() - dt) * 1000),
+                                "error": str(ex)}
+            self.warmup_state = self.WARMUP_FAILED
+
+    def busy_response(self, ex: QueueFullError) -> GetScreenDataResponse:
+        res: GetScreenDataResponse = GetScreenDataResponse(platform.node(),
+                                                           str(datetime.datetime.now()))
+        res.add_error(f"Server busy: {str(ex)}")
+        return res
+
+    def ocr_screen(self, image: bytes, path: str, source: str = None,
+                   deadline: Deadline = None,
+                   frame: Image.Image = None) -> OcrScreenData:
+        """Runs OcrService.ocr_screen, or incremental OCR against previous
+        frame when frame source is specified. OCR is executed in worker
+        pool when configured, QueueFullError is raised when it is busy.
+        With deadline worker result is awaited at most DEADLINE_GRACE_MS
+        after it, empty timed out result is returned then. Already decoded
+        frame is used instead of image, except in worker processes.
+        """
+        prev: FrameState = self.frames.get(source) if source else None
+        image = self._task_frame(image, frame)
+        if self.pool:
+            future = self.pool.submit(ocr_screen_task, image, path, bool(source), prev,
+                                      deadline)
+            timeout = None
+            if deadline:
+                grace = AppConfig.instance.DEADLINE_GRACE_MS / 1000.0
+                timeout = max(0.0, deadline.remaining()) + grace
+            try:
+                (osd, state), wait_ms = future.result(timeout)
+                osd.stats["queue_wait_ms"] = wait_ms
+            except FutureTimeoutError:
+                # worker finishes in background, its result is dropped
+                osd = OcrScreenData(platform.node(), str(datetime.datetime.now()),
+                                    stats={})
+                osd.set_timed_out("queue")
+                osd.add_error("Deadline exceeded")
+                state = None
+        else:
+            osd, state = ocr_screen_task(image, path, bool(source), prev, deadline)
+
+        if source:
+            self.frames.put(source, state)
+        return osd
+
+    def _task_frame(self, image: bytes, frame: Image.Image):
+        # encoded image is smaller to pass to worker process than pixels
+        processes = self.pool and self.pool.pool_type == OcrWorkerPool.TYPE_PROCESS
+        if frame is None or processes:
+            return image
+        return frame
+
+    def _cache_lookup(self, image: bytes, path: str, version: str) -> tuple:
+        """Looks result up by raw frame bytes key first and by decoded
+        pixels key on miss, returns (keys, frame, OcrScreenData) tuple,
+        result is None on miss. Frame is decoded only when raw key misses
+        and it is returned so that OCR reuses the same decode.
+        """
+        if not self.cache.enabled:
+            return [], None, None
+
+        args = (self.SCREEN_CHAIN, self.SCREEN_SCALE, self.SCREEN_BORDER,
+                ModelFactory.get_config().digest(), version)
+        keys = [frame_hash(image if image else path, *args)]
+        osd: OcrScreenData = self._cache_get(keys[0])
+        if osd:
+            return keys, None, osd
+
+        frame = Image.open(io.BytesIO(image) if image else path)
+        frame.load()
+        keys.append(pixel_hash(frame, *args))
+        osd = self._cache_get(keys[1])
+        if osd:
+            # the same pixels in other encoding, raw key hits next time
+            self.cache.put(keys[0], copy.deepcopy(osd), len(osd.to_json()))
+        return keys, frame, osd
+
+    def _cache_get(self, key: str) -> OcrScreenData:
+        osd: OcrScreenData = self.cache.get(key) if key else None
+        if osd:
+            osd = copy.deepcopy(osd)
+            osd.ts = str(datetime.datetime.now())
+            osd.dt_ms = 0
+            if osd.stats is None:
+                osd.stats = {}
+            osd.stats["cache"] = "hit"
+        return osd
+
+    def _cache_put(self, keys: list, osd: OcrScreenData, version: str) -> None:
+        # models reloaded before OCR started, result doesn't belong to keys
+        if keys and osd and osd.model_version == version:
+            if osd.stats is None:
+                osd.stats = {}
+            osd.stats["cache"] = "miss"
+            # entries are never modified, copies are returned on hit
+            value = copy.deepcopy(osd)
+            size = len(osd.to_json())
+            for key in keys:
+                self.cache.put(key, value, size)
+
+    def ocr_screen_cached(self, image: bytes, path: str, source: str = None,
+                          deadline: Deadline = None) -> OcrScreenData:
+        """Runs ocr_screen with result cache keyed by raw frame bytes or
+        decoded pixel data, preprocessing, configuration digest and model
+        set version, partial (timed out) results are not cached. Cache is
+        cleared on reload.
+        """
+        version = ModelFactory.get_service().version
+        keys, frame, osd = self._cache_lookup(image, path, version)
+        if osd:
+            return osd
+
+        osd = self.ocr_screen(image, path, source, deadline, frame)
+        if not osd.timed_out:
+            self._cache_put(keys, osd, version)
+        return osd
+
+    @staticmethod
+    def _fill_response(res: GetScreenDataResponse, osd: OcrScreenData) -> None:
+        if osd:
+            res.host = osd.host
+            res.ts = osd.ts
+            res.dt_ms = osd.dt_ms
+            res.success = osd.success
+            res.timed_out = osd.timed_out
+            res.errors = osd.errors
+            res.type = osd.type
+            res.data = osd.data
+            res.stats = osd.stats
+            if osd.model_version:
+                res.model_version = osd.model_version
+
+    def get_screen_data(self, image: bytes, path: str, source: str = None,
+                        deadline_ms: int = None) -> GetScreenDataResponse:
+        """Recognizes screen, deadline_ms is latency budget of this call
+        (DEADLINE_MS when None, no deadline when 0), when it expires partial
+        result is returned with timed_out set.
+        """
+        res: GetScreenDataResponse = GetScreenDataResponse(None, None, None, False,
+                                                           None, None, None)
+        dt = time.time()
+        if deadline_ms is None:
+            deadline_ms = AppConfig.instance.DEADLINE_MS
+        deadline: Deadline = Deadline.after_ms(deadline_ms)
 
         try:
             if not image and not path:
                 raise Exception("No input data specified (image or path)")
 
-            res2: OcrScreenData = OcrFactory.get_service().ocr_screen(
-                image if image else path,
-                # "scale(3.0,nearest)|bw|border(30)",
-                "prisma(3,30)",
-                3.0, 0
-            )
-            if res2:
-                res.host = res2.host
-                res.ts = res2.ts
-                res.dt_ms = res2.dt_ms
-                res.success = res2.success
-                res.errors = res2.errors
-                res.type = res2.type
-                res.data = res2.data
+            # cache key and inline OCR use the same model set
+            with ModelFactory.snapshot() as models:
+                res.model_version = models.version
+                res2: OcrScreenData = self.ocr_screen_cached(image, path, source,
+                                                             deadline)
+            self._fill_response(res, res2)
+
+        except QueueFullError:
+            raise
 
         except BaseException as e:
             res.add_error(f"System error: {str(e)}")
@@ -71,9 +324,83 @@ class ApiService:
 
         return res
 
+    def _submit_batch_item(self, image: bytes, path: str, version: str) -> Future:
+        """Starts processing of one batch item, returned future result is
+        GetScreenDataResponse. Cache hits and inline OCR (no worker pool)
+        complete immediately, otherwise submission waits for a free worker
+        queue slot.
+        """
+        future = Future()
+        dt = time.time()
+
+        def finish(osd: OcrScreenData = None, error: Exception = None):
+            res: GetScreenDataResponse = GetScreenDataResponse(None, None, None, False,
+                                                               None, None, None)
+            res.model_version = version
+            self._fill_response(res, osd)
+            if error:
+                res.add_error(f"System error: {str(error)}")
+            res.host = platform.node()
+            res.dt_ms = int((time.time() - dt) * 1000)
+            future.set_result(res)
+
+        try:
+            if not image and not path:
+                raise Exception("No input data specified (image or path)")
+
+            keys, frame, osd = self._cache_lookup(image, path, version)
+            image = self._task_frame(image, frame)
+            if osd:
+                finish(osd)
+            elif not self.pool:
+                osd, _ = ocr_screen_task(image, path, False, None)
+                self._cache_put(keys, osd, version)
+                finish(osd)
+            else:
+                def done(f):
+                    try:
+                        (osd2, _), wait_ms = f.result()
+                        osd2.stats["queue_wait_ms"] = wait_ms
+                        self._cache_put(keys, osd2, version)
+                        finish(osd2)
+                    except Exception as e:
+                        finish(error=e)
+
+                task = self.pool.submit(ocr_screen_task, image, path, False, None,
+                                        block=True)
+                task.add_done_callback(done)
+
+        except Exception as e:
+            finish(error=e)
+
+        return future
+
+    def get_screen_data_batch(self, items: list) -> Iterator[GetScreenDataResponse]:
+        """Processes list of (image, path) items, OCR is fanned out over
+        worker pool and responses are yielded in input order as soon as
+        each of them and all previous ones are done. Cache lookups use
+        model set version resolved once for the whole batch, each response
+        carries model_version its OCR was actually done with.
+        """
+        version = ModelFactory.get_service().version
+        pending = deque()  # Future[GetScreenDataResponse]
+        for image, path in items:
+            pending.append(self._submit_batch_item(image, path, version))
+            while pending and pending[0].done():
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 
 class ApiFactory:
+    __api_service = None
+    __lock = threading.Lock()
 
     @staticmethod
     def get_service() -> ApiService:
-        return ApiService()
+        if not ApiFactory.__api_service:
+            # the only instance owns worker pool and warm-up thread
+            with ApiFactory.__lock:
+                if not ApiFactory.__api_service:
+                    ApiFactory.__api_service = ApiService()
+        return ApiFactory.__api_service
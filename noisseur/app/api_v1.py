@@ -1,13 +1,15 @@
 import logging
 import os
 import io
+import json
 from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json
 from flask import Flask, render_template, make_response, \
-    jsonify, request, Markup, Blueprint
+    jsonify, request, Markup, Blueprint, Response, stream_with_context
 from flask_restx import Api, Resource, fields, reqparse
 from werkzeug.datastructures import FileStorage
 from noisseur.api import ApiService, ApiFactory, GetScreenDataResponse
+from noisseur.worker import QueueFullError
 from noisseur.cfg import AppConfig
 
 logger = logging.getLogger(__name__)
@@ -58,12 +60,27 @@ get_screen_data_model = api.model(
         "success": fields.Boolean(description="True on success, otherwise False"),
         "errors": fields.List(fields.String, description="List of errors if any"),
         "type": fields.String(description="Recognized screen model type"),
-        "data": fields.Raw(description="Recognized Siemens console data in JSON format")
+        "data": fields.Raw(description="Recognized Siemens console data in JSON format"),
+        "stats": fields.Raw(description="Processing statistics, e.g. which path was "
+                                        "used to detect model"),
+        "timed_out": fields.Boolean(description="True when deadline expired and data is "
+                                                "partial"),
+        "model_version": fields.String(description="Version of model set screen was "
+                                                   "recognized with")
     }
 )
 get_screen_data_parser = api.parser()
 get_screen_data_parser.add_argument("path", type=str, help="Image PNG local path absolute or relative to project root")
 get_screen_data_parser.add_argument('screen', location='files', type=FileStorage)
+get_screen_data_parser.add_argument("source", type=str,
+                                    help="Optional frame source ID (e.g. console name), "
+                                         "enables incremental OCR of changed regions "
+                                         "against previous frame of the same source")
+get_screen_data_parser.add_argument("deadline_ms", type=int,
+                                    help="Optional latency budget in ms (default "
+                                         "DEADLINE_MS, 0 - no deadline), partial data "
+                                         "is returned with timed_out=true when it "
+                                         "expires")
 
 
 @ns.route("/get_screen_data")
@@ -91,16 +108,112 @@ class GetScreenDataAction(Resource):
             b.seek(0)
             image = b.read()
 
-        res = ApiFactory.get_service().get_screen_data(image, path)
+        source = args["source"]
+        logger.debug(f"source={source}")
+
+        svc: ApiService = ApiFactory.get_service()
+        try:
+            res = svc.get_screen_data(image, path, source, args["deadline_ms"])
+        except QueueFullError as ex:
+            logger.warning(f"get_screen_data rejected: {str(ex)}")
+            return svc.busy_response(ex), 503
         return res
 
-    @api.doc(parser=get_screen_data_parser, description="Recognize and parse Siemens console screen")
+    @api.doc(parser=get_screen_data_parser,
+             description="Recognize and parse Siemens console screen",
+             responses={503: "OCR worker queue is full, retry later"})
     @api.marshal_with(get_screen_data_model)
     def get(self):
         return self.execute()
 
-    @api.doc(parser=get_screen_data_parser, description="Recognize and parse Siemens console screen")
+    @api.doc(parser=get_screen_data_parser,
+             description="Recognize and parse Siemens console screen",
+             responses={503: "OCR worker queue is full, retry later"})
     @api.marshal_with(get_screen_data_model)
     def post(self):
         return self.execute()
 
+
+@ns.route("/ready")
+class ReadyAction(Resource):
+    """Readiness probe action"""
+
+    @api.doc(description="Readiness probe, OK once startup warm-up (OCR of each model "
+                         "image in every OCR worker) is done",
+             responses={503: "Warm-up is running or failed"})
+    def get(self):
+        svc: ApiService = ApiFactory.get_service()
+        return svc.get_warmup_status(), 200 if svc.ready else 503
+
+
+@ns.route("/stats")
+class StatsAction(Resource):
+    """Service statistics action"""
+
+    @api.doc(description="Service statistics, e.g. result cache hit/miss/eviction "
+                         "counters, OCR worker queue depth and wait time, model set "
+                         "version and reloads")
+    def get(self):
+        logger.debug("stats()")
+        return ApiFactory.get_service().get_stats()
+
+
+get_screen_data_batch_parser = api.parser()
+get_screen_data_batch_parser.add_argument("paths", type=str, action="append",
+                                          help="Image PNG local paths absolute or "
+                                               "relative to project root")
+get_screen_data_batch_parser.add_argument("screens", location="files", type=FileStorage,
+                                          action="append")
+
+
+@ns.route("/get_screen_data_batch")
+class GetScreenDataBatchAction(Resource):
+    """Get screen data for multiple screens action"""
+
+    @api.doc(parser=get_screen_data_batch_parser,
+             description="Recognize and parse multiple Siemens console screens. "
+                         "Results are streamed as JSON Lines (application/x-ndjson), "
+                         "uploaded screens first then paths, each in its request order. "
+                         "Each line is GetScreenDataResponse with additional index "
+                         "(line number), field (screens or paths), field_index "
+                         "(position among values of that field in request) and name",
+             responses={400: "No screens specified or too many screens"})
+    def post(self):
+        logger.debug("get_screen_data_batch()")
+
+        args = get_screen_data_batch_parser.parse_args()
+
+        # multipart form values and files are parsed apart, so their mutual
+        # order is lost, each result refers to its field value instead
+        items = []  # (field, field index, name, image, path)
+        for i, screen in enumerate(args["screens"] or []):
+            b = io.BytesIO()
+            screen.save(b)
+            b.seek(0)
+            items.append(("screens", i, screen.filename, b.read(), None))
+
+        for i, path in enumerate(args["paths"] or []):
+            name = path
+            if path and not os.path.exists(path):
+                path = os.path.join(AppConfig.instance.ROOT_PATH, path)
+            items.append(("paths", i, name, None, path))
+
+        logger.debug(f"items count={len(items)}")
+        if not items:
+            api.abort(400, "No screens specified (screens or paths)")
+        max_size = AppConfig.instance.BATCH_MAX_SIZE
+        if 0 < max_size < len(items):
+            api.abort(400, f"Too many screens: {len(items)}, max is {max_size}")
+
+        svc: ApiService = ApiFactory.get_service()
+
+        def generate():
+            results = svc.get_screen_data_batch([item[3:] for item in items])
+            for index, res in enumerate(results):
+                kind, field_index, name = items[index][:3]
+                d = {"index": index, "field": kind, "field_index": field_index,
+                     "name": name}
+                d.update(res.to_dict())
+                yield json.dumps(d) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
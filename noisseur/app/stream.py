@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+
+from flask import Blueprint, request
+from flask_sock import Sock
+
+from noisseur.cfg import AppConfig
+from noisseur.stream import StreamSession
+
+logger = logging.getLogger(__name__)
+logger.debug("name=" + __name__)
+
+stream_bp = Blueprint('stream_bp', __name__)
+sock = Sock()
+
+
+def parse_frame(message) -> tuple:
+    """Converts WebSocket message to (image, path, command) tuple, binary
+    message is encoded image, text message is JSON object either with
+    "path" (image local path absolute or relative to project root) or
+    with "cmd" command. ValueError is raised for any other message.
+    """
+    if isinstance(message, bytes):
+        return message, None, None
+
+    d = json.loads(message)
+    if not isinstance(d, dict):
+        raise ValueError(f"JSON object expected, got {type(d).__name__}")
+    path = d.get("path")
+    if path is not None and not isinstance(path, str):
+        raise ValueError(f"path must be string, got {type(path).__name__}")
+    if path and not os.path.exists(path):
+        path = os.path.join(AppConfig.instance.ROOT_PATH, path)
+    return None, path, d.get("cmd")
+
+
+@sock.route('/stream', bp=stream_bp)
+def stream(ws):
+    """Frame stream ingestion, e.g. ws://localhost:5050/api/1/stream?source=console1
+
+    Client sends frames (binary PNG or {"path": ...} JSON text) at any rate,
+    server replies with JSON text events: "open" once, then "change" only
+    when recognized screen type or data differs from previous event, and
+    "stats" on {"cmd": "stats"} request. When OCR is slower than frame
+    rate only the latest pending frame is processed. Optional deadline_ms
+    is latency budget of each frame (DEADLINE_MS when not specified, no
+    deadline when 0).
+    """
+    session = StreamSession(request.args.get("source"),
+                            request.args.get("deadline_ms", type=int))
+    logger.info(f"[{session.source}] stream opened")
+    ws.send(json.dumps(session.open_event()))
+
+    try:
+        while True:
+            frame = None
+            message = ws.receive()
+            while message is not None:
+                try:
+                    image, path, cmd = parse_frame(message)
+                except ValueError as ex:
+                    logger.warning(f"[{session.source}] invalid message ignored: "
+                                   f"{str(ex)}")
+                    image, path, cmd = None, None, None
+                if cmd == "stats":
+                    ws.send(json.dumps(session.stats_event()))
+                elif image or path:
+                    if frame:
+                        session.drop()
+                    frame = (image, path)
+                # coalesce frames queued while previous one was processed
+                message = ws.receive(timeout=0)
+
+            if frame:
+                event = session.process(*frame)
+                if event:
+                    ws.send(json.dumps(event))
+    finally:
+        logger.info(f"[{session.source}] stream closed: {str(session.stats())}")
@@ -11,6 +11,7 @@ from noisseur.ocr import OcrService, OcrFactory
 from noisseur.imgproc import ImageProcessor
 from noisseur.model import ModelService, ModelFactory
 from noisseur.model_prototype import generate_models
+from noisseur.reloader import ReloaderFactory
 
 
 from flask import render_template, make_response, \
@@ -72,8 +73,8 @@ def imgproc_chain():
 def model_generate():
     logger.debug("model_generate")
     generate_models()
-    ModelFactory.reload()
-    return response_ok("Done", "text/plain")
+    svc = ReloaderFactory.get_reloader().reload()
+    return response_ok(f"Done, version: {svc.version}", "text/plain")
 
 
 @test_bp.route('/model_visualize', methods=['GET', 'POST'])
@@ -116,7 +117,7 @@ def ocr_hocr():
     logger.debug(f"chain={chain}")
     t = OcrFactory.get_service()
     dt = time.time()
-    doc = t.ocr_hocr(path2, chain)
+    doc = t.ocr_hocr(path2, chain, OcrService.OUTPUT_FORMAT_HOCR)
     dt = int((time.time() - dt)*1000)
     logger.debug("dt={}ms".format(dt))
     text = "\n".join([line.text for line in doc.lines])
@@ -134,7 +135,7 @@ def ocr_hocr_visualize():
     path2 = os.path.join(AppConfig.instance.ROOT_PATH, path);
     logger.debug(f"path2={path2}")
     t = OcrFactory.get_service()
-    doc = t.ocr_hocr(path2, chain)
+    doc = t.ocr_hocr(path2, chain, OcrService.OUTPUT_FORMAT_HOCR)
     data = t.hocr_visualize_as_png(path2, chain, doc)
     return response_ok(data, "image/png")
 
@@ -172,9 +173,16 @@ def ocr_screen():
     logger.debug(f"scale={scale}")
     border = int(request.form["border"])
     logger.debug(f"border={border}")
+    caption_mode = request.form.get("caption_mode")
+    logger.debug(f"caption_mode={caption_mode}")
+    extract_mode = request.form.get("extract_mode")
+    logger.debug(f"extract_mode={extract_mode}")
+    output_format = request.form.get("output_format")
+    logger.debug(f"output_format={output_format}")
     t = OcrFactory.get_service()
     dt = time.time()
-    data = t.ocr_screen(path2, chain, scale, border)
+    data = t.ocr_screen(path2, chain, scale, border, caption_mode, extract_mode,
+                        output_format)
     dt = int((time.time() - dt)*1000)
     logger.debug("dt={}ms".format(dt))
     # res = json.dumps(data, indent=4) + "\n\n##############################\n\ndt={}ms".format(dt)
@@ -217,7 +225,6 @@ def test_font():
 
     pixels = [pixels[i * width:(i + 1) * width] for i in range(height)]
 
-    
     for idx, y in enumerate(pixels):
         if y[200] == (0, 0, 128):
             logger.debug("Line {} is white.".format(idx))
@@ -251,5 +258,3 @@ def vips_version():
     logger.debug("vips_version")
     p = ImageProcessor()
     return response_ok(p.vips_version(), "text/plain")
-
-
@@ -0,0 +1,143 @@
+import datetime
+import hashlib
+import json
+import logging
+import logging.config
+import mmap
+import os
+import pickle
+import struct
+
+logger = logging.getLogger(__name__)
+
+
+class ModelBundle:
+    """Compiled model registry file, object pickled (protocol 5) with NumPy
+    arrays stored out-of-band, so they are memory mapped on load instead
+    of copied. Header lists inputs (MODEL_LIST entries) and SHA-1 of every
+    source file (models and reference images), bundle is stale when any of
+    them or schema (code of pickled classes) changed.
+
+    File layout: MAGIC, header offset and length (little endian uint64),
+    buffers aligned to ALIGN bytes, pickled payload, JSON header.
+
+    Unpickling runs code named by the payload, bundle is trusted as much as
+    the service code, it must be writable only by the service owner. Payload
+    SHA-1 in header is verified before unpickling, it rejects truncated or
+    corrupted files, not forged ones.
+    """
+    MAGIC: bytes = b"NOISSEUR"
+    #: bundle file format version
+    FORMAT: int = 2
+    #: out-of-band buffers alignment in bytes
+    ALIGN: int = 64
+
+    def __init__(self, path: str, root: str):
+        self.path = path  # bundle file path
+        self.root = root  # root path of relative inputs and sources
+
+    def digest(self, source: str) -> str:
+        """Returns SHA-1 of source file content, None if it doesn't exist."""
+        path = os.path.join(self.root, source)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def write(self, obj, inputs: list, sources: list, schema: str) -> dict:
+        """Writes obj to bundle file atomically, returns header."""
+        buffers = []
+        payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        header = {
+            "format": ModelBundle.FORMAT,
+            "schema": schema,
+            "created": str(datetime.datetime.now()),
+            "inputs": list(inputs),
+            "sources": {source: self.digest(source) for source in sources},
+            "buffers": [],
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(ModelBundle.MAGIC + struct.pack("<QQ", 0, 0))
+            for buffer in buffers:
+                data = buffer.raw()
+                f.write(b"\0" * (-f.tell() % ModelBundle.ALIGN))
+                header["buffers"].append([f.tell(), data.nbytes])
+                f.write(data)
+            header["payload"] = [f.tell(), len(payload)]
+            header["payload_sha1"] = hashlib.sha1(payload).hexdigest()
+            f.write(payload)
+            s = json.dumps(header, indent=1).encode("utf-8")
+            offset = f.tell()
+            f.write(s)
+            f.seek(len(ModelBundle.MAGIC))
+            f.write(struct.pack("<QQ", offset, len(s)))
+        os.replace(tmp, self.path)
+        return header
+
+    def read_header(self, mm) -> dict:
+        n = len(ModelBundle.MAGIC)
+        if mm[:n] != ModelBundle.MAGIC:
+            raise ValueError("not a model bundle")
+        offset, length = struct.unpack("<QQ", mm[n:n + 16])
+        return json.loads(mm[offset:offset + length].decode("utf-8"))
+
+    def stale_reason(self, header: dict, inputs: list, schema: str) -> str:
+        """Returns why bundle can't be used instead of inputs, None if it
+        is up to date.
+        """
+        if header.get("format") != ModelBundle.FORMAT:
+            return f"format {header.get('format')} != {ModelBundle.FORMAT}"
+        if header.get("schema") != schema:
+            return "schema changed"
+        if header.get("inputs") != list(inputs):
+            return "inputs changed"
+        for source, digest in header.get("sources", {}).items():
+            if self.digest(source) != digest:
+                return f"source changed: {source}"
+        return None
+
+    def load(self, inputs: list, schema: str):
+        """Returns object of up to date bundle, None if bundle doesn't exist,
+        is invalid or stale. Memory map stays open while arrays of returned
+        object use it, otherwise it is closed.
+        """
+        if not os.path.exists(self.path):
+            logger.info(f"model bundle not found: {self.path}")
+            return None
+        mm = None
+        views = []
+        try:
+            with open(self.path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            header = self.read_header(mm)
+            reason = self.stale_reason(header, inputs, schema)
+            if reason:
+                logger.warning(f"model bundle is stale ({reason}), recompile it: "
+                               f"{self.path}")
+                self.close(mm, views)
+                return None
+            offset, length = header["payload"]
+            digest = hashlib.sha1(mm[offset:offset + length]).hexdigest()
+            if digest != header.get("payload_sha1"):
+                raise ValueError("payload digest mismatch")
+            view = memoryview(mm)
+            views.append(view)
+            views.extend(view[start:start + size] for start, size in header["buffers"])
+            views.append(view[offset:offset + length])
+            return pickle.loads(views[-1], buffers=views[1:-1])
+        except Exception as ex:
+            logger.warning(f"model bundle is not loaded: {self.path}, {str(ex)}")
+            self.close(mm, views)
+            return None
+
+    @staticmethod
+    def close(mm: mmap.mmap, views: list) -> None:
+        """Releases views and closes memory map of bundle not loaded."""
+        try:
+            for view in reversed(views):
+                view.release()
+            if mm:
+                mm.close()
+        except BufferError:
+            pass  # used by partially unpickled arrays, closed when they are collected
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import logging.config
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class LruCache:
+    """Thread safe LRU cache bounded by entry count and total size in
+    bytes, entries expire after TTL seconds.
+    """
+
+    class Entry:
+        def __init__(self, value, size: int, expires: float):
+            self.value = value
+            self.size = size        # int
+            self.expires = expires  # float, time.monotonic() based
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_sec: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._entries = OrderedDict()  # key -> Entry
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            e = self._entries.get(key)
+            if not e:
+                self.misses += 1
+                return None
+
+            if e.expires < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return e.value
+
+    def put(self, key, value, size: int) -> None:
+        if not self.enabled:
+            return
+
+        if self.max_bytes and size > self.max_bytes:
+            logger.debug(f"cache entry is too large: {size}")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            expires = time.monotonic() + self.ttl_sec
+            self._entries[key] = LruCache.Entry(value, size, expires)
+            self._bytes += size
+
+            while self._entries and self._full():
+                key2 = next(iter(self._entries))
+                self._remove(key2)
+                self.evictions += 1
+
+    def _full(self) -> bool:
+        return len(self._entries) > self.max_entries or 0 < self.max_bytes < self._bytes
+
+    def _remove(self, key) -> None:
+        e = self._entries.pop(key)
+        self._bytes -= e.size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+def frame_hash(pathOrData, *args) -> str:
+    """Content hash of raw (encoded) frame bytes plus any additional
+    arguments (e.g. preprocessing chain, model set version). Frame is not
+    decoded, so the key is cheap for every request including cache hits,
+    see pixel_hash for key shared by different encodings.
+    """
+    if isinstance(pathOrData, bytes):
+        data = pathOrData
+    else:
+        with open(pathOrData, "rb") as f:
+            data = f.read()
+
+    h = hashlib.blake2b(digest_size=20)
+    h.update(b"raw|")
+    h.update(data)
+    return _hash_args(h, args)
+
+
+def pixel_hash(image: Image.Image, *args) -> str:
+    """Content hash of decoded image pixels plus any additional
+    arguments, so frames with the same pixels but different encoding
+    share the same key.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{image.mode}|{image.width}x{image.height}|".encode("utf-8"))
+    h.update(image.tobytes())
+    return _hash_args(h, args)
+
+
+def _hash_args(h, args) -> str:
+    for arg in args:
+        h.update(f"|{str(arg)}".encode("utf-8"))
+    return h.hexdigest()
@@ -1,4 +1,5 @@
 import configparser
+import hashlib
 import logging
 import platform
 from pathlib import Path
@@ -87,6 +88,12 @@ class AppConfig:
             self._cache[key] = self._config.get(section, name)
         return self._cache[key]
 
+    def _getFloat(self, section, name) -> float:
+        key = f'{section}|{name}'
+        if not (key in self._cache):
+            self._cache[key] = float(self._config.get(section, name))
+        return self._cache[key]
+
     def _getInt(self, section, name) -> int:
         key = f'{section}|{name}'
         if not (key in self._cache):
@@ -99,6 +106,15 @@ class AppConfig:
     def initialized(self):
         return self._initialized
 
+    def digest(self) -> str:
+        """Returns hash of all loaded configuration values."""
+        key = "digest"
+        if not (key in self._cache):
+            items = [(section, sorted(self._config.items(section)))
+                     for section in self._config.sections()]
+            self._cache[key] = hashlib.sha1(repr(items).encode("utf-8")).hexdigest()[:12]
+        return self._cache[key]
+
     def load(self, paths, files):
         self._config = configparser.RawConfigParser()
         self._initialized = True
@@ -126,6 +142,83 @@ class AppConfig:
     def ROOT_PATH(self):
         return self._rootPath
 
+    @property
+    def INI_PATHS(self) -> list:
+        # configuration files merged in order, later ones override
+        noisseur_ini = 'noisseur.ini'
+        return [
+            self.ROOT_PATH + '/' + noisseur_ini,
+            self.HOST_CONFIG_PATH + '/' + noisseur_ini
+        ]
+
+    @property
+    def EXTRACT_MODE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "EXTRACT_MODE")
+
+    @property
+    def ADAPTIVE_CHAIN(self):
+        return self._getStr(self.SECTION_NOISSEUR, "ADAPTIVE_CHAIN")
+
+    @property
+    def MODEL_BUNDLE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "MODEL_BUNDLE")
+
+    @property
+    def RELOAD_INTERVAL_SEC(self):
+        return self._getFloat(self.SECTION_NOISSEUR, "RELOAD_INTERVAL_SEC")
+
+    @property
+    def MODEL_SCALES(self):
+        return self._getListStr(self.SECTION_NOISSEUR, "MODEL_SCALES")
+
+    @property
+    def ADAPTIVE_SCALES(self):
+        return self._getListStr(self.SECTION_NOISSEUR, "ADAPTIVE_SCALES")
+
+    @property
+    def REFINE_MODE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "REFINE_MODE")
+
+    @property
+    def REFINE_MAX_WORDS(self):
+        return self._getInt(self.SECTION_NOISSEUR, "REFINE_MAX_WORDS")
+
+    @property
+    def REFINE_PSM(self):
+        return self._getInt(self.SECTION_NOISSEUR, "REFINE_PSM")
+
+    @property
+    def REFINE_SCALE(self):
+        return self._getFloat(self.SECTION_NOISSEUR, "REFINE_SCALE")
+
+    @property
+    def HOCR_PARSER(self):
+        return self._getStr(self.SECTION_NOISSEUR, "HOCR_PARSER")
+
+    @property
+    def EXTRACT_ENGINE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "EXTRACT_ENGINE")
+
+    @property
+    def MATCH_ENGINE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "MATCH_ENGINE")
+
+    @property
+    def MATCH_MODE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "MATCH_MODE")
+
+    @property
+    def MATCH_POOL_SIZE(self):
+        return self._getInt(self.SECTION_NOISSEUR, "MATCH_POOL_SIZE")
+
+    @property
+    def DOCUMENT_STORAGE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "DOCUMENT_STORAGE")
+
+    @property
+    def OCR_OUTPUT_FORMAT(self):
+        return self._getStr(self.SECTION_NOISSEUR, "OCR_OUTPUT_FORMAT")
+
     @property
     def HOCR_VISUALIZE_FONT(self):
         return self._getStr(self.SECTION_NOISSEUR, "HOCR_VISUALIZE_FONT")
@@ -138,19 +231,107 @@ class AppConfig:
     def HOST_CONFIG_PATH(self):
         return self._hostConfigPath
 
+    @property
+    def CACHE_MAX_BYTES(self):
+        return self._getInt(self.SECTION_NOISSEUR, "CACHE_MAX_BYTES")
+
+    @property
+    def CACHE_MAX_ENTRIES(self):
+        return self._getInt(self.SECTION_NOISSEUR, "CACHE_MAX_ENTRIES")
+
+    @property
+    def CACHE_TTL_SEC(self):
+        return self._getInt(self.SECTION_NOISSEUR, "CACHE_TTL_SEC")
+
+    @property
+    def CLASSIFIER_MODE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "CLASSIFIER_MODE")
+
+    @property
+    def CLASSIFIER_THRESHOLD(self):
+        return self._getFloat(self.SECTION_NOISSEUR, "CLASSIFIER_THRESHOLD")
+
+    @property
+    def CLASSIFIER_FRAME_SIZES(self):
+        return self._getListStr(self.SECTION_NOISSEUR, "CLASSIFIER_FRAME_SIZES")
+
+    @property
+    def CAPTION_MODE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "CAPTION_MODE")
+
     @property
     def ENV(self):
         return self._getStr(self.SECTION_SYSTEM, "ENV")
 
+    @property
+    def INCREMENTAL_DIFF_THRESHOLD(self):
+        return self._getInt(self.SECTION_NOISSEUR, "INCREMENTAL_DIFF_THRESHOLD")
+
+    @property
+    def INCREMENTAL_MAX_CHANGE(self):
+        return self._getFloat(self.SECTION_NOISSEUR, "INCREMENTAL_MAX_CHANGE")
+
+    @property
+    def INCREMENTAL_MAX_SOURCES(self):
+        return self._getInt(self.SECTION_NOISSEUR, "INCREMENTAL_MAX_SOURCES")
+
+    @property
+    def INCREMENTAL_TILE_SIZE(self):
+        return self._getInt(self.SECTION_NOISSEUR, "INCREMENTAL_TILE_SIZE")
+
     @property
     def MODEL_LIST(self):
         return self._getListStr(self.SECTION_NOISSEUR, "MODEL_LIST")
 
+    @property
+    def ROI_MARGIN(self):
+        return self._getInt(self.SECTION_NOISSEUR, "ROI_MARGIN")
+
+    @property
+    def ROI_PSM(self):
+        return self._getInt(self.SECTION_NOISSEUR, "ROI_PSM")
+
+    @property
+    def TESSERACT_ENGINE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "TESSERACT_ENGINE")
+
     @property
     def TESSERACT_HOCR_CONFIG(self):
         return (self._getStr(self.SECTION_NOISSEUR, "TESSERACT_HOCR_CONFIG").
                 replace("{@ROOT_PATH}", self.ROOT_PATH))
 
+    @property
+    def TESSERACT_POOL_SIZE(self):
+        return self._getInt(self.SECTION_NOISSEUR, "TESSERACT_POOL_SIZE")
+
+    @property
+    def WORKER_POOL_SIZE(self):
+        return self._getInt(self.SECTION_NOISSEUR, "WORKER_POOL_SIZE")
+
+    @property
+    def WORKER_POOL_TYPE(self):
+        return self._getStr(self.SECTION_NOISSEUR, "WORKER_POOL_TYPE")
+
+    @property
+    def WORKER_QUEUE_SIZE(self):
+        return self._getInt(self.SECTION_NOISSEUR, "WORKER_QUEUE_SIZE")
+
+    @property
+    def BATCH_MAX_SIZE(self):
+        return self._getInt(self.SECTION_NOISSEUR, "BATCH_MAX_SIZE")
+
+    @property
+    def WARMUP_ENABLED(self):
+        return self._getInt(self.SECTION_NOISSEUR, "WARMUP_ENABLED")
+
+    @property
+    def DEADLINE_MS(self):
+        return self._getInt(self.SECTION_NOISSEUR, "DEADLINE_MS")
+
+    @property
+    def DEADLINE_GRACE_MS(self):
+        return self._getInt(self.SECTION_NOISSEUR, "DEADLINE_GRACE_MS")
+
     @property
     def noisseur(self) -> dict:
         return self._getDict(self.SECTION_NOISSEUR)
@@ -194,15 +375,21 @@ def app_init():
     logger.info(' python    : ' + '.'.join(map(str, sys.version_info)) + ', ' + sys.executable)
 
     # load configuration from multiple INI files and merge
-    noisseur_ini = 'noisseur.ini'
-    ini_paths = [
-        cfg.ROOT_PATH + '/' + noisseur_ini,
-        cfg.HOST_CONFIG_PATH + '/' + noisseur_ini
-    ]
-
     ini_files = None
 
-    cfg.load(ini_paths, ini_files)
+    cfg.load(cfg.INI_PATHS, ini_files)
 
     logger.info('Environment: '+cfg.ENV)
     logger.info("Application initialized successfully")
+
+
+def app_reload() -> AppConfig:
+    """Reads configuration files again into new AppConfig, it is returned
+    without replacing AppConfig.instance, so that it can be swapped in at
+    once with everything built from it (see ModelFactory.reload).
+    """
+    cfg = AppConfig()
+    cfg.load(cfg.INI_PATHS, None)
+    cfg.START_TIME = AppConfig.instance.START_TIME
+    logger.info("Configuration reloaded")
+    return cfg
@@ -0,0 +1,236 @@
+import io
+import logging
+import logging.config
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScreenFingerprint:
+    """Reference image of screen model reduced to grayscale cells and row/
+    column profiles.
+    """
+    model: object = None       # Model
+    cells: np.ndarray = None   # (h, w) float64 cell means, zero mean
+    norm: float = 0.0          # cells L2 norm
+    rows: np.ndarray = None    # full resolution row means
+    cols: np.ndarray = None    # full resolution column means
+    coarse: np.ndarray = None  # coarse cell means, zero mean, None - too small
+    coarse_norm: float = 0.0
+
+
+@dataclass
+class ScreenMatch:
+    """Screen model found in frame, x, y are reference image top left
+    position in frame pixels.
+    """
+    model: object = None  # Model
+    x: int = 0
+    y: int = 0
+    score: float = 0.0    # normalized cross correlation, 1.0 is exact
+
+
+class ScreenClassifier:
+    """Classifies frames by normalized cross correlation of grayscale cells
+    against reference images of screen models, so frame can be recognized
+    (and screen located) before any OCR. Screen is searched at every cell
+    offset by FFT, position is then refined to pixels by row/column
+    profiles. With more than COARSE_CANDIDATES screens, all of them are
+    searched in coarse cells first and only the best ones in cells.
+    """
+    #: cell size in pixels, reference image and frame are reduced by it
+    CELL_SIZE: int = 8
+    #: coarse cell size in cells
+    COARSE_FACTOR: int = 4
+    #: screens with best coarse scores searched in cells
+    COARSE_CANDIDATES: int = 4
+    #: row/column step of profiles used to refine position
+    PROFILE_STEP: int = 4
+
+    def __init__(self, threshold: float, cell_size: int = CELL_SIZE):
+        self.threshold = threshold
+        self.cell_size = cell_size
+        self.fingerprints = []  # ScreenFingerprint[]
+        # frame cells shape -> (spectra, coarse spectra) of fingerprints, see
+        # prepare, replaced at once and never changed, so classify is thread
+        # safe without locks
+        self.spectra = {}
+
+    @staticmethod
+    def load_gray(pathOrData) -> Image:
+        if isinstance(pathOrData, Image.Image):
+            return pathOrData.convert("L")
+        if isinstance(pathOrData, bytes):
+            image = Image.open(io.BytesIO(pathOrData))
+        else:
+            image = Image.open(pathOrData)
+        return image.convert("L")
+
+    def reduce(self, image: Image) -> np.ndarray:
+        return np.asarray(image.reduce(self.cell_size), dtype=np.float64)
+
+    def coarsen(self, cells: np.ndarray) -> np.ndarray:
+        """Returns means of COARSE_FACTOR x COARSE_FACTOR cells, partial
+        ones at right/bottom edge are dropped.
+        """
+        f = self.COARSE_FACTOR
+        h, w = cells.shape[0] // f, cells.shape[1] // f
+        return cells[:h * f, :w * f].reshape(h, f, w, f).mean(axis=(1, 3))
+
+    def add(self, model, image: Image) -> None:
+        """Adds fingerprint of model reference image (grayscale), spectra
+        are computed by prepare.
+        """
+        if image.width < self.cell_size * 2 or image.height < self.cell_size * 2:
+            logger.warning(f"reference image of model {model.id} is too small, "
+                           "not classified")
+            return
+        a = np.asarray(image, dtype=np.float64)
+        cells = self.reduce(image)
+        coarse = self.coarsen(cells)
+        cells = cells - cells.mean()
+        norm = float(np.sqrt((cells * cells).sum()))
+        if norm < 1e-6:
+            logger.warning(f"reference image of model {model.id} is blank, "
+                           "not classified")
+            return
+        fp = ScreenFingerprint(model, cells, norm, a.mean(axis=1), a.mean(axis=0))
+        if min(coarse.shape) >= 2:
+            coarse = coarse - coarse.mean()
+            coarse_norm = float(np.sqrt((coarse * coarse).sum()))
+            if coarse_norm >= 1e-6:
+                fp.coarse, fp.coarse_norm = coarse, coarse_norm
+        self.fingerprints.append(fp)
+        self.spectra = {}
+
+    def prepare(self, frame_sizes: list = None) -> None:
+        """Precomputes spectra of fingerprints for frames of reference image
+        sizes and frame_sizes ((width, height) list), spectra for frames of
+        other sizes are computed by classify for every frame.
+        """
+        cs = self.cell_size
+        sizes = {(len(fp.cols), len(fp.rows)) for fp in self.fingerprints}
+        sizes.update(frame_sizes or [])
+        spectra = {}
+        for w, h in sizes:
+            shape = ((h + cs - 1) // cs, (w + cs - 1) // cs)
+            spectra[shape] = self.spectra.get(shape) or self.transform(shape)
+        self.spectra = spectra
+
+    def transform(self, shape: tuple) -> tuple:
+        """Returns (spectra, coarse spectra) lists of fingerprints for frame
+        cells shape, None for fingerprints larger than frame.
+        """
+        f = self.COARSE_FACTOR
+        shape2 = (shape[0] // f, shape[1] // f)
+        spectra, coarse = [], []
+        for fp in self.fingerprints:
+            spectra.append(self.conj_spectrum(fp.cells, shape))
+            coarse.append(self.conj_spectrum(fp.coarse, shape2)
+                          if fp.coarse is not None else None)
+        return spectra, coarse
+
+    @staticmethod
+    def conj_spectrum(cells: np.ndarray, shape: tuple) -> np.ndarray:
+        if cells.shape[0] > shape[0] or cells.shape[1] > shape[1]:
+            return None
+        return np.conj(np.fft.rfft2(cells, shape))
+
+    @staticmethod
+    def search(frame: np.ndarray, targets: list) -> list:
+        """Returns best (score, cell y, cell x) in frame cells of every
+        (cells, norm, conjugated spectrum) target, None for targets without
+        spectrum.
+        """
+        shape = frame.shape
+        spectrum = np.fft.rfft2(frame)
+        # cell sums and sums of squares of frame windows by integral images
+        ii = np.pad(frame, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+        ii2 = np.pad(frame * frame, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+        res = []
+        for cells, norm, conj in targets:
+            if conj is None:
+                res.append(None)
+                continue
+            h, w = cells.shape
+            corr = np.fft.irfft2(spectrum * conj, shape)
+            corr = corr[:shape[0] - h + 1, :shape[1] - w + 1]
+            s = ii[h:, w:] - ii[:-h, w:] - ii[h:, :-w] + ii[:-h, :-w]
+            s2 = ii2[h:, w:] - ii2[:-h, w:] - ii2[h:, :-w] + ii2[:-h, :-w]
+            var = s2 - s * s / (h * w)
+            # flat frame windows (less than one gray level deviation) never match
+            score = np.where(var > h * w,
+                             corr / (np.sqrt(np.maximum(var, 1.0)) * norm), 0.0)
+            y, x = np.unravel_index(np.argmax(score), score.shape)
+            res.append((float(score[y, x]), int(y), int(x)))
+        return res
+
+    def classify(self, image: Image) -> ScreenMatch:
+        """Returns best scoring screen in frame (grayscale) if its score
+        reaches threshold, None otherwise.
+        """
+        fingerprints = self.fingerprints
+        if not fingerprints:
+            return None
+        frame = self.reduce(image)
+        spectra, coarse = self.spectra.get(frame.shape) or (None, None)
+
+        candidates = list(range(len(fingerprints)))
+        if len(candidates) > self.COARSE_CANDIDATES:
+            frame2 = self.coarsen(frame)
+            if coarse is None:
+                coarse = [self.conj_spectrum(fp.coarse, frame2.shape)
+                          if fp.coarse is not None else None for fp in fingerprints]
+            found = self.search(frame2, [(fp.coarse, fp.coarse_norm, conj)
+                                         for fp, conj in zip(fingerprints, coarse)])
+            # screens too small for coarse cells are always searched
+            scored = sorted((-r[0], k) for k, r in enumerate(found) if r)
+            candidates = {k for k, r in enumerate(found) if not r}
+            candidates.update(k for _, k in scored[:self.COARSE_CANDIDATES])
+            candidates = sorted(candidates)
+
+        targets = []
+        for k in candidates:
+            fp = fingerprints[k]
+            conj = spectra[k] if spectra else self.conj_spectrum(fp.cells, frame.shape)
+            targets.append((fp.cells, fp.norm, conj))
+        found = self.search(frame, targets)
+        best = None  # (score, fingerprint, cell y, cell x)
+        for k, r in zip(candidates, found):
+            if r and (not best or r[0] > best[0]):
+                best = (r[0], fingerprints[k], r[1], r[2])
+
+        if not best or best[0] < self.threshold:
+            logger.debug(f"screen not classified, best score: {best and best[0]}")
+            return None
+        score, fp, y, x = best
+        # profiles of every PROFILE_STEP row/column are enough to refine position
+        cs, step = self.cell_size, self.PROFILE_STEP
+        h, w = len(fp.rows), len(fp.cols)
+        x0, y0 = max(0, x * cs - cs), max(0, y * cs - cs)
+        right = min(image.width, x * cs + w + cs)
+        bottom = min(image.height, y * cs + h + cs)
+        a = np.asarray(image.crop((x0, y0, right, bottom)))
+        y1 = y * cs - y0
+        x = x0 + self.refine(a[y1:y1 + h:step].mean(axis=0), fp.cols, x * cs - x0)
+        y = y0 + self.refine(a[:, x - x0:x - x0 + w:step].mean(axis=1), fp.rows, y1)
+        return ScreenMatch(fp.model, x, y, score)
+
+    @staticmethod
+    def refine(profile: np.ndarray, ref: np.ndarray, pos: int) -> int:
+        """Returns position of ref in frame profile near pos with best
+        normalized correlation, pos is kept when profile is too short.
+        """
+        n = len(ref)
+        if len(profile) < n:
+            return pos
+        windows = np.lib.stride_tricks.sliding_window_view(profile, n)
+        windows = windows - windows.mean(axis=1, keepdims=True)
+        ref = ref - ref.mean()
+        d = np.sqrt((windows * windows).sum(axis=1) * (ref * ref).sum())
+        score = np.where(d > 0, windows @ ref / np.maximum(d, 1e-12), 0.0)
+        return int(np.argmax(score))
@@ -0,0 +1,866 @@
+import copy
+import logging
+import logging.config
+from xml.parsers import expat
+
+import numpy as np
+
+from noisseur.hocr import HocrParser
+
+logger = logging.getLogger(__name__)
+
+LINE_KIND_LINE: int = 0
+LINE_KIND_HEADER: int = 1
+LINE_KIND_CAPTION: int = 2
+
+
+def _none(v: float):
+    """Float column value to node value, NaN is stored for None."""
+    return None if v != v else float(v)
+
+
+def _nan(v) -> float:
+    return float("nan") if v is None else v
+
+
+def _title_bbox(m: dict, name: str = "bbox") -> tuple:
+    a = m.get(name)
+    if a and len(a) >= 5:
+        return int(a[1]), int(a[2]), int(a[3]), int(a[4])
+    return 0, 0, 0, 0
+
+
+def _title_float(m: dict, name: str) -> float:
+    a = m.get(name)
+    if not a or len(a) < 2:
+        return None
+    return float(a[1])
+
+
+class StrColumn:
+    """Strings stored in one buffer with offsets, changed values are kept
+    aside until column is rebuilt by take or concat.
+    """
+
+    def __init__(self, values=()):
+        values = list(values)
+        self.buf = "".join(values)
+        self.off = np.zeros(len(values) + 1, dtype=np.int32)
+        np.cumsum([len(v) for v in values], out=self.off[1:])
+        self.changed = {}  # index -> str
+
+    def __len__(self):
+        return len(self.off) - 1
+
+    def get(self, i: int) -> str:
+        if self.changed and i in self.changed:
+            return self.changed[i]
+        return self.buf[self.off[i]:self.off[i + 1]]
+
+    def set(self, i: int, s: str) -> None:
+        self.changed[i] = s
+
+    def take(self, indexes):
+        return StrColumn(self.get(i) for i in indexes)
+
+    def concat(self, other):
+        values = [self.get(i) for i in range(len(self))]
+        values.extend(other.get(i) for i in range(len(other)))
+        return StrColumn(values)
+
+
+class BBoxView(HocrParser.BBox):
+    """BBox stored in row of (n, 4) int32 array."""
+    __slots__ = ("_a", "_i")
+
+    def __init__(self, a: np.ndarray, i: int):
+        self._a = a
+        self._i = i
+
+    def _get(self, k: int) -> int:
+        return int(self._a[self._i, k])
+
+    def _set(self, k: int, v: int) -> None:
+        self._a[self._i, k] = v
+
+    left = property(lambda self: self._get(0), lambda self, v: self._set(0, v))
+    top = property(lambda self: self._get(1), lambda self, v: self._set(1, v))
+    right = property(lambda self: self._get(2), lambda self, v: self._set(2, v))
+    bottom = property(lambda self: self._get(3), lambda self, v: self._set(3, v))
+
+
+def _bbox_view(view: BBoxView, a: np.ndarray, i: int) -> BBoxView:
+    """Returns cached view while it is over column a, columns are replaced
+    by ColumnarDocument.extend and glyph decoding.
+    """
+    if view is None or view._a is not a:
+        view = BBoxView(a, i)
+    return view
+
+
+class GlyphView(HocrParser.OcrxCinfo):
+    """ocrx_cinfo view of ColumnarDocument glyph columns."""
+    __slots__ = ("_doc", "_i", "_bbox", "_xbbox")
+
+    def __init__(self, doc, i: int):
+        self._doc = doc
+        self._i = i
+        self._bbox = None
+        self._xbbox = None
+
+    id = None
+    title = None
+    mapTitle = {}
+
+    @property
+    def bbox(self) -> HocrParser.BBox:
+        self._bbox = _bbox_view(self._bbox, self._doc.glyph_bbox, self._i)
+        return self._bbox
+
+    @property
+    def x_bboxes(self) -> HocrParser.BBox:
+        self._xbbox = _bbox_view(self._xbbox, self._doc.glyph_xbbox, self._i)
+        return self._xbbox
+
+    @property
+    def x_conf(self) -> float:
+        return _none(self._doc.glyph_conf[self._i])
+
+    @property
+    def char_(self) -> str:
+        return self._doc.glyph_char.get(self._i) or None
+
+
+class WordView(HocrParser.OcrxWord):
+    """ocrx_word view of ColumnarDocument word columns, text, confidence
+    and glyphs are writable.
+    """
+    __slots__ = ("_doc", "_i", "_bbox")
+
+    def __init__(self, doc, i: int):
+        self._doc = doc
+        self._i = i
+        self._bbox = None
+        self._glyphs = None
+
+    title = None
+    mapTitle = {}
+    glyphs_loader = None  # glyphs are decoded by document
+
+    @property
+    def id(self) -> str:
+        return self._doc.word_ids.get(self._i) or None
+
+    @property
+    def bbox(self) -> HocrParser.BBox:
+        self._bbox = _bbox_view(self._bbox, self._doc.word_bbox, self._i)
+        return self._bbox
+
+    @property
+    def x_wconf(self) -> float:
+        return _none(self._doc.word_conf[self._i])
+
+    @x_wconf.setter
+    def x_wconf(self, v: float) -> None:
+        self._doc.word_conf[self._i] = _nan(v)
+
+    @property
+    def text(self) -> str:
+        return self._doc.word_text.get(self._i)
+
+    @text.setter
+    def text(self, s: str) -> None:
+        self._doc.word_text.set(self._i, s)
+
+    @property
+    def glyphs(self) -> list:
+        if self._glyphs is None:
+            glyphs = self._doc.word_glyphs.get(self._i)
+            if glyphs is None:
+                off = self._doc.word_glyph_off
+                glyphs = [GlyphView(self._doc, j)
+                          for j in range(off[self._i], off[self._i + 1])]
+            self._glyphs = glyphs
+        return self._glyphs
+
+    @glyphs.setter
+    def glyphs(self, glyphs: list) -> None:
+        self._glyphs = glyphs
+        self._doc.word_glyphs[self._i] = glyphs
+
+
+class LineView(HocrParser.OcrLine):
+    """ocr_line view of ColumnarDocument line columns. Text and glyphs are
+    derived from line words, assigned values (e.g. in shallow copies made
+    by Document.filter) are kept in the view only.
+    """
+    __slots__ = ("_doc", "_i", "_bbox", "_words", "_text")
+
+    def __init__(self, doc, i: int):
+        self._doc = doc
+        self._i = i
+        self._bbox = None
+        self._words = None
+        self._text = None
+        self._glyphs = None
+
+    title = None
+    mapTitle = {}
+    lange = None
+
+    @property
+    def id(self) -> str:
+        return self._doc.line_ids[self._i]
+
+    @property
+    def lang(self) -> str:
+        return self._doc.line_lang[self._i]
+
+    @property
+    def bbox(self) -> HocrParser.BBox:
+        self._bbox = _bbox_view(self._bbox, self._doc.line_bbox, self._i)
+        return self._bbox
+
+    @property
+    def baseline(self) -> HocrParser.BaseLine:
+        slope, shift = self._doc.line_metrics[self._i, 0:2]
+        if slope != slope:
+            return None
+        bl = HocrParser.BaseLine()
+        bl.slope = float(slope)
+        bl.shift = float(shift)
+        return bl
+
+    x_size = property(lambda self: _none(self._doc.line_metrics[self._i, 2]))
+    x_descenders = property(lambda self: _none(self._doc.line_metrics[self._i, 3]))
+    x_ascenders = property(lambda self: _none(self._doc.line_metrics[self._i, 4]))
+
+    @property
+    def words(self) -> list:
+        if self._words is None:
+            off = self._doc.line_word_off
+            self._words = self._doc.words[off[self._i]:off[self._i + 1]]
+        return self._words
+
+    @words.setter
+    def words(self, words: list) -> None:
+        self._words = words
+
+    @property
+    def text(self) -> str:
+        if self._text is not None:
+            return self._text
+        return " ".join([w.text for w in self.words if len(w.text) > 0])
+
+    @text.setter
+    def text(self, s: str) -> None:
+        self._text = s
+
+    @property
+    def glyphs(self) -> list:
+        if self._glyphs is not None:
+            return self._glyphs
+        return [g for w in self.words for g in w.glyphs]
+
+    @glyphs.setter
+    def glyphs(self, glyphs: list) -> None:
+        self._glyphs = glyphs
+
+
+class HeaderView(LineView, HocrParser.OcrHeader):
+    __slots__ = ()
+
+
+class CaptionView(LineView, HocrParser.OcrCaption):
+    __slots__ = ()
+
+
+LINE_VIEWS = {LINE_KIND_LINE: LineView, LINE_KIND_HEADER: HeaderView,
+              LINE_KIND_CAPTION: CaptionView}
+
+
+def _line_views(doc, start: int = 0) -> list:
+    """Returns views of document lines from start index."""
+    kinds = doc.line_kind[start:]
+    return [LINE_VIEWS[int(kind)](doc, i) for i, kind in enumerate(kinds, start)]
+
+
+class ColumnarBuilder:
+    """Collects lines, words and glyphs in document order and builds
+    ColumnarDocument columns from them.
+    """
+
+    def __init__(self):
+        self.line_bbox = []
+        self.line_kind = []
+        self.line_metrics = []
+        self.line_ids = []
+        self.line_lang = []
+        self.line_words = []
+        self.word_bbox = []
+        self.word_conf = []
+        self.word_text = []
+        self.word_ids = []
+        self.word_glyphs = []
+        self.glyph_bbox = []
+        self.glyph_xbbox = []
+        self.glyph_conf = []
+        self.glyph_char = []
+        self.glyph_title = []
+
+    def add_line(self, kind: int, line_id: str, bbox: tuple, baseline: tuple,
+                 x_size: float, x_descenders: float, x_ascenders: float,
+                 lang: str) -> int:
+        """Adds line, baseline is (slope, shift) or None, returns line index."""
+        self.line_kind.append(kind)
+        self.line_ids.append(line_id)
+        self.line_bbox.append(bbox)
+        slope, shift = baseline if baseline else (None, None)
+        self.line_metrics.append((slope, shift, x_size, x_descenders, x_ascenders))
+        self.line_lang.append(lang)
+        self.line_words.append(0)
+        return len(self.line_kind) - 1
+
+    def add_word(self, word_id: str, bbox: tuple, x_wconf: float, text: str) -> None:
+        """Adds word to last line."""
+        self.word_ids.append(word_id or "")
+        self.word_bbox.append(bbox)
+        self.word_conf.append(_nan(x_wconf))
+        self.word_text.append(text or "")
+        self.word_glyphs.append(0)
+        self.line_words[-1] += 1
+
+    def add_glyph(self, bbox: tuple, x_bboxes: tuple, x_conf: float, char_: str) -> None:
+        """Adds glyph to last word."""
+        self.glyph_bbox.append(bbox)
+        self.glyph_xbbox.append(x_bboxes)
+        self.glyph_conf.append(_nan(x_conf))
+        self.glyph_char.append(char_ or "")
+        self.word_glyphs[-1] += 1
+
+    def add_glyph_title(self, title: str, char_: str) -> None:
+        """Adds glyph with raw hOCR title to last word, glyph boxes and
+        confidences are decoded from titles on first access.
+        """
+        self.glyph_title.append(title or "")
+        self.glyph_char.append(char_ or "")
+        self.word_glyphs[-1] += 1
+
+    @staticmethod
+    def _offsets(counts: list) -> np.ndarray:
+        off = np.zeros(len(counts) + 1, dtype=np.int32)
+        np.cumsum(counts, out=off[1:])
+        return off
+
+    @staticmethod
+    def _boxes(boxes: list) -> np.ndarray:
+        return np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+    def build(self, doc):
+        doc.line_bbox = self._boxes(self.line_bbox)
+        doc.line_kind = np.array(self.line_kind, dtype=np.int8)
+        doc.line_metrics = np.array([[_nan(v) for v in m] for m in self.line_metrics],
+                                    dtype=np.float64).reshape(-1, 5)
+        doc.line_ids = self.line_ids
+        doc.line_lang = self.line_lang
+        doc.line_word_off = self._offsets(self.line_words)
+        doc.word_bbox = self._boxes(self.word_bbox)
+        doc.word_conf = np.array(self.word_conf, dtype=np.float64)
+        lines = np.arange(len(self.line_words), dtype=np.int32)
+        doc.word_line = np.repeat(lines, self.line_words)
+        doc.word_text = StrColumn(self.word_text)
+        doc.word_ids = StrColumn(self.word_ids)
+        doc.word_glyph_off = self._offsets(self.word_glyphs)
+        if self.glyph_title:
+            doc.set_glyph_titles(StrColumn(self.glyph_title), [])
+        else:
+            bbox, xbbox = self._boxes(self.glyph_bbox), self._boxes(self.glyph_xbbox)
+            conf = np.array(self.glyph_conf, dtype=np.float64)
+            doc.set_glyph_columns(bbox, xbbox, conf)
+        doc.glyph_char = StrColumn(self.glyph_char)
+        doc.word_glyphs = {}
+        doc._words = None
+        doc._lines = _line_views(doc)
+        return doc
+
+
+class ColumnarDocument(HocrParser.Document):
+    """HocrParser.Document with lines, words and glyphs stored in NumPy
+    columns (bboxes, confidences, line of word, word/glyph offsets) and
+    texts in one string buffer per column. Document nodes are lightweight
+    views created on first access, so pipeline code keeps using node API,
+    while offset and scale are vectorized. Page, area and par nodes are
+    regular objects, par lines are line views.
+
+    Glyphs parsed from hOCR keep raw titles until glyph columns are first
+    accessed, offset and scale done before are replayed on decoding.
+    """
+
+    def __init__(self):
+        self.hocr = None  # str
+        self.pages = []
+        ColumnarBuilder().build(self)
+
+    @property
+    def lines(self) -> list:
+        return self._lines
+
+    @property
+    def words(self) -> list:
+        if self._words is None:
+            self._words = [WordView(self, i) for i in range(len(self.word_conf))]
+        return self._words
+
+    @property
+    def glyph_bbox(self) -> np.ndarray:
+        self.decode_glyphs()
+        return self._glyph_bbox
+
+    @property
+    def glyph_xbbox(self) -> np.ndarray:
+        self.decode_glyphs()
+        return self._glyph_xbbox
+
+    @property
+    def glyph_conf(self) -> np.ndarray:
+        self.decode_glyphs()
+        return self._glyph_conf
+
+    def set_glyph_columns(self, bbox: np.ndarray, xbbox: np.ndarray,
+                          conf: np.ndarray) -> None:
+        self._glyph_bbox = bbox
+        self._glyph_xbbox = xbbox
+        self._glyph_conf = conf
+        # StrColumn, raw hOCR titles of glyphs not decoded yet
+        self.glyph_titles = None
+        self.glyph_ops = []       # (op, x, y)[], offset/scale replayed on decoded glyphs
+
+    def set_glyph_titles(self, titles: StrColumn, ops: list) -> None:
+        self._glyph_bbox = self._glyph_xbbox = self._glyph_conf = None
+        self.glyph_titles = titles
+        self.glyph_ops = ops
+
+    def decode_glyphs(self) -> None:
+        if self.glyph_titles is None:
+            return
+        bbox, xbbox, conf = [], [], []
+        for i in range(len(self.glyph_titles)):
+            m = HocrParser.parse_title(self.glyph_titles.get(i))
+            bbox.append(_title_bbox(m))
+            xbbox.append(_title_bbox(m, "x_bboxes"))
+            conf.append(_nan(_title_float(m, "x_conf")))
+        ops = self.glyph_ops
+        bbox, xbbox = ColumnarBuilder._boxes(bbox), ColumnarBuilder._boxes(xbbox)
+        self.set_glyph_columns(bbox, xbbox, np.array(conf, dtype=np.float64))
+        boxes = [self._glyph_bbox, self._glyph_xbbox]
+        for op, x, y in ops:
+            if op == "offset":
+                self._offset_boxes(boxes, x, y)
+            else:
+                self._scale_boxes(boxes, x, y)
+
+    def _boxes(self, op: str, x, y) -> list:
+        """Returns bbox arrays to apply op to, op is postponed for glyphs
+        not decoded yet.
+        """
+        if self.glyph_titles is None:
+            return [self.line_bbox, self.word_bbox, self._glyph_bbox, self._glyph_xbbox]
+        self.glyph_ops.append((op, x, y))
+        return [self.line_bbox, self.word_bbox]
+
+    @staticmethod
+    def _offset_boxes(boxes: list, x: int, y: int) -> None:
+        d = np.array([x, y, x, y], dtype=np.int32)
+        for a in boxes:
+            a += d
+
+    @staticmethod
+    def _scale_boxes(boxes: list, scale_x: float, scale_y: float) -> None:
+        for a in boxes:
+            a[:, 0::2] = (a[:, 0::2] * scale_x).astype(np.int32)
+            a[:, 1::2] = (a[:, 1::2] * scale_y).astype(np.int32)
+
+    def _tree_bboxes(self):
+        for page in self.pages:
+            yield page.bbox
+            for area in page.areas:
+                yield area.bbox
+                for par in area.pars:
+                    yield par.bbox
+
+    def _foreign_glyphs(self):
+        """Glyphs assigned to words from other documents."""
+        for glyphs in self.word_glyphs.values():
+            for g in glyphs:
+                if not isinstance(g, GlyphView) or g._doc is not self:
+                    yield g
+
+    def offset(self, x: int, y: int) -> None:
+        for bbox in self._tree_bboxes():
+            if bbox:
+                bbox.offset(x, y)
+        self._offset_boxes(self._boxes("offset", x, y), x, y)
+        for g in self._foreign_glyphs():
+            for bbox in (g.bbox, g.x_bboxes):
+                if bbox:
+                    bbox.offset(x, y)
+
+    def scale(self, scale_x: float, scale_y: float) -> None:
+        for bbox in self._tree_bboxes():
+            if bbox:
+                bbox.scale(scale_x, scale_y)
+        self._scale_boxes(self._boxes("scale", scale_x, scale_y), scale_x, scale_y)
+        for g in self._foreign_glyphs():
+            for bbox in (g.bbox, g.x_bboxes):
+                if bbox:
+                    bbox.scale(scale_x, scale_y)
+
+    def crop(self, left: int, top: int, right: int, bottom: int):
+        """Vectorized HocrParser.Document.crop."""
+        b = self.word_bbox
+        x = ((b[:, 0] + b[:, 2]) / 2).astype(np.int32)
+        y = ((b[:, 1] + b[:, 3]) / 2).astype(np.int32)
+        mask = (left <= x) & (x <= right) & (top <= y) & (y <= bottom)
+        doc = self.take(np.flatnonzero(mask))
+        doc.hocr = self.hocr
+        doc.pages = self.pages
+        return doc
+
+    def filter(self, predicate):
+        """Returns new columnar document with words matching predicate,
+        lines without words are dropped, pages are shared.
+        """
+        mask = np.fromiter((bool(predicate(w)) for w in self.words), dtype=bool,
+                           count=len(self.word_conf))
+        doc = self.take(np.flatnonzero(mask))
+        doc.hocr = self.hocr
+        doc.pages = self.pages
+        return doc
+
+    def take(self, indexes: np.ndarray):
+        """Returns new columnar document with words of specified indexes
+        (ascending) and their lines, without pages.
+        """
+        counts = np.bincount(self.word_line[indexes], minlength=len(self.line_kind))
+        lines = np.flatnonzero(counts)
+        off = self.word_glyph_off
+        glyphs = [np.arange(off[i], off[i + 1]) for i in indexes]
+        glyphs = np.concatenate(glyphs) if glyphs else np.zeros(0)
+        glyphs = glyphs.astype(np.int64)
+
+        doc = ColumnarDocument()
+        doc.line_bbox = self.line_bbox[lines]
+        doc.line_kind = self.line_kind[lines]
+        doc.line_metrics = self.line_metrics[lines]
+        doc.line_ids = [self.line_ids[i] for i in lines]
+        doc.line_lang = [self.line_lang[i] for i in lines]
+        doc.line_word_off = ColumnarBuilder._offsets(counts[lines])
+        doc.word_bbox = self.word_bbox[indexes]
+        doc.word_conf = self.word_conf[indexes]
+        doc.word_line = np.repeat(np.arange(len(lines), dtype=np.int32), counts[lines])
+        doc.word_text = self.word_text.take(indexes)
+        doc.word_ids = self.word_ids.take(indexes)
+        doc.word_glyph_off = ColumnarBuilder._offsets(np.diff(off)[indexes])
+        if self.glyph_titles is None:
+            doc.set_glyph_columns(self._glyph_bbox[glyphs], self._glyph_xbbox[glyphs],
+                                  self._glyph_conf[glyphs])
+        else:
+            doc.set_glyph_titles(self.glyph_titles.take(glyphs), list(self.glyph_ops))
+        doc.glyph_char = self.glyph_char.take(glyphs)
+        doc.word_glyphs = {k: self.word_glyphs[i] for k, i in enumerate(indexes)
+                           if i in self.word_glyphs}
+        doc._lines = _line_views(doc)
+        return doc
+
+    def extend(self, doc) -> None:
+        """Appends pages, lines and words of other document, existing
+        views stay valid.
+        """
+        if not isinstance(doc, ColumnarDocument):
+            doc = ColumnarDocument.from_document(doc)
+        self.pages.extend(doc.pages)
+        n_lines = len(self.line_kind)
+        n_words = len(self.word_conf)
+        n_glyphs = len(self.glyph_char)
+
+        self.line_bbox = np.concatenate([self.line_bbox, doc.line_bbox])
+        self.line_kind = np.concatenate([self.line_kind, doc.line_kind])
+        self.line_metrics = np.concatenate([self.line_metrics, doc.line_metrics])
+        self.line_ids = self.line_ids + doc.line_ids
+        self.line_lang = self.line_lang + doc.line_lang
+        self.line_word_off = np.concatenate([self.line_word_off,
+                                             doc.line_word_off[1:] + n_words])
+        self.word_bbox = np.concatenate([self.word_bbox, doc.word_bbox])
+        self.word_conf = np.concatenate([self.word_conf, doc.word_conf])
+        self.word_line = np.concatenate([self.word_line, doc.word_line + n_lines])
+        self.word_text = self.word_text.concat(doc.word_text)
+        self.word_ids = self.word_ids.concat(doc.word_ids)
+        self.word_glyph_off = np.concatenate([self.word_glyph_off,
+                                              doc.word_glyph_off[1:] + n_glyphs])
+        if not len(doc.glyph_char):
+            pass
+        elif not n_glyphs and doc.glyph_titles is not None:
+            self.set_glyph_titles(doc.glyph_titles, list(doc.glyph_ops))
+        elif self.glyph_titles is not None and doc.glyph_titles is not None \
+                and self.glyph_ops == doc.glyph_ops:
+            self.set_glyph_titles(self.glyph_titles.concat(doc.glyph_titles),
+                                  self.glyph_ops)
+        else:
+            self.set_glyph_columns(np.concatenate([self.glyph_bbox, doc.glyph_bbox]),
+                                   np.concatenate([self.glyph_xbbox, doc.glyph_xbbox]),
+                                   np.concatenate([self.glyph_conf, doc.glyph_conf]))
+        self.glyph_char = self.glyph_char.concat(doc.glyph_char)
+        self.word_glyphs.update({i + n_words: glyphs
+                                 for i, glyphs in doc.word_glyphs.items()})
+
+        # views refer to columns through document, so they see new arrays
+        self._lines.extend(_line_views(self, n_lines))
+        if self._words is not None:
+            self._words.extend(WordView(self, i)
+                               for i in range(n_words, len(self.word_conf)))
+
+    @staticmethod
+    def from_document(doc: HocrParser.Document):
+        """Converts document with node objects, pages, areas and pars are
+        shallow copies with line views instead of lines.
+        """
+        builder = ColumnarBuilder()
+        indexes = {}  # line id() -> line index
+        bbox = ColumnarDocument._bbox
+        for line in doc.lines:
+            kind = LINE_KIND_LINE
+            if isinstance(line, HocrParser.OcrCaption):
+                kind = LINE_KIND_CAPTION
+            elif isinstance(line, HocrParser.OcrHeader):
+                kind = LINE_KIND_HEADER
+            bl = line.baseline
+            baseline = (bl.slope, bl.shift) if bl else None
+            indexes[id(line)] = builder.add_line(
+                kind, line.id, bbox(line.bbox), baseline, line.x_size, line.x_descenders,
+                line.x_ascenders, getattr(line, "lang", None))
+            for w in line.words:
+                builder.add_word(w.id, bbox(w.bbox), w.x_wconf, w.text)
+                for g in w.glyphs:
+                    builder.add_glyph(bbox(g.bbox), bbox(g.x_bboxes), g.x_conf, g.char_)
+        res = builder.build(ColumnarDocument())
+        res.hocr = doc.hocr
+        for page in doc.pages:
+            page = copy.copy(page)
+            page.areas = [copy.copy(area) for area in page.areas]
+            for area in page.areas:
+                area.pars = [copy.copy(par) for par in area.pars]
+                for par in area.pars:
+                    par.lines = [res.lines[indexes[id(line)]] for line in par.lines
+                                 if id(line) in indexes]
+            res.add_page(page)
+        return res
+
+    @staticmethod
+    def _bbox(bbox: HocrParser.BBox) -> tuple:
+        if not bbox:
+            return 0, 0, 0, 0
+        return bbox.left, bbox.top, bbox.right, bbox.bottom
+
+    @staticmethod
+    def parse(s: str):
+        """Parses hOCR in one expat pass, nodes and their order are the same
+        as in HocrParser.parse_stream.
+        """
+        logger.debug("ColumnarDocument.parse(...)")
+        doc = ColumnarDocument()
+        doc.hocr = s
+        handler = ColumnarDocument.HocrHandler(doc)
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = handler.start
+        parser.EndElementHandler = handler.end
+        parser.CharacterDataHandler = handler.data
+        try:
+            parser.Parse(s, True)
+        except expat.ExpatError as ex:
+            logger.debug(f"hOCR is not well-formed XML ({str(ex)}), "
+                         "parse with BeautifulSoup")
+            return ColumnarDocument.from_document(HocrParser().parse(s))
+        return handler.finish()
+
+    @staticmethod
+    def parse_tsv(s: str):
+        """Builds columnar document from tesseract TSV output, nodes are the
+        same as in HocrParser.parse_tsv.
+        """
+        logger.debug("ColumnarDocument.parse_tsv(...)")
+        doc = ColumnarDocument()
+        builder = ColumnarBuilder()
+        page = area = par = None
+        n_area = n_par = n_line = n_word = 0
+        par_lines = {}  # OcrPar id -> line indexes
+
+        for row in s.splitlines():
+            a = row.split("\t", 11)
+            if len(a) < 11 or not a[0].isdigit():
+                continue  # header or empty row
+
+            level = int(a[0])
+            left, top = int(a[6]), int(a[7])
+            bbox = (left, top, left + int(a[8]), top + int(a[9]))
+            page_num = int(a[1])
+
+            if level == 1:
+                page = HocrParser.OcrPage()
+                page.id = f"page_{page_num}"
+                page.bbox = ColumnarDocument._to_bbox(bbox)
+                page.ppageno = page_num - 1
+                n_area = n_par = n_line = n_word = 0
+                doc.add_page(page)
+            elif level == 2:
+                n_area += 1
+                area = HocrParser.OcrCarea()
+                area.id = f"block_{page_num}_{n_area}"
+                area.bbox = ColumnarDocument._to_bbox(bbox)
+                page.add_area(area)
+            elif level == 3:
+                n_par += 1
+                par = HocrParser.OcrPar()
+                par.id = f"par_{page_num}_{n_par}"
+                par.bbox = ColumnarDocument._to_bbox(bbox)
+                par_lines[id(par)] = []
+                area.add_par(par)
+            elif level == 4:
+                n_line += 1
+                line_id = f"line_{page_num}_{n_line}"
+                par_lines[id(par)].append(builder.add_line(LINE_KIND_LINE, line_id, bbox,
+                                                           None, 0.0, 0.0, 0.0, None))
+            elif level == 5:
+                n_word += 1
+                # hOCR x_wconf is truncated to int
+                conf = float(int(float(a[10])))
+                text = (a[11] if len(a) > 11 else "").replace(" ", "")
+                builder.add_word(f"word_{page_num}_{n_word}", bbox, conf, text)
+
+        builder.build(doc)
+        for page in doc.pages:
+            for area in page.areas:
+                for par in area.pars:
+                    par.lines = [doc.lines[i] for i in par_lines[id(par)]]
+        return doc
+
+    @staticmethod
+    def _to_bbox(bbox: tuple) -> HocrParser.BBox:
+        res = HocrParser.BBox()
+        res.left, res.top, res.right, res.bottom = bbox
+        return res
+
+    class HocrHandler:
+        """Expat event handlers of ColumnarDocument.parse, mirror of
+        HocrParser.StreamBuilder with words and glyphs written to columns.
+        """
+        LINE_KINDS = {"ocr_caption": LINE_KIND_CAPTION, "ocr_header": LINE_KIND_HEADER,
+                      "ocr_line": LINE_KIND_LINE}
+        CLASSES = {"ocr_page", "ocr_carea", "ocr_par", "ocrx_word",
+                   "ocrx_cinfo"}.union(LINE_KINDS.keys())
+
+        def __init__(self, doc):
+            self.doc = doc
+            self.parser = HocrParser()
+            self.builder = ColumnarBuilder()
+            self.stack = []        # class names of open elements, None for other tags
+            self.par_lines = {}    # OcrPar id -> line indexes
+            self.page = None
+            self.area = None
+            self.par = None
+            # line kind -> [line args, [[word args, [glyph args]]]] of open par
+            self.lines = None
+            self.line = None       # [line args, words]
+            self.word = None       # [word args, glyphs]
+            self.word_text = None  # str[]
+            self.glyph = None      # [raw title, char] of open glyph
+            self.glyph_text = None  # str[]
+
+        def start(self, name: str, attrs: dict) -> None:
+            classes = attrs.get("class", "").split()
+            cls = next((c for c in classes if c in self.CLASSES), None)
+            p: HocrParser = self.parser
+            if cls == "ocr_page":
+                o = HocrParser.OcrPage()
+                p.parse_node(o, attrs)
+                o.image = p.parse_str_tag(o, "image")
+                o.ppageno = p.parse_int_tag(o, "ppageno")
+                self.page = o
+            elif cls == "ocr_carea" and self.page:
+                o = HocrParser.OcrCarea()
+                p.parse_node(o, attrs)
+                self.area = o
+            elif cls == "ocr_par" and self.area:
+                o = HocrParser.OcrPar()
+                p.parse_node(o, attrs)
+                o.lang = attrs.get("lang")
+                self.par = o
+                self.lines = {kind: [] for kind in self.LINE_KINDS.values()}
+            elif cls in self.LINE_KINDS and self.par:
+                m = HocrParser.parse_title(attrs.get("title"))
+                bl = m.get("baseline")
+                baseline = (float(bl[1]), float(bl[2])) if bl and len(bl) >= 3 else None
+                kind = self.LINE_KINDS[cls]
+                self.line = [(kind, attrs.get("id"), _title_bbox(m), baseline,
+                              _title_float(m, "x_size"), _title_float(m, "x_descenders"),
+                              _title_float(m, "x_ascenders"), attrs.get("lang")), []]
+            elif cls == "ocrx_word" and self.line:
+                m = HocrParser.parse_title(attrs.get("title"))
+                conf = _title_float(m, "x_wconf")
+                self.word = [[attrs.get("id"), _title_bbox(m), conf, None], []]
+                self.word_text = []
+            elif cls == "ocrx_cinfo" and self.word:
+                self.glyph = [attrs.get("title"), None]
+                self.glyph_text = []
+            else:
+                cls = None
+            self.stack.append(cls)
+
+        def end(self, name: str) -> None:
+            cls = self.stack.pop()
+            if not cls:
+                return
+            if cls == "ocrx_cinfo":
+                self.glyph[1] = self.parser.first_char("".join(self.glyph_text))
+                self.word[1].append(self.glyph)
+                self.glyph = self.glyph_text = None
+            elif cls == "ocrx_word":
+                text = "".join(self.word_text)
+                self.word[0][3] = text.replace("\n", "").replace(" ", "")
+                self.line[1].append(self.word)
+                self.word = self.word_text = None
+            elif cls in self.LINE_KINDS:
+                self.lines[self.LINE_KINDS[cls]].append(self.line)
+                self.line = None
+            elif cls == "ocr_par":
+                indexes = []
+                for kind in (LINE_KIND_CAPTION, LINE_KIND_HEADER, LINE_KIND_LINE):
+                    for line_args, words in self.lines[kind]:
+                        indexes.append(self.builder.add_line(*line_args))
+                        for word_args, glyphs in words:
+                            self.builder.add_word(*word_args)
+                            for glyph_args in glyphs:
+                                self.builder.add_glyph_title(*glyph_args)
+                self.par_lines[id(self.par)] = indexes
+                self.area.add_par(self.par)
+                self.par = self.lines = None
+            elif cls == "ocr_carea":
+                self.page.add_area(self.area)
+                self.area = None
+            elif cls == "ocr_page":
+                self.doc.add_page(self.page)
+                self.page = None
+
+        def data(self, s: str) -> None:
+            if self.word_text is not None:
+                self.word_text.append(s)
+            if self.glyph_text is not None:
+                self.glyph_text.append(s)
+
+        def finish(self):
+            doc = self.builder.build(self.doc)
+            for page in doc.pages:
+                for area in page.areas:
+                    for par in area.pars:
+                        par.lines = [doc.lines[i] for i in self.par_lines[id(par)]]
+            return doc
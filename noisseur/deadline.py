@@ -0,0 +1,32 @@
+import time
+
+
+class OcrTimeoutError(TimeoutError):
+    """Raised when OCR does not complete before request deadline."""
+    pass
+
+
+class Deadline:
+    """Absolute request deadline in time.time() seconds, shared by all
+    pipeline stages (and worker processes on the same host), so each
+    stage gets only what is left of the request budget.
+    """
+
+    def __init__(self, at: float):
+        self.at = at  # float
+
+    @staticmethod
+    def after_ms(ms: int):
+        """Returns deadline ms milliseconds from now, None when ms is not
+        positive, i.e. no deadline.
+        """
+        if not ms or ms <= 0:
+            return None
+        return Deadline(time.time() + ms / 1000.0)
+
+    def remaining(self) -> float:
+        """Seconds left, negative when expired."""
+        return self.at - time.time()
+
+    def expired(self) -> bool:
+        return time.time() >= self.at
@@ -0,0 +1,407 @@
+import io
+import logging
+import logging.config
+import queue
+import shlex
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import pytesseract
+from PIL import Image
+
+from noisseur.cfg import AppConfig
+from noisseur.deadline import OcrTimeoutError
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+
+class TesseractConfig:
+    """Tesseract command line options, e.g. TESSERACT_HOCR_CONFIG value
+    split into parts, so it can be used both by CLI and in-process engines.
+    """
+
+    def __init__(self):
+        self.tessdata_dir = None  # string
+        self.lang = None          # string
+        self.psm = None           # int
+        self.oem = None           # int
+        self.dpi = None           # int
+        self.variables = {}       # string -> string, "-c name=value" options
+        self.configs = []         # string[], config files e.g. "hocr", "tsv"
+
+    def copy(self):
+        cfg = TesseractConfig()
+        cfg.tessdata_dir = self.tessdata_dir
+        cfg.lang = self.lang
+        cfg.psm = self.psm
+        cfg.oem = self.oem
+        cfg.dpi = self.dpi
+        cfg.variables = dict(self.variables)
+        cfg.configs = list(self.configs)
+        return cfg
+
+    @staticmethod
+    def parse(s: str):
+        cfg = TesseractConfig()
+        if not s:
+            return cfg
+
+        tokens = shlex.split(s)
+        i = 0
+        while i < len(tokens):
+            t = tokens[i]
+            v = tokens[i + 1] if i + 1 < len(tokens) else None
+            if t == "--tessdata-dir":
+                cfg.tessdata_dir = v
+                i += 1
+            elif t == "-l":
+                cfg.lang = v
+                i += 1
+            elif t == "--psm":
+                cfg.psm = int(v)
+                i += 1
+            elif t == "--oem":
+                cfg.oem = int(v)
+                i += 1
+            elif t == "--dpi":
+                cfg.dpi = int(v)
+                i += 1
+            elif t == "-c":
+                if v and "=" in v:
+                    name, val = v.split("=", 1)
+                    cfg.variables[name] = val
+                i += 1
+            elif t.startswith("-"):
+                logger.warning(f"Unsupported tesseract option ignored: {t}")
+            else:
+                cfg.configs.append(t)
+            i += 1
+        return cfg
+
+    def to_args(self) -> str:
+        lst = []
+        if self.tessdata_dir:
+            lst += ["--tessdata-dir", self.tessdata_dir]
+        for name, val in self.variables.items():
+            lst += ["-c", f"{name}={val}"]
+        if self.psm is not None:
+            lst += ["--psm", str(self.psm)]
+        if self.oem is not None:
+            lst += ["--oem", str(self.oem)]
+        if self.dpi:
+            lst += ["--dpi", str(self.dpi)]
+        if self.lang:
+            lst += ["-l", self.lang]
+        lst += self.configs
+        return " ".join(shlex.quote(s) for s in lst)
+
+
+@lru_cache(maxsize=32)
+def parse_tesseract_config(s: str) -> TesseractConfig:
+    """Cached TesseractConfig.parse, returned object must not be modified,
+    use copy() to apply per call overrides.
+    """
+    return TesseractConfig.parse(s)
+
+
+def to_pil_image(image) -> Image.Image:
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, bytes):
+        return Image.open(io.BytesIO(image))
+    return Image.open(image)
+
+
+class OcrEngine:
+    """Base OCR engine, converts image (path, bytes or PIL image)
+    to hOCR or plain text. Optional timeout is in seconds, OcrTimeoutError
+    is raised when recognition does not complete in time. Without cfg
+    text() uses tesseract defaults (eng, psm 3) in every engine.
+    """
+    name: str = None
+
+    def hocr(self, image, cfg: TesseractConfig, timeout: float = None) -> str:
+        raise NotImplementedError()
+
+    def text(self, image, cfg: TesseractConfig = None) -> str:
+        raise NotImplementedError()
+
+    def tsv(self, image, cfg: TesseractConfig, timeout: float = None) -> str:
+        """Returns tesseract TSV output (word level boxes and confidences),
+        much smaller than hOCR with char boxes and cheaper to parse.
+        """
+        raise NotImplementedError()
+
+    def version(self) -> str:
+        return "tesseract {}".format(pytesseract.get_tesseract_version())
+
+    def close(self) -> None:
+        pass
+
+
+class PytesseractEngine(OcrEngine):
+    """Runs tesseract CLI via pytesseract, one process per call."""
+    name = "pytesseract"
+
+    @staticmethod
+    def _timeout(timeout: float) -> float:
+        if timeout is None:
+            return 0  # no timeout
+        if timeout <= 0:
+            raise OcrTimeoutError("Tesseract deadline expired")
+        return timeout
+
+    def hocr(self, image, cfg: TesseractConfig, timeout: float = None) -> str:
+        if isinstance(image, bytes):
+            image = to_pil_image(image)
+        try:
+            res = pytesseract.image_to_pdf_or_hocr(image, config=cfg.to_args(),
+                                                   extension='hocr',
+                                                   timeout=self._timeout(timeout))
+        except RuntimeError as ex:
+            if "timeout" in str(ex):
+                raise OcrTimeoutError(str(ex))
+            raise
+        return res.decode('utf-8')
+
+    def text(self, image, cfg: TesseractConfig = None) -> str:
+        if isinstance(image, bytes):
+            image = to_pil_image(image)
+        if cfg:
+            return pytesseract.image_to_string(image, config=cfg.to_args())
+        return pytesseract.image_to_string(image)
+
+    def tsv(self, image, cfg: TesseractConfig, timeout: float = None) -> str:
+        if isinstance(image, bytes):
+            image = to_pil_image(image)
+        # pytesseract adds "tsv" config itself
+        cfg = cfg.copy()
+        cfg.configs = [c for c in cfg.configs if c != "hocr"]
+        try:
+            return pytesseract.image_to_data(image, config=cfg.to_args(),
+                                             timeout=self._timeout(timeout))
+        except RuntimeError as ex:
+            if "timeout" in str(ex):
+                raise OcrTimeoutError(str(ex))
+            raise
+
+
+class TesserocrPool:
+    """Pool of initialized tesserocr.PyTessBaseAPI handles for one
+    tessdata/lang/oem combination. Handles are created on demand up to
+    the pool size and live for the whole process, so traineddata is
+    loaded once per worker thread instead of once per call.
+    """
+
+    def __init__(self, cfg: TesseractConfig, size: int):
+        self.cfg = cfg
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._handles = []
+
+    def _create(self):
+        cfg = self.cfg
+        logger.debug(f"create tesserocr handle: lang={cfg.lang}, oem={cfg.oem}, "
+                     f"psm={cfg.psm}")
+        kwargs = {"init": True}
+        if cfg.tessdata_dir:
+            kwargs["path"] = cfg.tessdata_dir
+        if cfg.lang:
+            kwargs["lang"] = cfg.lang
+        if cfg.oem is not None:
+            kwargs["oem"] = cfg.oem
+        if cfg.psm is not None:
+            kwargs["psm"] = cfg.psm
+        if cfg.variables:
+            kwargs["variables"] = dict(cfg.variables)
+        return tesserocr.PyTessBaseAPI(**kwargs)
+
+    def checkout(self, timeout: float = None):
+        """Returns idle handle or creates new one while pool is smaller
+        than its size, otherwise waits for handle checked in by other
+        thread up to timeout seconds (None - no limit) and raises
+        OcrTimeoutError when none is returned in time.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                api = self._create()
+            except BaseException:
+                with self._lock:
+                    self._created -= 1
+                raise
+            with self._lock:
+                self._handles.append(api)
+            return api
+
+        if timeout is not None:
+            timeout = max(0.0, timeout)
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise OcrTimeoutError("Tesseract deadline expired, no idle tesserocr handle")
+
+    def checkin(self, api) -> None:
+        self._idle.put(api)
+
+    @contextmanager
+    def api(self, timeout: float = None):
+        api = self.checkout(timeout)
+        try:
+            yield api
+        finally:
+            self.checkin(api)
+
+    def close(self) -> None:
+        with self._lock:
+            handles = self._handles
+            self._handles = []
+            self._created = 0
+            self._idle = queue.LifoQueue()
+        for api in handles:
+            try:
+                api.End()
+            except Exception as ex:
+                logger.error(f"Failed close tesserocr handle: {str(ex)}")
+
+
+class TesserocrEngine(OcrEngine):
+    """In-process tesseract engine based on tesserocr with persistent
+    handle pools. Per call psm/variables/dpi overrides are applied to the
+    checked out handle and reverted before it returns to the pool.
+    """
+    name = "tesserocr"
+
+    def __init__(self, cfg: TesseractConfig, pool_size: int):
+        self.cfg = cfg
+        self.pool_size = pool_size
+        self._pools = {}  # (tessdata_dir, lang, oem) -> TesserocrPool
+        self._lock = threading.Lock()
+
+    def _get_pool(self, cfg: TesseractConfig) -> TesserocrPool:
+        key = (cfg.tessdata_dir, cfg.lang, cfg.oem)
+        with self._lock:
+            pool = self._pools.get(key)
+            if not pool:
+                pool = TesserocrPool(cfg, self.pool_size)
+                self._pools[key] = pool
+        return pool
+
+    def _run(self, image, cfg: TesseractConfig, func, timeout: float = None):
+        pool = self._get_pool(cfg)
+        base = pool.cfg
+        image = to_pil_image(image)
+        end = time.time() + timeout if timeout is not None else None
+        with pool.api(timeout) as api:
+            changed = {}  # name -> handle value before this call
+            psm = None    # handle page segmentation mode before this call
+            try:
+                for name, val in cfg.variables.items():
+                    if base.variables.get(name) != val:
+                        changed[name] = api.GetVariableAsString(name)
+                        api.SetVariable(name, val)
+                if cfg.psm is not None and cfg.psm != base.psm:
+                    psm = api.GetPageSegMode()
+                    api.SetPageSegMode(cfg.psm)
+                api.SetImage(image)
+                if cfg.dpi:
+                    api.SetSourceResolution(cfg.dpi)
+                if end is not None:
+                    # results of timed out recognition are incomplete
+                    timeout = end - time.time()
+                    if timeout <= 0 or not api.Recognize(max(1, int(timeout * 1000))):
+                        raise OcrTimeoutError("Tesseract deadline expired")
+                return func(api)
+            finally:
+                api.Clear()
+                for name, val in changed.items():
+                    if val is not None:  # None - unknown variable, not set
+                        api.SetVariable(name, val)
+                if psm is not None:
+                    api.SetPageSegMode(psm)
+
+    def hocr(self, image, cfg: TesseractConfig, timeout: float = None) -> str:
+        return self._run(image, cfg, lambda api: api.GetHOCRText(0), timeout)
+
+    def text(self, image, cfg: TesseractConfig = None) -> str:
+        # tesseract defaults, the same as tesseract CLI without options
+        return self._run(image, cfg if cfg else TesseractConfig(),
+                         lambda api: api.GetUTF8Text())
+
+    def tsv(self, image, cfg: TesseractConfig, timeout: float = None) -> str:
+        return self._run(image, cfg, lambda api: api.GetTSVText(0), timeout)
+
+    def version(self) -> str:
+        version = tesserocr.tesseract_version().splitlines()[0]
+        return "tesseract {} (tesserocr)".format(version)
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            pool.close()
+
+
+class OcrEngineFactory:
+    __engine = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def create() -> OcrEngine:
+        name = AppConfig.instance.TESSERACT_ENGINE
+        cfg = parse_tesseract_config(AppConfig.instance.TESSERACT_HOCR_CONFIG)
+        if name == TesserocrEngine.name:
+            if tesserocr:
+                engine = TesserocrEngine(cfg, AppConfig.instance.TESSERACT_POOL_SIZE)
+                try:
+                    # load traineddata now rather than on first frame
+                    pool = engine._get_pool(cfg)
+                    pool.checkin(pool.checkout())
+                    return engine
+                except Exception as ex:
+                    logger.error("Failed initialize tesserocr, use pytesseract: "
+                                 f"{str(ex)}")
+                    engine.close()
+            else:
+                logger.warning("tesserocr is not installed, use pytesseract")
+        elif name != PytesseractEngine.name:
+            logger.warning(f"Unknown tesseract engine '{name}', use pytesseract")
+        return PytesseractEngine()
+
+    @staticmethod
+    def get_engine() -> OcrEngine:
+        if not OcrEngineFactory.__engine:
+            with OcrEngineFactory.__lock:
+                if not OcrEngineFactory.__engine:
+                    OcrEngineFactory.__engine = OcrEngineFactory.create()
+                    logger.info(f"OCR engine: {OcrEngineFactory.__engine.name}")
+        return OcrEngineFactory.__engine
+
+    @staticmethod
+    def reset() -> None:
+        with OcrEngineFactory.__lock:
+            engine = OcrEngineFactory.__engine
+            OcrEngineFactory.__engine = None
+        if engine:
+            engine.close()
@@ -0,0 +1,64 @@
+import logging
+import logging.config
+
+import numpy as np
+
+from noisseur.columnar import ColumnarDocument
+from noisseur.hocr import HocrParser
+
+logger = logging.getLogger(__name__)
+
+
+def word_centers(doc: HocrParser.Document) -> np.ndarray:
+    """Returns (n, 2) array of doc words bbox centers, truncated the same
+    way as Rect.center.
+    """
+    if isinstance(doc, ColumnarDocument):
+        b = doc.word_bbox
+    else:
+        boxes = [(w.bbox.left, w.bbox.top, w.bbox.right, w.bbox.bottom)
+                 for w in doc.words]
+        b = np.array(boxes, dtype=np.int64).reshape(-1, 4)
+    return ((b[:, 0:2] + b[:, 2:4]) / 2).astype(np.int64)
+
+
+def word_text_getter(doc: HocrParser.Document):
+    """Returns word index -> text function, columnar document texts are
+    read without creating word views.
+    """
+    if isinstance(doc, ColumnarDocument):
+        return doc.word_text.get
+    words = doc.words
+    return lambda i: words[i].text
+
+
+def assign_words(rects: np.ndarray, centers: np.ndarray) -> tuple:
+    """Assigns words to all (m, 4) rects at once by center containment (the
+    same as Rect.contains, edges included), returns (indexes, offsets),
+    words of rect k are indexes[offsets[k]:offsets[k + 1]] in document
+    order. Word can be assigned to several rects.
+    """
+    x = centers[None, :, 0]
+    y = centers[None, :, 1]
+    inside_x = (rects[:, 0:1] <= x) & (x <= rects[:, 2:3])
+    inside_y = (rects[:, 1:2] <= y) & (y <= rects[:, 3:4])
+    inside = inside_x & inside_y
+    # nonzero is row-major, so word indexes are ascending within each rect
+    rows, cols = np.nonzero(inside)
+    offsets = np.zeros(len(rects) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(rects)), out=offsets[1:])
+    return cols, offsets
+
+
+def extract_texts(doc: HocrParser.Document, rects: np.ndarray) -> list:
+    """Returns texts of words inside each of (m, 4) rects joined by space in
+    document order, None for rects without words.
+    """
+    if not len(rects):
+        return []
+    indexes, offsets = assign_words(rects, word_centers(doc))
+    text = word_text_getter(doc)
+    texts = [text(i) for i in indexes.tolist()]
+    offsets = offsets.tolist()
+    spans = [(offsets[k], offsets[k + 1]) for k in range(len(rects))]
+    return [" ".join(texts[start:end]) if start < end else None for start, end in spans]
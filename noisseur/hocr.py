@@ -1,5 +1,8 @@
+import copy
+import functools
 import logging
 import logging.config
+from xml.parsers import expat
 
 import bs4
 from bs4 import BeautifulSoup
@@ -25,7 +28,79 @@ class HocrParser:
         def add_word(self, word) -> None:
             self.words.append(word)
 
+        def extend(self, doc) -> None:
+            self.pages.extend(doc.pages)
+            self.lines.extend(doc.lines)
+            self.words.extend(doc.words)
+
+        def bboxes(self, op: tuple = None):
+            """Iterates bounding boxes of all nodes. When op (name, x, y) is
+            specified, glyphs not decoded yet are skipped, op is applied to
+            them on decoding.
+            """
+            for page in self.pages:
+                yield page.bbox
+                for area in page.areas:
+                    yield area.bbox
+                    for par in area.pars:
+                        yield par.bbox
+                        for line in par.lines:
+                            yield line.bbox
+                            for word in line.words:
+                                yield word.bbox
+                                if op and word.defer_glyphs(*op):
+                                    continue
+                                for glyph in word.glyphs:
+                                    yield glyph.bbox
+                                    yield glyph.x_bboxes
+
+        def offset(self, x: int, y: int) -> None:
+            """Moves all nodes by specified offset, e.g. to convert
+            coordinates of cropped image OCR to full image ones.
+            """
+            for bbox in self.bboxes(("offset", x, y)):
+                if bbox:
+                    bbox.offset(x, y)
+
+        def scale(self, scale_x: float, scale_y: float) -> None:
+            """Scales coordinates of all nodes, e.g. to convert coordinates
+            of upscaled image OCR back to original image ones.
+            """
+            for bbox in self.bboxes(("scale", scale_x, scale_y)):
+                if bbox:
+                    bbox.scale(scale_x, scale_y)
+
+        def crop(self, left: int, top: int, right: int, bottom: int):
+            """Returns new document with words which bbox center is inside
+            specified rectangle, lines are shallow copies with filtered words.
+            """
+            def inside(w) -> bool:
+                return w.bbox and w.bbox.center_inside(left, top, right, bottom)
+            return self.filter(inside)
+
+        def filter(self, predicate):
+            """Returns new document with words matching predicate, lines are
+            shallow copies with filtered words.
+            """
+            doc = HocrParser.Document()
+            doc.hocr = self.hocr
+            doc.pages = self.pages
+            for line in self.lines:
+                words = [w for w in line.words if predicate(w)]
+                if not words:
+                    continue
+                line2 = copy.copy(line)
+                line2.words = words
+                line2.glyphs = None  # glyphs of words, not decoded here
+                line2.text = " ".join([w.text for w in words if len(w.text) > 0])
+                doc.add_line(line2)
+                for w in words:
+                    doc.add_word(w)
+            return doc
+
     class OcrNode:
+        __slots__ = ("id", "bbox", "title", "mapTitle")
+
         def __init__(self):
             self.id = None      # string
             self.bbox = None    # bbox
@@ -33,18 +108,41 @@ class HocrParser:
             self.mapTitle = {}  # string -> string[]
 
     class BaseLine:
+        __slots__ = ("slope", "shift")
+
         def __init__(self):
             self.slope = 0.0  # float
             self.shift = 0.0  # float
 
     class BBox:
+        __slots__ = ("left", "top", "right", "bottom")
+
         def __init__(self):
             self.left = 0    # int
             self.top = 0     # int
             self.right = 0   # int
             self.bottom = 0  # int
 
+        def offset(self, x: int, y: int) -> None:
+            self.left += x
+            self.top += y
+            self.right += x
+            self.bottom += y
+
+        def scale(self, scale_x: float, scale_y: float) -> None:
+            self.left = int(self.left * scale_x)
+            self.top = int(self.top * scale_y)
+            self.right = int(self.right * scale_x)
+            self.bottom = int(self.bottom * scale_y)
+
+        def center_inside(self, left: int, top: int, right: int, bottom: int) -> bool:
+            x = int((self.left + self.right) / 2)
+            y = int((self.top + self.bottom) / 2)
+            return left <= x <= right and top <= y <= bottom
+
     class OcrPage(OcrNode):
+        __slots__ = ("image", "ppageno", "areas")
+
         def __init__(self):
             self.image = None  # string
             self.ppageno = 0   # int
@@ -54,6 +152,8 @@ class HocrParser:
             self.areas.append(o)
 
     class OcrCarea(OcrNode):
+        __slots__ = ("pars",)
+
         def __init__(self):
             self.pars = []  # ocr_par[]
 
@@ -61,6 +161,8 @@ class HocrParser:
             self.pars.append(o)
 
     class OcrPar(OcrNode):
+        __slots__ = ("lang", "lines")
+
         def __init__(self):
             self.lang = None  # string
             self.lines = []   # ocr_line[]
@@ -69,33 +171,87 @@ class HocrParser:
             self.lines.append(o)
 
     class OcrLine(OcrNode):
+        # lang is set by parsers only
+        __slots__ = ("baseline", "lange", "lang", "text", "words", "_glyphs", "x_size",
+                     "x_descenders", "x_ascenders")
+
         def __init__(self):
             self.baseline = None     # baseline
             self.lange = None        # string
             self.text = None         # string
             self.words = []          # ocrx_words[]
-            self.glyphs = []         # ocrs_cinfo
+            self._glyphs = None      # ocrs_cinfo, None - glyphs of words
             self.x_size = 0.0        # float
             self.x_descenders = 0.0  # float
             self.x_ascenders = 0.0   # float
 
+        @property
+        def glyphs(self) -> list:
+            if self._glyphs is None:
+                return [g for w in self.words for g in w.glyphs]
+            return self._glyphs
+
+        @glyphs.setter
+        def glyphs(self, glyphs: list) -> None:
+            self._glyphs = glyphs
+
         def add_glyph(self, o):
-            self.glyphs.append(o)
+            if self._glyphs is None:
+                self._glyphs = self.glyphs
+            self._glyphs.append(o)
 
         def add_word(self, o):
             self.words.append(o)
 
     class OcrHeader(OcrLine):
-        pass
+        __slots__ = ()
 
     class OcrCaption(OcrLine):
-        pass
+        __slots__ = ()
 
     class OcrxWord(OcrNode):
+        __slots__ = ("x_wconf", "text", "_glyphs", "glyphs_loader", "glyph_ops")
+
         def __init__(self):
-            self.x_wconf = 0.0  # float
-            self.text = None    # string
-            self.glyphs = []    # ocrx_cinfo[]
+            self.x_wconf = 0.0          # float
+            self.text = None            # string
+            self._glyphs = []           # ocrx_cinfo[]
+            # callable returning ocrx_cinfo[], called on first glyphs access
+            self.glyphs_loader = None
+            self.glyph_ops = None       # (op, x, y)[] replayed on decoded glyphs
+
+        @property
+        def glyphs(self) -> list:
+            """Glyphs are decoded from raw hOCR on first access, only
+            visualization and confidence checks of some words need them.
+            """
+            if self.glyphs_loader:
+                self._glyphs = self.glyphs_loader()
+                self.glyphs_loader = None
+                for op, x, y in self.glyph_ops or []:
+                    for glyph in self._glyphs:
+                        for bbox in (glyph.bbox, glyph.x_bboxes):
+                            if bbox:
+                                getattr(bbox, op)(x, y)
+                self.glyph_ops = None
+            return self._glyphs
+
+        @glyphs.setter
+        def glyphs(self, glyphs: list) -> None:
+            self._glyphs = glyphs
+            self.glyphs_loader = None
+            self.glyph_ops = None
+
+        def defer_glyphs(self, op: str, x, y) -> bool:
+            """Postpones op ("offset" or "scale") of glyphs not decoded yet
+            until they are, returns False when they are decoded already.
+            """
+            if not self.glyphs_loader:
+                return False
+            if self.glyph_ops is None:
+                self.glyph_ops = []
+            self.glyph_ops.append((op, x, y))
+            return True
 
         def add_glyph(self, o):
             self.glyphs.append(o)
@@ -107,6 +263,8 @@ class HocrParser:
             return f
 
     class OcrxCinfo(OcrNode):
+        __slots__ = ("x_bboxes", "x_conf", "char_")
+
         def __init__(self):
             self.x_bboxes = None  # bbox
             self.x_conf = 0.0     # float
@@ -136,6 +294,203 @@ class HocrParser:
         self.parse_page(doc, d)
         return doc
 
+    def parse_stream(self, s: str) -> Document:
+        """Builds the same Document as parse in one expat event pass,
+        without building soup tree and searching it at every level.
+        Falls back to parse when hOCR is not well-formed XML.
+        """
+        logger.debug("parse_stream(...)")
+        doc = HocrParser.Document()
+        doc.hocr = s
+        builder = HocrParser.StreamBuilder(self, doc)
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = builder.start
+        parser.EndElementHandler = builder.end
+        parser.CharacterDataHandler = builder.data
+        try:
+            parser.Parse(s, True)
+        except expat.ExpatError as ex:
+            logger.debug(f"hOCR is not well-formed XML ({str(ex)}), "
+                         "parse with BeautifulSoup")
+            return self.parse(s)
+        return doc
+
+    class StreamBuilder:
+        """Expat event handlers of parse_stream. Nodes are attached to the
+        innermost open node of the parent class, par lines are ordered as
+        in parse (captions, headers, then lines) when par is closed.
+        """
+        LINE_CLASSES = ("ocr_caption", "ocr_header", "ocr_line")
+        CLASSES = {"ocr_page", "ocr_carea", "ocr_par", "ocrx_word",
+                   "ocrx_cinfo"}.union(LINE_CLASSES)
+
+        def __init__(self, parser, doc):
+            self.parser = parser  # HocrParser
+            self.doc = doc        # Document
+            # (class name, node) of open elements, (None, None) for other tags
+            self.stack = []
+            self.page = None
+            self.area = None
+            self.par = None
+            self.par_lines = None  # line class -> OcrLine[] of open par
+            self.line = None
+            self.word = None
+            self.word_text = None  # str[]
+            self.word_cinfos = None  # (attributes, text)[] of open word ocrx_cinfo
+            self.cinfo = None        # attributes
+            self.cinfo_text = None   # str[]
+
+        def start(self, name: str, attrs: dict) -> None:
+            classes = attrs.get("class", "").split()
+            cls = next((c for c in classes if c in self.CLASSES), None)
+            p: HocrParser = self.parser
+            o = None
+            if cls == "ocr_page":
+                o = HocrParser.OcrPage()
+                p.parse_node(o, attrs)
+                o.image = p.parse_str_tag(o, "image")
+                o.ppageno = p.parse_int_tag(o, "ppageno")
+                self.page = o
+            elif cls == "ocr_carea" and self.page:
+                o = HocrParser.OcrCarea()
+                p.parse_node(o, attrs)
+                self.area = o
+            elif cls == "ocr_par" and self.area:
+                o = HocrParser.OcrPar()
+                p.parse_node(o, attrs)
+                o.lang = attrs.get("lang")
+                self.par = o
+                self.par_lines = {c: [] for c in self.LINE_CLASSES}
+            elif cls in self.LINE_CLASSES and self.par:
+                if cls == "ocr_caption":
+                    o = HocrParser.OcrCaption()
+                elif cls == "ocr_header":
+                    o = HocrParser.OcrHeader()
+                else:
+                    o = HocrParser.OcrLine()
+                p.parse_line_attrs(o, attrs)
+                self.line = o
+            elif cls == "ocrx_word" and self.line:
+                o = HocrParser.OcrxWord()
+                p.parse_word_attrs(o, attrs)
+                self.word = o
+                self.word_text = []
+                self.word_cinfos = []
+            elif cls == "ocrx_cinfo" and self.word:
+                o = attrs
+                self.cinfo = o
+                self.cinfo_text = []
+            else:
+                cls = None
+            self.stack.append((cls, o))
+
+        def end(self, name: str) -> None:
+            cls, o = self.stack.pop()
+            if not cls:
+                return
+            if cls == "ocrx_cinfo":
+                self.word_cinfos.append((o, "".join(self.cinfo_text)))
+                self.cinfo = self.cinfo_text = None
+            elif cls == "ocrx_word":
+                o.text = "".join(self.word_text).replace("\n", "").replace(" ", "")
+                if self.word_cinfos:
+                    decode = self.parser.decode_cinfos
+                    o.glyphs_loader = functools.partial(decode, self.word_cinfos)
+                self.line.add_word(o)
+                self.word = self.word_text = self.word_cinfos = None
+            elif cls in self.LINE_CLASSES:
+                o.text = " ".join([w.text for w in o.words if len(w.text) > 0])
+                self.par_lines[cls].append(o)
+                self.line = None
+            elif cls == "ocr_par":
+                for c in self.LINE_CLASSES:
+                    for line in self.par_lines[c]:
+                        o.add_line(line)
+                        self.doc.add_line(line)
+                        for w in line.words:
+                            self.doc.add_word(w)
+                self.area.add_par(o)
+                self.par = self.par_lines = None
+            elif cls == "ocr_carea":
+                self.page.add_area(o)
+                self.area = None
+            elif cls == "ocr_page":
+                self.doc.add_page(o)
+                self.page = None
+
+        def data(self, s: str) -> None:
+            if self.word_text is not None:
+                self.word_text.append(s)
+            if self.cinfo_text is not None:
+                self.cinfo_text.append(s)
+
+    def parse_tsv(self, s: str) -> Document:
+        """Builds Document from tesseract TSV output. Nodes, ids, bboxes
+        and word confidences are the same as in hOCR, but there are no
+        glyphs (char boxes), baselines and font metrics, and caption/header
+        lines are regular lines in reading order.
+        """
+        logger.debug("parse_tsv(...)")
+        doc = HocrParser.Document()
+        page = area = par = line = None
+        n_area = n_par = n_line = n_word = 0
+
+        for row in s.splitlines():
+            a = row.split("\t", 11)
+            if len(a) < 11 or not a[0].isdigit():
+                continue  # header or empty row
+
+            level = int(a[0])
+            bbox = HocrParser.BBox()
+            bbox.left = int(a[6])
+            bbox.top = int(a[7])
+            bbox.right = bbox.left + int(a[8])
+            bbox.bottom = bbox.top + int(a[9])
+            page_num = int(a[1])
+
+            if level == 1:
+                page = HocrParser.OcrPage()
+                page.id = f"page_{page_num}"
+                page.bbox = bbox
+                page.ppageno = page_num - 1
+                n_area = n_par = n_line = n_word = 0
+                doc.add_page(page)
+            elif level == 2:
+                n_area += 1
+                area = HocrParser.OcrCarea()
+                area.id = f"block_{page_num}_{n_area}"
+                area.bbox = bbox
+                page.add_area(area)
+            elif level == 3:
+                n_par += 1
+                par = HocrParser.OcrPar()
+                par.id = f"par_{page_num}_{n_par}"
+                par.bbox = bbox
+                area.add_par(par)
+            elif level == 4:
+                n_line += 1
+                line = HocrParser.OcrLine()
+                line.id = f"line_{page_num}_{n_line}"
+                line.bbox = bbox
+                line.text = ""
+                par.add_line(line)
+                doc.add_line(line)
+            elif level == 5:
+                n_word += 1
+                o = HocrParser.OcrxWord()
+                o.id = f"word_{page_num}_{n_word}"
+                o.bbox = bbox
+                # hOCR x_wconf is truncated to int
+                o.x_wconf = float(int(float(a[10])))
+                o.text = (a[11] if len(a) > 11 else "").replace(" ", "")
+                line.add_word(o)
+                doc.add_word(o)
+                if o.text:
+                    line.text = f"{line.text} {o.text}" if line.text else o.text
+
+        return doc
+
     def parse_baseline(self, o: OcrNode) -> BaseLine:
         name = "baseline"
 
@@ -159,36 +514,51 @@ class HocrParser:
             self.parse_par(doc, o, node2)
             owner.add_area(o)
 
-    def parse_cinfo(self, doc: Document, line: OcrLine, owner: OcrxWord, node: bs4.Tag) -> None:
-        pars = node.find_all(class_="ocrx_cinfo")
-        for node2 in pars:
-            o = HocrParser.OcrxCinfo()
-            self.parse_node(o, node2)
-            o.x_conf = self.parse_float_tag(o, "x_conf")
-            o.char_ = self.first_char(node2.get_text())
-
-            o.x_bboxes = HocrParser.BBox()
-            if "x_bboxes" in o.mapTitle.keys():
-                a = o.mapTitle["x_bboxes"]
-                if len(a) >= 5:
-                    o.x_bboxes.left = int(a[1])
-                    o.x_bboxes.top = int(a[2])
-                    o.x_bboxes.right = int(a[3])
-                    o.x_bboxes.bottom = int(a[4])
+    def parse_cinfo(self, node: bs4.Tag) -> list:
+        """Returns glyphs of ocrx_word node."""
+        return self.decode_cinfos(self.cinfo_attrs(node))
 
-            owner.add_glyph(o)
-            line.add_glyph(o)
+    @staticmethod
+    def cinfo_attrs(node: bs4.Tag) -> list:
+        """Returns (attributes, text)[] of ocrx_cinfo nodes of ocrx_word node,
+        attributes are copied to dict, so that glyphs decoded later don't
+        keep the whole tree alive.
+        """
+        nodes = node.find_all(class_="ocrx_cinfo")
+        return [({"id": node2.get("id"), "title": node2.get("title")}, node2.get_text())
+                for node2 in nodes]
+
+    def decode_cinfos(self, cinfos: list) -> list:
+        """Builds glyphs from (node, text) list, node is bs4.Tag or
+        attributes dict.
+        """
+        res = []
+        for node, text in cinfos:
+            o = HocrParser.OcrxCinfo()
+            self.parse_cinfo_attrs(o, node)
+            o.char_ = self.first_char(text)
+            res.append(o)
+        return res
+
+    def parse_cinfo_attrs(self, o: OcrxCinfo, node) -> None:
+        """Parses ocrx_cinfo attributes, node is bs4.Tag or attributes dict."""
+        self.parse_node(o, node)
+        o.x_conf = self.parse_float_tag(o, "x_conf")
+
+        o.x_bboxes = HocrParser.BBox()
+        if "x_bboxes" in o.mapTitle.keys():
+            a = o.mapTitle["x_bboxes"]
+            if len(a) >= 5:
+                o.x_bboxes.left = int(a[1])
+                o.x_bboxes.top = int(a[2])
+                o.x_bboxes.right = int(a[3])
+                o.x_bboxes.bottom = int(a[4])
 
     def parse_caption(self, doc: Document, owner: OcrPar, node: bs4.Tag) -> None:
         pars = node.find_all(class_="ocr_caption")
         for node2 in pars:
             o = HocrParser.OcrCaption()
-            self.parse_node(o, node2)
-            o.baseline = self.parse_baseline(o)
-            o.x_ascenders = self.parse_float_tag(o, "x_ascenders")
-            o.x_descenders = self.parse_float_tag(o, "x_descenders")
-            o.x_size = self.parse_float_tag(o, "x_size")
-            o.lang = node2.get("lang")
+            self.parse_line_attrs(o, node2)
             self.parse_word(doc, o, node2)
 
             lst = []
@@ -205,12 +575,7 @@ class HocrParser:
         pars = node.find_all(class_="ocr_header")
         for node2 in pars:
             o = HocrParser.OcrHeader()
-            self.parse_node(o, node2)
-            o.baseline = self.parse_baseline(o)
-            o.x_ascenders = self.parse_float_tag(o, "x_ascenders")
-            o.x_descenders = self.parse_float_tag(o, "x_descenders")
-            o.x_size = self.parse_float_tag(o, "x_size")
-            o.lang = node2.get("lang")
+            self.parse_line_attrs(o, node2)
             self.parse_word(doc, o, node2)
 
             lst = []
@@ -227,12 +592,7 @@ class HocrParser:
         pars = node.find_all(class_="ocr_line")
         for node2 in pars:
             o = HocrParser.OcrLine()
-            self.parse_node(o, node2)
-            o.baseline = self.parse_baseline(o)
-            o.x_ascenders = self.parse_float_tag(o, "x_ascenders")
-            o.x_descenders = self.parse_float_tag(o, "x_descenders")
-            o.x_size = self.parse_float_tag(o, "x_size")
-            o.lang = node2.get("lang")
+            self.parse_line_attrs(o, node2)
             self.parse_word(doc, o, node2)
 
             lst = []
@@ -245,13 +605,25 @@ class HocrParser:
             owner.add_line(o)
             doc.add_line(o)
 
-    def parse_node(self, o: OcrNode, node: bs4.Tag) -> None:
-        o.id = node.get("id")
-        o.title = node.get("title")
-        o.mapTitle = {}
+    def parse_line_attrs(self, o: OcrLine, node) -> None:
+        """Parses ocr_line/ocr_header/ocr_caption attributes, node is
+        bs4.Tag or attributes dict.
+        """
+        self.parse_node(o, node)
+        o.baseline = self.parse_baseline(o)
+        o.x_ascenders = self.parse_float_tag(o, "x_ascenders")
+        o.x_descenders = self.parse_float_tag(o, "x_descenders")
+        o.x_size = self.parse_float_tag(o, "x_size")
+        o.lang = node.get("lang")
 
-        if o.title:
-            a1 = o.title.split(";")
+    @staticmethod
+    def parse_title(title: str) -> dict:
+        """Splits hOCR title properties, e.g. "bbox 1 2 3 4; x_wconf 95",
+        to property name -> [name, value, ...] dictionary.
+        """
+        res = {}
+        if title:
+            a1 = title.split(";")
             for s1 in a1:
                 if not s1:
                     continue
@@ -267,7 +639,14 @@ class HocrParser:
                 if not a2[0]:
                     continue
 
-                o.mapTitle[a2[0]] = a2
+                res[a2[0]] = a2
+        return res
+
+    def parse_node(self, o: OcrNode, node) -> None:
+        """Parses id and title properties, node is bs4.Tag or attributes dict."""
+        o.id = node.get("id")
+        o.title = node.get("title")
+        o.mapTitle = self.parse_title(o.title)
 
         o.bbox = HocrParser.BBox()
         if "bbox" in o.mapTitle.keys():
@@ -303,13 +682,19 @@ class HocrParser:
         pars = node.find_all(class_="ocrx_word")
         for node2 in pars:
             o = HocrParser.OcrxWord()
-            self.parse_node(o, node2)
-            o.x_wconf = self.parse_float_tag(o, "x_wconf")
+            self.parse_word_attrs(o, node2)
             o.text = str(node2.get_text()).replace("\n", "").replace(" ", "")
-            self.parse_cinfo(doc, owner, o, node2)
+            cinfos = self.cinfo_attrs(node2)
+            if cinfos:
+                o.glyphs_loader = functools.partial(self.decode_cinfos, cinfos)
             owner.add_word(o)
             doc.add_word(o)
 
+    def parse_word_attrs(self, o: OcrxWord, node) -> None:
+        """Parses ocrx_word attributes, node is bs4.Tag or attributes dict."""
+        self.parse_node(o, node)
+        o.x_wconf = self.parse_float_tag(o, "x_wconf")
+
     def parse_int_tag(self, o: OcrNode, name: str) -> int:
         r = self.parse_str_tag(o, name)
         if r is None:
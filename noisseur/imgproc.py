@@ -2,8 +2,11 @@ import io
 import logging
 import logging.config
 
+import numpy as np
 import pyvips
 import PIL
+import PIL.Image
+import PIL.ImageOps
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +40,24 @@ class ImageProcessor:
         logger.debug("caption_ex")
         image = self.pil_load(path)
         image = image.convert("RGB")
+        rc = self.find_caption_rect(image)
+        if rc:
+            image = image.crop(rc)
+            # image = PIL.ImageOps.expand(image, border=50, fill="black")
+            return {"rc": rc, "data": self.to_buffer(image)}
+        else:
+            return None  # image = PIL.Image.new("RGB", (1, 1), "white")
+
+    def caption_rect(self, path):
+        logger.debug("caption_rect")
+        image = self.pil_load(path)
+        image = image.convert("RGB")
+        return self.find_caption_rect(image)
+
+    def find_caption_rect(self, image):
+        """Find blue caption band in RGB image, returns (left, top, right,
+        bottom) tuple or None.
+        """
         width, height = image.size
 
         top_line = None
@@ -55,11 +76,8 @@ class ImageProcessor:
                     top_line = y
 
         if top_line and bottom_line and bottom_line > top_line:
-            image = image.crop((0, top_line, width, bottom_line))
-            # image = PIL.ImageOps.expand(image, border=50, fill="black")
-            return {"rc": (0, top_line, width, bottom_line), "data": self.to_buffer(image)}
-        else:
-            return None  # image = PIL.Image.new("RGB", (1, 1), "white")
+            return (0, top_line, width, bottom_line)
+        return None
 
     def caption(self, path):
         logger.debug("caption(...)")
@@ -183,6 +201,8 @@ class ImageProcessor:
         return None
 
     def pil_load(self, pathOrData):
+        if isinstance(pathOrData, PIL.Image.Image):
+            return pathOrData
         if isinstance(pathOrData, bytes):
             image = PIL.Image.open(io.BytesIO(pathOrData))
         else:
@@ -190,6 +210,14 @@ class ImageProcessor:
         return image
 
     def vips_load(self, pathOrData) -> pyvips.Image:
+        if isinstance(pathOrData, PIL.Image.Image):
+            image = pathOrData
+            if image.mode not in ("L", "LA", "RGB", "RGBA"):
+                image = image.convert("RGBA")
+            interpretation = "b-w" if image.mode in ("L", "LA") else "srgb"
+            res = image.info.get("dpi", (72, 72))  # vips loaders default is 72 dpi
+            return pyvips.Image.new_from_array(np.asarray(image)).copy(
+                interpretation=interpretation, xres=res[0] / 25.4, yres=res[1] / 25.4)
         if isinstance(pathOrData, bytes):
             image = pyvips.Image.new_from_buffer(pathOrData, "")
         else:
@@ -0,0 +1,101 @@
+import io
+import logging
+import logging.config
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from noisseur.model import ModelMatch, Rect
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FrameState:
+    """Last processed frame of some source with its OCR results."""
+    frame: np.ndarray = None   # grayscale pixels of original frame
+    chain: str = None          # preprocessing chain
+    scale: float = 1.0
+    version: str = None        # model set version
+    match: ModelMatch = None   # matched model, None when screen not recognized
+    osd: object = None         # OcrScreenData
+    ts: float = 0.0
+
+
+class FrameDiff:
+    """Cheap frame-to-frame difference on fixed size tiles."""
+
+    @staticmethod
+    def load_gray(pathOrData) -> np.ndarray:
+        if isinstance(pathOrData, Image.Image):
+            return np.asarray(pathOrData.convert("L"))
+        if isinstance(pathOrData, bytes):
+            image = Image.open(io.BytesIO(pathOrData))
+        else:
+            image = Image.open(pathOrData)
+        return np.asarray(image.convert("L"))
+
+    @staticmethod
+    def tiles(prev: np.ndarray, cur: np.ndarray, tile: int,
+              threshold: int) -> np.ndarray:
+        """Returns boolean (rows, cols) array of tiles with at least one pixel
+        changed by more than threshold.
+        """
+        d = np.abs(cur.astype(np.int16) - prev.astype(np.int16)) > threshold
+        h, w = d.shape
+        d = np.pad(d, ((0, -h % tile), (0, -w % tile)))
+        rows, cols = d.shape[0] // tile, d.shape[1] // tile
+        return d.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+
+    @staticmethod
+    def overlaps(tiles: np.ndarray, tile: int, rc: Rect) -> bool:
+        """Checks whether rect in frame coordinates overlaps changed tiles."""
+        rows, cols = tiles.shape
+        top = max(0, rc.top // tile)
+        left = max(0, rc.left // tile)
+        bottom = min(rows, max(rc.bottom - 1, rc.top) // tile + 1)
+        right = min(cols, max(rc.right - 1, rc.left) // tile + 1)
+        if bottom <= top or right <= left:
+            return False
+        return bool(tiles[top:bottom, left:right].any())
+
+
+class IncrementalTracker:
+    """Keeps last FrameState per source, least recently used sources are
+    dropped when max_sources is exceeded.
+    """
+
+    def __init__(self, max_sources: int):
+        self.max_sources = max_sources
+        self._states = OrderedDict()  # source -> FrameState
+        self._lock = threading.Lock()
+
+    def get(self, source: str) -> FrameState:
+        with self._lock:
+            state = self._states.get(source)
+            if state:
+                self._states.move_to_end(source)
+            return state
+
+    def put(self, source: str, state: FrameState) -> None:
+        with self._lock:
+            if state:
+                state.ts = time.time()
+                self._states[source] = state
+                self._states.move_to_end(source)
+            else:
+                self._states.pop(source, None)
+            while len(self._states) > self.max_sources:
+                self._states.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sources": len(self._states), "max_sources": self.max_sources}
@@ -1,14 +1,29 @@
 import os
 import io
+import hashlib
 import logging
 import logging.config
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from noisseur.cfg import AppConfig
 from enum import Enum
 from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json
 from PIL import Image, ImageDraw
 from pathlib import Path
+from noisseur.bundle import ModelBundle
+from noisseur.classifier import ScreenClassifier
+from noisseur.extract import extract_texts
 from noisseur.hocr import HocrParser
+from noisseur.textindex import DocumentTextIndex, TrigramIndex
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
 
 logger = logging.getLogger(__name__)
 
@@ -80,6 +95,39 @@ class Rect:
         return [self.left, self.top, self.right, self.bottom]
 
 
+class WordGrid:
+    """Uniform grid index of document word bbox centers, built once per
+    document, so item rects are range queries instead of scans over all
+    words.
+    """
+    #: grid cell size in document pixels, about text line height
+    CELL_SIZE: int = 32
+
+    def __init__(self, words: list, cell_size: int = CELL_SIZE):
+        self.words = words  # HocrParser.OcrxWord[]
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> [(word index, center Point)]
+        for i, w in enumerate(words):
+            pt: Point = Rect.from_bbox(w.bbox).center()
+            cell = (pt.x // cell_size, pt.y // cell_size)
+            self.cells.setdefault(cell, []).append((i, pt))
+
+    def query(self, rc: Rect) -> list:
+        """Returns words which bbox center is inside rc in document order."""
+        cs = self.cell_size
+        left, top = rc.left // cs, rc.top // cs
+        right, bottom = rc.right // cs, rc.bottom // cs
+        if (right - left + 1) * (bottom - top + 1) > len(self.cells):
+            cells = [v for (x, y), v in self.cells.items()
+                     if left <= x <= right and top <= y <= bottom]
+        else:
+            columns, rows = range(left, right + 1), range(top, bottom + 1)
+            keys = [(x, y) for x in columns for y in rows]
+            cells = [self.cells[key] for key in keys if key in self.cells]
+        res = sorted(i for cell in cells for i, pt in cell if rc.contains(pt))
+        return [self.words[i] for i in res]
+
+
 @dataclass_json
 @dataclass
 class GeomObject(BaseObject):
@@ -122,6 +170,21 @@ class ControlPointType(str, Enum):
         return self.value
 
 
+@dataclass_json
+@dataclass
+class OcrProfile:
+    """Item level OCR settings used when item region is OCR-ed
+    separately (roi/incremental modes) and when item words are refined,
+    unset values fall back to TESSERACT_HOCR_CONFIG/ROI_PSM (REFINE_PSM/
+    REFINE_SCALE in refine).
+    """
+    whitelist: str = None  # tessedit_char_whitelist, e.g. "0123456789/"
+    psm: int = None        # tesseract page segmentation mode, e.g. 7 for single line
+    oem: int = None        # tesseract OCR engine mode
+    dpi: int = None
+    scale: float = None    # item crop upscale factor before OCR
+
+
 @dataclass_json
 @dataclass
 class Item(GeomObject):
@@ -134,6 +197,7 @@ class Item(GeomObject):
     control_point: ControlPointType = None
     row_height: int = None
     list_item_screen_type: str = None
+    ocr: OcrProfile = None
 
 
 @dataclass_json
@@ -176,31 +240,287 @@ class ModelMatch:
     offset_y: int
     scale_x: float
     scale_y: float
+    score: int = None  # matched LABEL/CAPTION items, best match mode only
+    # per candidate score and timing
+    candidates: list = field(default=None, compare=False, repr=False)
 
     def copy(self):
-        return ModelMatch(self.model, self.offset_x, self.offset_y, self.scale_x,self.scale_y)
+        return ModelMatch(self.model, self.offset_x, self.offset_y, self.scale_x,
+                          self.scale_y, self.score, self.candidates)
+
+
+@dataclass
+class ModelLayout:
+    """Item rects of model at scale with zero offset, LIST rows expanded,
+    match offset is the only per frame rect math left.
+    """
+    model: Model = None
+    plan: tuple = None         # (screen type, entries) of ModelService._get_data_plan
+    rects: np.ndarray = None   # (m, 4) int64 item rects in plan order
+    data_rects: list = None    # (Item, Rect, owner Item, row) of get_data_rects
 
 
 class ModelService:
+    #: words of every item are searched by scan over all document words
+    EXTRACT_ENGINE_SCAN: str = "scan"
+    #: words of items are range queries to WordGrid built once per document
+    EXTRACT_ENGINE_GRID: str = "grid"
+    #: all item rects (list rows expanded) and word centers are matched in
+    #: one NumPy operation, noisseur.extract
+    EXTRACT_ENGINE_VECTOR: str = "vector"
+
+    #: control points are searched by scan over all models and document lines
+    MATCH_ENGINE_SCAN: str = "scan"
+    #: only models which control point trigrams are all in the document are
+    #: tried, in lines from DocumentTextIndex, noisseur.textindex
+    MATCH_ENGINE_INDEX: str = "index"
+
+    #: first registered model which control point is found wins
+    MATCH_MODE_FIRST: str = "first"
+    #: all models which control point is found are scored by LABEL/CAPTION
+    #: item texts found in their rects, best score wins
+    MATCH_MODE_BEST: str = "best"
+
+    #: frames are not classified by reference image fingerprints
+    CLASSIFIER_MODE_OFF: str = "off"
+    #: screen classified by fingerprint replaces caption OCR/search
+    CLASSIFIER_MODE_HINT: str = "hint"
+    #: the same as hint, frames of no known screen are not OCR-ed at all
+    CLASSIFIER_MODE_FILTER: str = "filter"
+
+    #: max cached layouts, layouts of MODEL_SCALES are built on reload
+    LAYOUT_CACHE_SIZE: int = 1024
 
     def __init__(self):
         logger.debug("ModelService()")
         self.models = []  # Model[]
-
-    def find_by_hocr(self, doc: HocrParser.Document, scale: float=1.0) -> ModelMatch:
-        for model in self.models:
-            match = self.match(doc, model, scale)
+        self.version = None  # string, hash of registered models
+        self._digest = hashlib.sha1()
+        self._by_id = {}           # model id -> Model, first registered wins
+        self._by_screen_type = {}  # screen type -> Model, first registered wins
+        self._control_points = {}  # model id -> control point Item or None
+        self._layouts = {}         # (id(Model), scale_x, scale_y) -> ModelLayout
+        # control point texts, (model position, text position) keys
+        self._cp_index = TrigramIndex()
+        self._executor = None
+        self._lock = threading.Lock()
+        self.classifier = None  # ScreenClassifier of screen models, built on reload
+
+    def __getstate__(self) -> dict:
+        """Registry and precomputed layouts/indexes, pickled to ModelBundle."""
+        state = self.__dict__.copy()
+        for name in ("_executor", "_lock", "_digest"):
+            del state[name]
+        # layouts are keyed by id of model object, which is not kept by pickle
+        state["_layouts"] = [(scale_x, scale_y, layout)
+                             for (_, scale_x, scale_y), layout in self._layouts.items()]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        layouts = state.pop("_layouts")
+        self.__dict__.update(state)
+        self._executor = None
+        self._lock = threading.Lock()
+        # models added later extend digest of bundle version
+        self._digest = hashlib.sha1((self.version or "").encode("utf-8"))
+        self._layouts = {(id(layout.model), scale_x, scale_y): layout
+                         for scale_x, scale_y, layout in layouts}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if not self._executor:
+            with self._lock:
+                if not self._executor:
+                    size = AppConfig.instance.MATCH_POOL_SIZE
+                    self._executor = ThreadPoolExecutor(max_workers=size,
+                                                        thread_name_prefix="match")
+        return self._executor
+
+    def find_by_hocr(self, doc: HocrParser.Document, scale: float = 1.0,
+                     engine: str = None, mode: str = None) -> ModelMatch:
+        """Returns match of model found in doc, engine is one of
+        MATCH_ENGINE_*, configured MATCH_ENGINE by default, mode is one of
+        MATCH_MODE_*, configured MATCH_MODE by default.
+        """
+        if not engine:
+            engine = ModelFactory.get_config().MATCH_ENGINE
+        if not mode:
+            mode = ModelFactory.get_config().MATCH_MODE
+        if engine == ModelService.MATCH_ENGINE_SCAN:
+            models = self.models
+            index = None
+        else:
+            index = DocumentTextIndex(doc)
+            keys = self._cp_index.candidates(index.trigrams)
+            positions = sorted({pos for pos, _ in keys})
+            models = [self.models[pos] for pos in positions]
+        if mode == ModelService.MATCH_MODE_BEST:
+            return self.find_best(doc, models, scale, index)
+        for model in models:
+            match = self.match(doc, model, scale, index)
             if match:
                 return match
         return None
 
+    def find_best(self, doc: HocrParser.Document, models: list, scale: float,
+                  index: DocumentTextIndex = None, workers: int = None) -> ModelMatch:
+        """Returns match of models (registry order) with most LABEL/CAPTION
+        item texts found in their rects, the first one of equal scores.
+        Candidates are evaluated concurrently by executor when workers
+        (configured MATCH_POOL_SIZE by default) > 0, ones which can't beat
+        best score found so far are pruned, match candidates are score and
+        timing of each model.
+        """
+        if workers is None:
+            workers = ModelFactory.get_config().MATCH_POOL_SIZE
+        grid = WordGrid(doc.words)
+        lock = threading.Lock()
+        best = [None]  # (score, -order, ModelMatch), the greatest wins
+
+        def beaten(bound: int, order: int) -> bool:
+            b = best[0]
+            return b is not None and (bound, -order) < b[:2]
+
+        def evaluate(order: int, model: Model, items: list) -> dict:
+            dt = time.perf_counter()
+            res = {"model": model.id, "score": None, "pruned": False}
+            if beaten(len(items), order):
+                res["pruned"] = True
+            else:
+                match = self.match(doc, model, scale, index)
+                if match:
+                    score = 0
+                    for k, item in enumerate(items):
+                        if beaten(score + len(items) - k, order):
+                            res["pruned"] = True
+                            break
+                        if self.is_item_found(grid, match, item):
+                            score += 1
+                    else:
+                        match.score = res["score"] = score
+                        with lock:
+                            if not best[0] or (score, -order) > best[0][:2]:
+                                best[0] = (score, -order, match)
+            res["ms"] = round((time.perf_counter() - dt) * 1000, 3)
+            return res
+
+        tasks = [(order, model, self.get_label_items(model))
+                 for order, model in enumerate(models)]
+        # the most promising first, so the rest is pruned
+        tasks.sort(key=lambda task: -len(task[2]))
+        if len(tasks) > 1 and workers > 0:
+            results = list(self.executor.map(lambda task: evaluate(*task), tasks))
+        else:
+            results = [evaluate(*task) for task in tasks]
+        pairs = sorted(zip(tasks, results), key=lambda x: x[0][0])
+        candidates = [res for _, res in pairs]
+        logger.debug(f"match candidates: {candidates}")
+        if not best[0]:
+            return None
+        match = best[0][2]
+        match.candidates = candidates
+        return match
+
+    @staticmethod
+    def get_label_items(model: Model) -> list:
+        """Returns LABEL/CAPTION items with text, scored by find_best."""
+        if not model.form:
+            return []
+        types = (ItemType.LABEL, ItemType.CAPTION)
+        items = [item for item in model.form.items if item.type in types and item.text]
+        return [item for item in items if any(s.strip() for s in item.text)]
+
+    @staticmethod
+    def is_item_found(grid: WordGrid, match: ModelMatch, item: Item) -> bool:
+        """Returns True if any text of item is in words inside its rect
+        (case-insensitive).
+        """
+        rc: Rect = item.rect.copy().scale(match.scale_x, match.scale_y)
+        rc.offset(match.offset_x, match.offset_y)
+        text = " ".join(w.text for w in grid.query(rc) if w.text).lower()
+        return any(s.strip() and s.lower() in text for s in item.text)
+
     def find_by_id(self, model_id: str) -> Model:
-        return next((m for m in self.models if m.id == model_id), None)
+        return self._by_id.get(model_id)
 
     def find_by_screen_type(self, screen_type: str) -> Model:
-        return next((m for m in self.models if m.screen_type == screen_type), None)
+        return self._by_screen_type.get(screen_type)
+
+    def get_control_point(self, model: Model) -> Item:
+        """Returns top left control point item, precomputed for registered
+        models.
+        """
+        if model.id in self._control_points and self._by_id.get(model.id) is model:
+            return self._control_points[model.id]
+        return model.form.find_control_point() if model.form else None
+
+    def _index_control_point(self, pos: int, model: Model) -> None:
+        """Adds control point texts of model at registry position to trigram
+        index, texts after empty one are never tried by match.
+        """
+        item = self.get_control_point(model) if model.form else None
+        if not item:
+            return
+        for k, text in enumerate(item.text):
+            text = text.lower()
+            if not text.split():
+                break
+            self._cp_index.add((pos, k), text)
+
+    def get_layout(self, model: Model, scale_x: float, scale_y: float) -> ModelLayout:
+        """Returns item rects of model at scale with zero offset, cached."""
+        key = (id(model), scale_x, scale_y)
+        layout: ModelLayout = self._layouts.get(key)
+        if layout and layout.model is model:
+            return layout
+
+        match = ModelMatch(model, 0, 0, scale_x, scale_y)
+        rects = []
+        plan = self._get_data_plan(match, rects)
+        data_rects = []
+        self._get_data_rects(match, data_rects, None, None)
+        boxes = np.array([rc.to_list() for rc in rects], dtype=np.int64).reshape(-1, 4)
+        layout = ModelLayout(model, plan, boxes, data_rects)
+        if len(self._layouts) < ModelService.LAYOUT_CACHE_SIZE:
+            self._layouts[key] = layout
+        return layout
+
+    def build_layouts(self, scales: list) -> None:
+        """Precomputes layouts of all registered models at scales."""
+        for model in self.models:
+            for scale in scales:
+                try:
+                    self.get_layout(model, scale, scale)
+                except Exception as ex:
+                    logger.warning(f"layout of {model.id} at scale {scale} "
+                                   f"is not built: {str(ex)}")
+
+    def get_data_as_dict(self, doc: HocrParser.Document, match: ModelMatch,
+                         engine: str = None) -> dict:
+        """Returns item texts and data fields of matched model, engine is
+        one of EXTRACT_ENGINE_*, configured EXTRACT_ENGINE by default.
+        """
+        if not engine:
+            engine = ModelFactory.get_config().EXTRACT_ENGINE
+        if engine == ModelService.EXTRACT_ENGINE_SCAN:
+            return self._get_data_as_dict(doc, match)
+        if not match or not doc or not match.model:
+            return None
 
-    def get_data_as_dict(self, doc: HocrParser.Document, match: ModelMatch) -> dict:
+        layout: ModelLayout = self.get_layout(match.model, match.scale_x, match.scale_y)
+        offset = [match.offset_x, match.offset_y, match.offset_x, match.offset_y]
+        rects = layout.rects + np.array(offset)
+        if engine == ModelService.EXTRACT_ENGINE_VECTOR:
+            texts = extract_texts(doc, rects)
+        else:
+            grid = WordGrid(doc.words)
+            texts = []
+            for rc in rects.tolist():
+                words = grid.query(Rect(*rc))
+                texts.append(" ".join([w.text for w in words]) if words else None)
+        return self._fill_data_plan(layout.plan, texts)
+
+    def _get_data_as_dict(self, doc: HocrParser.Document, match: ModelMatch) -> dict:
         if not match or not doc:
             return None
 
@@ -221,14 +541,14 @@ class ModelService:
                     rc2.scale(match.scale_x, match.scale_y)
 
                     match2: ModelMatch = match.copy()
-                    match2.model = ModelFactory.get_service().find_by_screen_type(item.list_item_screen_type)
+                    match2.model = self.find_by_screen_type(item.list_item_screen_type)
                     if not match2.model:
                         raise Exception(f"Model not found: item.id={str(item.id)},"
                                         " screen_type={str(item.list_item_screen_type)}")
                     match2.offset_x = match2.offset_x + rc2.left
                     match2.offset_y = match2.offset_y + rc2.top
 
-                    res2 = self.get_data_as_dict(doc, match2)
+                    res2 = self._get_data_as_dict(doc, match2)
                     if res2 and res2["data"]:
                         data2 = res2["data"]
                         # add only dict with non-empty values
@@ -260,24 +580,190 @@ class ModelService:
         res = {"items": items, "type": match.model.screen_type, "data": data}
         return res
 
+    def _get_data_plan(self, match: ModelMatch, rects: list) -> tuple:
+        """Returns (screen type, entries) plan of _get_data_as_dict result,
+        entry is (item, index in rects) or (LIST item, row plans), rects
+        are scaled and offset in the same way.
+        """
+        entries = []
+        for item in match.model.form.items:
+            if item.type == ItemType.LIST and item.row_height:
+                rows = []
+                for y in range(item.rect.top, item.rect.bottom, item.row_height):
+                    bottom = y + item.row_height
+                    rc2: Rect = Rect(item.rect.left, y, item.rect.right, bottom)
+                    rc2.scale(match.scale_x, match.scale_y)
+
+                    match2: ModelMatch = match.copy()
+                    match2.model = self.find_by_screen_type(item.list_item_screen_type)
+                    if not match2.model:
+                        raise Exception(f"Model not found: item.id={str(item.id)},"
+                                        " screen_type={str(item.list_item_screen_type)}")
+                    match2.offset_x = match2.offset_x + rc2.left
+                    match2.offset_y = match2.offset_y + rc2.top
+                    rows.append(self._get_data_plan(match2, rects))
+                entries.append((item, rows))
+            else:
+                rc: Rect = item.rect.copy()
+                rc.scale(match.scale_x, match.scale_y)
+                rc.offset(match.offset_x, match.offset_y)
+                entries.append((item, len(rects)))
+                rects.append(rc)
+        return match.model.screen_type, entries
+
+    def _fill_data_plan(self, plan: tuple, texts: list) -> dict:
+        screen_type, entries = plan
+        items = {}
+        data = {}
+        for item, entry in entries:
+            if isinstance(entry, list):
+                lst = []
+                for index, plan2 in enumerate(entry):
+                    data2 = self._fill_data_plan(plan2, texts)["data"]
+                    if data2:
+                        # add only dict with non-empty values
+                        if any(data2.values()):
+                            lst.append(data2)
+                        data2["index"] = index
+                if item.data_field:
+                    data[item.data_field] = lst
+            else:
+                text = texts[entry]
+                items[item.id] = text
+                if item.data_field:
+                    data[item.data_field] = text
+        return {"items": items, "type": screen_type, "data": data}
+
+    def get_data_rects(self, match: ModelMatch) -> list:
+        """Returns (Item, Rect, owner Item, row index) list of all items with
+        data field, LIST items are expanded to rows of list item model,
+        owner is top level form item and row is its list row index or None.
+        Rects are scaled and offset in the same way as in get_data_as_dict.
+        """
+        if not match or not match.model or not match.model.form:
+            return []
+        layout: ModelLayout = self.get_layout(match.model, match.scale_x, match.scale_y)
+        return [(item, rc.copy().offset(match.offset_x, match.offset_y), owner, row)
+                for item, rc, owner, row in layout.data_rects]
+
+    def _get_data_rects(self, match: ModelMatch, res: list, owner: Item,
+                        row: int) -> None:
+        if not match or not match.model or not match.model.form:
+            return
+
+        for item in match.model.form.items:
+            if item.type == ItemType.LIST and item.row_height:
+                index = 0
+                for y in range(item.rect.top, item.rect.bottom, item.row_height):
+                    rc2: Rect = Rect(item.rect.left, y, item.rect.right,
+                                     y + item.row_height)
+                    rc2.scale(match.scale_x, match.scale_y)
+
+                    match2: ModelMatch = match.copy()
+                    match2.model = self.find_by_screen_type(item.list_item_screen_type)
+                    if not match2.model:
+                        raise Exception(f"Model not found: item.id={str(item.id)},"
+                                        " screen_type={str(item.list_item_screen_type)}")
+                    match2.offset_x = match2.offset_x + rc2.left
+                    match2.offset_y = match2.offset_y + rc2.top
+                    self._get_data_rects(match2, res,
+                                         owner if owner else item,
+                                         row if owner else index)
+                    index += 1
+            elif item.data_field:
+                rc: Rect = item.rect.copy()
+                rc.scale(match.scale_x, match.scale_y)
+                rc.offset(match.offset_x, match.offset_y)
+                res.append((item, rc, owner if owner else item, row))
+
+    def build_classifier(self, threshold: float, frame_sizes: list = None) -> None:
+        """Fingerprints reference images of screen models, models which are
+        list item screen types of other models are not screens. Spectra are
+        precomputed for frame_sizes ((width, height) list), see
+        ScreenClassifier.prepare.
+        """
+        list_items = self.get_list_item_screen_types()
+        classifier = ScreenClassifier(threshold)
+        for model in self.models:
+            if model.screen_type in list_items or not model.image_path:
+                continue
+            path = self.get_image_path(model)
+            if not os.path.exists(path):
+                logger.warning(f"reference image of model {model.id} not found: {path}")
+                continue
+            classifier.add(model, ScreenClassifier.load_gray(path))
+        classifier.prepare(frame_sizes)
+        self.classifier = classifier
+
+    def get_list_item_screen_types(self) -> set:
+        """Returns screen types of models used as LIST item rows."""
+        return {item.list_item_screen_type for model in self.models if model.form
+                for item in model.form.items if item.list_item_screen_type}
+
     def get_image_path(self, model: Model) -> str:
-        return os.path.join(AppConfig.instance.ROOT_PATH, model.image_path)
+        return os.path.join(ModelFactory.get_config().ROOT_PATH, model.image_path)
 
     def load(self, path: str) -> Model:
         logger.debug("load(path={})".format(path))
         with open(path, "r") as f:
             s = f.read()
+            if Path(path).suffix.lower() in (".yaml", ".yml"):
+                if not yaml:
+                    raise ImportError(f"PyYAML is required to load YAML model: {path}")
+                return Model.from_dict(yaml.safe_load(s))
             model: Model = Model.from_json(s)
             return model
 
-    def match(self, doc: HocrParser.Document, model: Model, scale: float) -> ModelMatch:
+    def validate(self) -> list:
+        """Returns errors of registered models, e.g. missing control point
+        or unresolved list_item_screen_type references.
+        """
+        errors = []
+        ids = set()
+        list_items = self.get_list_item_screen_types()
+        for model in self.models:
+            name = model.id or model.screen_type or model.image_path
+            if not model.id:
+                errors.append(f"{name}: model id is missing")
+            elif model.id in ids:
+                errors.append(f"{name}: duplicate model id")
+            ids.add(model.id)
+            if not model.screen_type:
+                errors.append(f"{name}: screen_type is missing")
+            if not model.form:
+                errors.append(f"{name}: form is missing")
+                continue
+            item = model.form.find_control_point()
+            if not item:
+                # list item rows are never matched
+                if model.screen_type not in list_items:
+                    errors.append(f"{name}: top_left control point is missing")
+            elif not item.text or not item.text[0].split():
+                errors.append(f"{name}: control point {item.id} has no text")
+            for item in model.form.items:
+                if not item.rect:
+                    errors.append(f"{name}: item {item.id} has no rect")
+                if item.type == ItemType.LIST:
+                    if not item.row_height or item.row_height <= 0:
+                        errors.append(f"{name}: list item {item.id} has no row_height")
+                    if not item.list_item_screen_type:
+                        errors.append(f"{name}: list item {item.id} "
+                                      "has no list_item_screen_type")
+                    elif not self.find_by_screen_type(item.list_item_screen_type):
+                        errors.append(f"{name}: list item {item.id} "
+                                      "references unknown screen type "
+                                      f"{item.list_item_screen_type}")
+        return errors
+
+    def match(self, doc: HocrParser.Document, model: Model, scale: float,
+              index: DocumentTextIndex = None) -> ModelMatch:
         if not model:
             return None
 
         if not model.form:
             return None
 
-        item = model.form.find_control_point()
+        item = self.get_control_point(model)
         if not item:
             logger.debug("control point not found")
             return None
@@ -290,35 +776,54 @@ class ModelService:
             if l < 1:
                 return None
 
-            for line in doc.lines:
-                if line.text and line.text.lower().find(text) >= 0:
-                    for i, w in enumerate(line.words):
-                        if w.text.lower().find(a[0]) >= 0:
-                            words = []
-                            rc: Rect = None
-                            logger.debug(f"range: {str(i)}, {str(i+l)}")
-                            for k in range(i, i+l):
-                                word = line.words[k]
-                                logger.debug(f"word[{str(k)}] = {word.text}")
-                                rc2: Rect = Rect.from_bbox(word.bbox)
-                                if rc:
-                                    rc.union(rc2)
-                                else:
-                                    rc = rc2
-                                words.append(word)
-
-                            scale_x: float = scale
-                            scale_y: float = scale
-                            pt_hocr: Point = rc.center()
-                            pt_item: Point = item.rect.copy().scale(scale_x, scale_y).center()
-                            return ModelMatch(model, pt_hocr.x - pt_item.x, pt_hocr.y - pt_item.y, scale_x, scale_y)
+            if index:
+                lines = index.find_lines(text)
+            else:
+                lines = [line for line in doc.lines
+                         if line.text and line.text.lower().find(text) >= 0]
+            for line in lines:
+                for i, w in enumerate(line.words):
+                    if w.text.lower().find(a[0]) >= 0:
+                        words = []
+                        rc: Rect = None
+                        logger.debug(f"range: {str(i)}, {str(i + l)}")
+                        for k in range(i, i + l):
+                            word = line.words[k]
+                            logger.debug(f"word[{str(k)}] = {word.text}")
+                            rc2: Rect = Rect.from_bbox(word.bbox)
+                            if rc:
+                                rc.union(rc2)
+                            else:
+                                rc = rc2
+                            words.append(word)
+
+                        scale_x: float = scale
+                        scale_y: float = scale
+                        pt_hocr: Point = rc.center()
+                        rc_item: Rect = item.rect.copy().scale(scale_x, scale_y)
+                        pt_item: Point = rc_item.center()
+                        offset_x, offset_y = pt_hocr.x - pt_item.x, pt_hocr.y - pt_item.y
+                        return ModelMatch(model, offset_x, offset_y, scale_x, scale_y)
         return None
 
     def register(self, path: str) -> None:
         logger.debug("register(...)")
         model: Model = self.load(path)
         if model:
-            self.models.append(model)
+            self.add(model)
+
+    def add(self, model: Model) -> None:
+        """Adds loaded model to registry and its indexes."""
+        self.models.append(model)
+        self._by_id.setdefault(model.id, model)
+        self._by_screen_type.setdefault(model.screen_type, model)
+        cp = model.form.find_control_point() if model.form else None
+        self._control_points.setdefault(model.id, cp)
+        self._index_control_point(len(self.models) - 1, model)
+        # layouts depend on LIST item models
+        self._layouts.clear()
+        self._digest.update(model.to_json().encode("utf-8"))
+        self.version = self._digest.hexdigest()[:12]
 
     def visualize_as_png(self, model: Model) -> bytes:
         logger.debug("visualize_as_png(...)")
@@ -345,30 +850,198 @@ class ModelService:
 
 
 class ModelFactory:
-    __model_service = None
+    #: (model service, configuration) tuple, reload replaces it by one assignment,
+    #: so that requests read it without lock
+    __state: tuple = None
+    __reload_lock = threading.Lock()  # serializes reloads, requests don't take it
+    __local = threading.local()  # service and configuration pinned to thread by snapshot
+
+    #: modules of classes pickled to model bundle, bundle is stale when their code
+    #: changes
+    BUNDLE_MODULES: list = ["model.py", "classifier.py", "textindex.py"]
 
     @staticmethod
     def init() -> None:
-        svc = ModelFactory.get_service()
+        ModelFactory.get_service()
 
     @staticmethod
     def get_service() -> ModelService:
-        if not ModelFactory.__model_service:
-            ModelFactory.reload()
-        return ModelFactory.__model_service
+        svc = getattr(ModelFactory.__local, "service", None)
+        if svc:
+            return svc
+        return ModelFactory.get_snapshot()[0]
 
     @staticmethod
-    def reload() -> None:
-        logger.debug("reload()")
+    def get_config() -> AppConfig:
+        """Returns configuration pinned to calling thread by snapshot,
+        AppConfig.instance otherwise. Settings read per request are read
+        by it, so that request doesn't mix previous and reloaded ones.
+        """
+        return getattr(ModelFactory.__local, "config", None) or AppConfig.instance
+
+    @staticmethod
+    def get_snapshot() -> tuple:
+        """Returns (model service, configuration) pinned to calling thread,
+        current ones otherwise.
+        """
+        local = ModelFactory.__local
+        svc = getattr(local, "service", None)
+        if svc:
+            return svc, local.config
+        state = ModelFactory.__state
+        if not state:
+            with ModelFactory.__reload_lock:
+                if not ModelFactory.__state:
+                    ModelFactory.__swap(ModelFactory.load(), None)
+                state = ModelFactory.__state
+        return state
+
+    @staticmethod
+    @contextmanager
+    def snapshot(pinned: tuple = None):
+        """Pins current model service and configuration to calling thread,
+        get_service and get_config return them until the block exits, so
+        that reload in the meantime doesn't change models and settings in
+        the middle of request. Nested blocks keep outer snapshot. Snapshot
+        of another thread (see get_snapshot, bind) is pinned when specified.
+        """
+        local = ModelFactory.__local
+        prev = (getattr(local, "service", None), getattr(local, "config", None))
+        if not prev[0]:
+            local.service, local.config = pinned or ModelFactory.get_snapshot()
+        try:
+            yield local.service
+        finally:
+            local.service, local.config = prev
+
+    @staticmethod
+    def bind(fn):
+        """Returns fn running in snapshot of calling thread, for tasks of
+        request submitted to thread pools.
+        """
+        pinned = ModelFactory.get_snapshot()
+
+        def run(*args, **kwargs):
+            with ModelFactory.snapshot(pinned):
+                return fn(*args, **kwargs)
+        return run
+
+    @staticmethod
+    def get_scales(cfg: AppConfig = None) -> list:
+        """Returns scales model layouts are precomputed for."""
+        cfg = cfg or AppConfig.instance
+        return sorted({float(s) for s in cfg.MODEL_SCALES + cfg.ADAPTIVE_SCALES})
+
+    @staticmethod
+    def get_frame_sizes(cfg: AppConfig = None) -> list:
+        """Returns (width, height) frame sizes classifier spectra are
+        precomputed for.
+        """
+        cfg = cfg or AppConfig.instance
+        return [tuple(int(v) for v in s.lower().split("x"))
+                for s in cfg.CLASSIFIER_FRAME_SIZES]
+
+    @staticmethod
+    def get_bundle(cfg: AppConfig = None) -> ModelBundle:
+        """Returns configured MODEL_BUNDLE, None when bundle is not used."""
+        cfg = cfg or AppConfig.instance
+        if not cfg.MODEL_BUNDLE:
+            return None
+        return ModelBundle(os.path.join(cfg.ROOT_PATH, cfg.MODEL_BUNDLE), cfg.ROOT_PATH)
+
+    @staticmethod
+    def get_bundle_schema() -> str:
+        digest = hashlib.sha1()
+        for name in ModelFactory.BUNDLE_MODULES:
+            with open(os.path.join(os.path.dirname(__file__), name), "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    @staticmethod
+    def build(classifier: bool, cfg: AppConfig = None) -> ModelService:
+        """Builds model service from MODEL_LIST files."""
+        cfg = cfg or AppConfig.instance
         svc = ModelService()
-        lst = AppConfig.instance.MODEL_LIST
+        lst = cfg.MODEL_LIST
         if lst:
             for path in lst:
                 logger.debug("path="+path)
-                svc.register(os.path.join(AppConfig.instance.ROOT_PATH, path))
-        ModelFactory.__model_service = svc
+                svc.register(os.path.join(cfg.ROOT_PATH, path))
+        svc.build_layouts(ModelFactory.get_scales(cfg))
+        if classifier:
+            svc.build_classifier(cfg.CLASSIFIER_THRESHOLD,
+                                 ModelFactory.get_frame_sizes(cfg))
+        return svc
 
+    @staticmethod
+    def compile() -> tuple:
+        """Builds model service from MODEL_LIST files and writes it to
+        MODEL_BUNDLE unless models have errors, returns (ModelService,
+        errors, bundle header).
+        """
+        cfg = AppConfig.instance
+        bundle = ModelFactory.get_bundle()
+        if not bundle:
+            raise ValueError("MODEL_BUNDLE is not configured")
+        svc = ModelFactory.build(True)
+        errors = svc.validate()
+        if errors:
+            return svc, errors, None
+        inputs = cfg.MODEL_LIST or []
+        images = [model.image_path for model in svc.models if model.image_path]
+        paths = list(dict.fromkeys(inputs + images))
+        header = bundle.write(svc, inputs, paths, ModelFactory.get_bundle_schema())
+        return svc, errors, header
 
-# ModelFactory.init()
+    @staticmethod
+    def load(cfg: AppConfig = None) -> ModelService:
+        """Loads new model service from MODEL_BUNDLE when it is up to date,
+        from MODEL_LIST files otherwise, current service is not changed.
+        """
+        cfg = cfg or AppConfig.instance
+        classifier = cfg.CLASSIFIER_MODE != ModelService.CLASSIFIER_MODE_OFF
+        svc: ModelService = None
+        bundle = ModelFactory.get_bundle(cfg)
+        if bundle:
+            svc = bundle.load(cfg.MODEL_LIST or [], ModelFactory.get_bundle_schema())
+        if svc:
+            logger.info(f"models loaded from bundle: {bundle.path}")
+            # layouts of scales configured after compilation
+            svc.build_layouts(ModelFactory.get_scales(cfg))
+            if not classifier:
+                svc.classifier = None
+            elif svc.classifier:
+                # spectra of frame sizes configured after compilation
+                svc.classifier.threshold = cfg.CLASSIFIER_THRESHOLD
+                svc.classifier.prepare(ModelFactory.get_frame_sizes(cfg))
+            else:
+                svc.build_classifier(cfg.CLASSIFIER_THRESHOLD,
+                                     ModelFactory.get_frame_sizes(cfg))
+        else:
+            svc = ModelFactory.build(classifier, cfg)
+        return svc
+
+    @staticmethod
+    def reload(cfg: AppConfig = None) -> ModelService:
+        """Loads new model service and swaps it in at once, requests in
+        flight keep their snapshot and new ones use previous models until
+        loading is done. When cfg (see app_reload) is specified, models are
+        loaded with it and it replaces AppConfig.instance together with them.
+        """
+        logger.debug("reload()")
+        with ModelFactory.__reload_lock:
+            # requests keep reading previous state while models are loaded
+            svc = ModelFactory.load(cfg)
+            ModelFactory.__swap(svc, cfg)
+        logger.info(f"models reloaded, version: {svc.version}, "
+                    f"models: {len(svc.models)}")
+        return svc
+
+    @staticmethod
+    def __swap(svc: ModelService, cfg: AppConfig) -> None:
+        if cfg:
+            AppConfig.instance = cfg
+        ModelFactory.__state = (svc, AppConfig.instance)
 
 
+# ModelFactory.init()
@@ -1,7 +1,8 @@
 import os.path
 import logging
 import pytest
-from noisseur.model import Model, ModelFactory, Form, Item, Relation, Rect, ItemType, ControlPointType
+from noisseur.model import (Model, Form, Item, Relation, Rect, ItemType,
+                            ControlPointType, OcrProfile)
 from noisseur.cfg import AppConfig
 
 logger = logging.getLogger(__name__)
@@ -100,6 +101,7 @@ def generate_model_007():
     item.text = None
     item.data_field = "patient_id"
     item.data_type = "str"
+    item.ocr = OcrProfile(psm=7)
     form.items.append(item)
 
     item = Item()
@@ -117,6 +119,7 @@ def generate_model_007():
     item.data_field = "date_of_birth"
     item.data_type = "date"
     item.data_format = "M/d/yyyy"
+    item.ocr = OcrProfile(whitelist="0123456789/", psm=7)
     form.items.append(item)
 
     item = Item()
@@ -149,6 +152,7 @@ def generate_model_007():
     item.text = None
     item.data_field = "age"
     item.data_type = "int"
+    item.ocr = OcrProfile(whitelist="0123456789", psm=7)
     form.items.append(item)
 
     item = Item()
@@ -653,4 +657,4 @@ def generate_models():
     generate_model_007()
     generate_model_010()
     generate_model_011()
-    # ModelFactory.reload()
\ No newline at end of file
+    # ModelFactory.reload()
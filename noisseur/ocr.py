@@ -1,24 +1,33 @@
+import copy
+import datetime
+import io
 import logging
 import logging.config
 import os
-import io
-import re
-import time
-import datetime
 import platform
-import pytesseract
-import pyvips
-from dataclasses import dataclass, field
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
 from dataclasses_json import dataclass_json
 from PIL import Image, ImageDraw, ImageFont
 
 from noisseur.cfg import AppConfig
-from noisseur.imgproc import ImageProcessor
+from noisseur.classifier import ScreenClassifier
+from noisseur.columnar import ColumnarDocument
+from noisseur.deadline import Deadline, OcrTimeoutError
+from noisseur.engine import (OcrEngine, OcrEngineFactory, TesseractConfig,
+                             parse_tesseract_config)
 from noisseur.hocr import HocrParser
-from noisseur.model import ModelFactory, ModelService, ModelMatch, Model
+from noisseur.imgproc import ImageProcessor
+from noisseur.incremental import FrameDiff, FrameState
+from noisseur.model import (Item, ItemType, ModelFactory, ModelMatch,
+                            ModelService, OcrProfile, Rect, WordGrid)
 
 logger = logging.getLogger(__name__)
 
+
 @dataclass_json
 @dataclass
 class OcrScreenData:
@@ -30,19 +39,94 @@ class OcrScreenData:
     type: str = None
     data: dict = None
     items: dict = None
+    stats: dict = None
+    timed_out: bool = False  # deadline expired, data is partial
+    model_version: str = None  # model set version, see ModelService.version
 
     def add_error(self, s: str):
         if not self.errors:
             self.errors = []
         self.errors.append(s)
 
+    def set_timed_out(self, stage: str):
+        """Marks data as partial, stage skipped or cut by deadline is
+        recorded in stats.
+        """
+        self.timed_out = True
+        if self.stats is None:
+            self.stats = {}
+        self.stats.setdefault("deadline_skipped", []).append(stage)
+
+
+@dataclass
+class OcrRegion:
+    """Image region to be OCR-ed separately, e.g. model data item."""
+    key: str = None
+    rect: Rect = None  # region in image coordinates, margin included
+    clip: Rect = None  # words with center outside of this rect are dropped
+    psm: int = None    # tesseract page segmentation mode
+    profile: OcrProfile = None  # item OCR profile, overrides psm when set
+    dpi: int = None    # source resolution when image scale differs from configured one
+
 
 class OcrService:
     WORD_CONFIDENCE_THRESHOLD: float = 40.0
     AVG_CONFIDENCE_THRESHOLD: float = 97.0
 
+    #: model detection by words of already parsed full screen hOCR
+    CAPTION_MODE_HOCR: str = "hocr"
+    #: model detection by separate OCR pass over caption image
+    CAPTION_MODE_OCR: str = "ocr"
+
+    #: OCR full preprocessed screen and extract data from it
+    EXTRACT_MODE_FULL: str = "full"
+    #: OCR only model data item regions after model is matched by caption
+    EXTRACT_MODE_ROI: str = "roi"
+    #: OCR full screen at low scale first, then only low confidence data
+    #: items at higher scales up to requested one
+    EXTRACT_MODE_ADAPTIVE: str = "adaptive"
+
+    #: no refinement of low confidence words
+    REFINE_MODE_OFF: str = "off"
+    #: re-OCR low confidence words inside model data items
+    REFINE_MODE_DATA: str = "data"
+    #: re-OCR all low confidence words
+    REFINE_MODE_ALL: str = "all"
+
+    #: tesseract hOCR output with char boxes, parsed by HOCR_PARSER
+    OUTPUT_FORMAT_HOCR: str = "hocr"
+    #: tesseract TSV output, words only, parsed by HocrParser.parse_tsv
+    OUTPUT_FORMAT_TSV: str = "tsv"
+
+    #: hOCR parsed with BeautifulSoup tree search, HocrParser.parse
+    HOCR_PARSER_SOUP: str = "soup"
+    #: hOCR parsed in one expat pass, HocrParser.parse_stream
+    HOCR_PARSER_STREAM: str = "stream"
+
+    #: document nodes are objects built by HocrParser
+    DOCUMENT_STORAGE_OBJECTS: str = "objects"
+    #: document words and glyphs are stored in NumPy columns, ColumnarDocument
+    DOCUMENT_STORAGE_COLUMNAR: str = "columnar"
+
     def __init__(self):
         self.imgProc = ImageProcessor()
+        self._executor = None
+        self._lock = threading.Lock()
+        self.warmup_results = None  # list of warm-up results per model
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if not self._executor:
+            with self._lock:
+                if not self._executor:
+                    workers = AppConfig.instance.TESSERACT_POOL_SIZE
+                    self._executor = ThreadPoolExecutor(max_workers=workers,
+                                                        thread_name_prefix="ocr")
+        return self._executor
+
+    @property
+    def engine(self) -> OcrEngine:
+        return OcrEngineFactory.get_engine()
 
     def hocr_visualize_as_png(self, path, chain: str, doc: HocrParser.Document) -> bytes:
         logger.debug("hocr_visualize_as_png(..., path={}, chain={})".format(path, chain))
@@ -96,35 +180,63 @@ class OcrService:
             img = self.imgProc.chain(path, chain)
             path = Image.open(io.BytesIO(img))
 
-        res = pytesseract.image_to_string(path)
+        res = self.engine.text(path)
         logger.debug("-> "+res)
         return res
 
-    def ocr_hocr(self, path, chain) -> HocrParser.Document:
+    def ocr_doc(self, image, cfg: TesseractConfig, output_format: str = None,
+                deadline: Deadline = None) -> HocrParser.Document:
+        """OCR image to HocrParser.Document via hOCR or TSV tesseract output,
+        TSV is faster to produce and parse but has no glyphs (char boxes).
+        OcrTimeoutError is raised when deadline expires before OCR is done.
+        """
+        config = ModelFactory.get_config()
+        if not output_format:
+            output_format = config.OCR_OUTPUT_FORMAT
+        timeout = deadline.remaining() if deadline else None
+        columnar = config.DOCUMENT_STORAGE == OcrService.DOCUMENT_STORAGE_COLUMNAR
+        if output_format == OcrService.OUTPUT_FORMAT_TSV:
+            if columnar:
+                return ColumnarDocument.parse_tsv(self.engine.tsv(image, cfg, timeout))
+            return HocrParser().parse_tsv(self.engine.tsv(image, cfg, timeout))
+        if columnar:
+            return ColumnarDocument.parse(self.engine.hocr(image, cfg, timeout))
+        if config.HOCR_PARSER == OcrService.HOCR_PARSER_SOUP:
+            return HocrParser().parse(self.engine.hocr(image, cfg, timeout))
+        return HocrParser().parse_stream(self.engine.hocr(image, cfg, timeout))
+
+    @staticmethod
+    def expired(deadline: Deadline, osd: OcrScreenData, stage: str) -> bool:
+        """Returns True when deadline is expired, so stage should be
+        skipped, osd is marked as timed out then.
+        """
+        if not deadline or not deadline.expired():
+            return False
+        osd.set_timed_out(stage)
+        return True
+
+    def ocr_hocr(self, path, chain, output_format: str = None,
+                 deadline: Deadline = None) -> HocrParser.Document:
         logger.debug(f'ocr_hocr(path={path})')
 
         if chain:
             img = self.imgProc.chain(path, chain)
             path = Image.open(io.BytesIO(img))
 
-        cfg = AppConfig.instance.TESSERACT_HOCR_CONFIG
+        cfg = ModelFactory.get_config().TESSERACT_HOCR_CONFIG
 
         logger.debug(f"cfg={cfg}")
-        res = pytesseract.image_to_pdf_or_hocr(path, config=cfg, extension='hocr')
-        res = res.decode('utf-8')
-
-        hp = HocrParser()
-        doc = hp.parse(res)
-        return doc
+        return self.ocr_doc(path, parse_tesseract_config(cfg), output_format, deadline)
 
-    def ocr_caption(self, path) -> ModelMatch:
+    def ocr_caption(self, path, deadline: Deadline = None) -> ModelMatch:
         logger.debug(f'ocr_caption(path={path})')
         caption = self.imgProc.caption_ex(path)
         if not caption:
             logger.debug("caption not found")
             return None
 
-        doc: HocrParser.Document = self.ocr_hocr(Image.open(io.BytesIO(caption["data"])), None)
+        image = Image.open(io.BytesIO(caption["data"]))
+        doc: HocrParser.Document = self.ocr_hocr(image, None, deadline=deadline)
         if not doc:
             logger.debug("hocr not found")
             return None
@@ -139,31 +251,277 @@ class OcrService:
         match.offset_y = int(match.offset_y + caption["rc"][1])  # add crop.rc.top coordinate
         return match
 
-    def ocr_screen(self, path, chain, scale: float, border: int) -> OcrScreenData:
-        logger.debug(f'ocr_screen(path={path})')
-        osd: OcrScreenData = OcrScreenData()
-        osd.success = False
-        osd.host = platform.node()
-        osd.ts = str(datetime.datetime.now())
+    def classify(self, path, osd: OcrScreenData) -> ModelMatch:
+        """Returns match of screen model found by reference image
+        fingerprint, in original image coordinates, None when frame is of no
+        known screen.
+        """
+        svc: ModelService = ModelFactory.get_service()
+        if not svc.classifier:
+            return None
         dt = time.time()
-        doc: HocrParser.Document = self.ocr_hocr(path, chain)
+        screen = svc.classifier.classify(ScreenClassifier.load_gray(path))
+        osd.stats["classifier"] = screen.model.screen_type if screen else None
+        osd.stats["classifier_score"] = round(screen.score, 3) if screen else None
+        osd.stats["classifier_ms"] = round((time.time() - dt) * 1000, 3)
+        if not screen:
+            logger.debug("screen not classified")
+            return None
+        return ModelMatch(screen.model, screen.x, screen.y, 1.0, 1.0)
+
+    @staticmethod
+    def set_match_stats(osd: OcrScreenData, match: ModelMatch, source: str) -> None:
+        """Records how model was matched, best match mode score and
+        candidates too.
+        """
+        osd.stats["model_match"] = source
+        if match.score is not None:
+            osd.stats["model_score"] = match.score
+            osd.stats["model_candidates"] = match.candidates
+
+    def calc_border(self, doc: HocrParser.Document, width: int, scale: float) -> int:
+        """Calculates border added by preprocessing chain around scaled
+        image of specified original width, based on hOCR page size.
+        """
+        if not doc.pages or not doc.pages[0].bbox:
+            return 0
+        bbox = doc.pages[0].bbox
+        return max(0, int((bbox.right - bbox.left - width * scale) / 2))
+
+    def find_caption_in_hocr(self, path, doc: HocrParser.Document,
+                             scale: float) -> ModelMatch:
+        """Finds model by caption words filtered from already parsed full
+        screen hOCR document, so no additional OCR pass is required.
+        """
+        logger.debug(f'find_caption_in_hocr(path={path})')
+        rc = self.imgProc.caption_rect(path)
+        if not rc:
+            logger.debug("caption not found")
+            return None
+
+        border = self.calc_border(doc, rc[2], scale)
+        caption_doc: HocrParser.Document = doc.crop(int(rc[0] * scale) + border,
+                                                    int(rc[1] * scale) + border,
+                                                    int(rc[2] * scale) + border,
+                                                    int(rc[3] * scale) + border)
+        if not caption_doc.words:
+            logger.debug("caption words not found in hocr")
+            return None
+
+        svc: ModelService = ModelFactory.get_service()
+        return svc.find_by_hocr(caption_doc, scale)
+
+    def ocr_region(self, image: Image, region: OcrRegion, output_format: str = None,
+                   deadline: Deadline = None) -> HocrParser.Document:
+        rc: Rect = region.rect
+        left = max(0, rc.left)
+        top = max(0, rc.top)
+        right = min(image.width, rc.right)
+        bottom = min(image.height, rc.bottom)
+        if right <= left or bottom <= top:
+            return HocrParser.Document()
+
+        config = ModelFactory.get_config()
+        cfg = parse_tesseract_config(config.TESSERACT_HOCR_CONFIG).copy()
+        if region.psm is not None:
+            cfg.psm = region.psm
+        if region.dpi:
+            cfg.dpi = region.dpi
+
+        crop = image.crop((left, top, right, bottom))
+        scale = 1.0
+        profile: OcrProfile = region.profile
+        if profile:
+            if profile.whitelist:
+                cfg.variables["tessedit_char_whitelist"] = profile.whitelist
+            if profile.psm is not None:
+                cfg.psm = profile.psm
+            if profile.oem is not None:
+                cfg.oem = profile.oem
+            if profile.dpi:
+                cfg.dpi = profile.dpi
+            if profile.scale and profile.scale != 1.0:
+                scale = profile.scale
+                size = (int(crop.width * scale), int(crop.height * scale))
+                crop = crop.resize(size, Image.BICUBIC)
+
+        doc = self.ocr_doc(crop, cfg, output_format, deadline)
+        if scale != 1.0:
+            doc.scale(1.0 / scale, 1.0 / scale)
+        doc.offset(left, top)
+        if region.clip:
+            clip = region.clip
+            doc = doc.crop(clip.left, clip.top, clip.right, clip.bottom)
+        return doc
+
+    def ocr_regions(self, image: Image, regions: list[OcrRegion],
+                    output_format: str = None, deadline: Deadline = None) -> dict:
+        """OCR image regions concurrently, returns region key to
+        HocrParser.Document dictionary, coordinates are in image space.
+        Regions not OCR-ed before deadline are missing in the dictionary.
+        """
+        logger.debug(f"ocr_regions(..., count={len(regions)})")
+        image.load()
+        # regions are OCR-ed with configuration of request snapshot
+        ocr_region = ModelFactory.bind(self.ocr_region)
+        submit = self.executor.submit
+        futures = [(region.key,
+                    submit(ocr_region, image, region, output_format, deadline))
+                   for region in regions]
+        res = {}
+        for key, future in futures:
+            try:
+                res[key] = future.result()
+            except OcrTimeoutError:
+                logger.debug(f"region {key} skipped, deadline expired")
+        return res
+
+    def preprocess(self, path, chain) -> Image:
+        if chain:
+            return Image.open(io.BytesIO(self.imgProc.chain(path, chain)))
+        return self.imgProc.pil_load(path)
+
+    def make_regions(self, rects: list, scale: float) -> list[OcrRegion]:
+        """Creates OcrRegion list from ModelService.get_data_rects items,
+        regions are extended by ROI_MARGIN and clipped to item rect, item
+        OCR profile is applied when specified.
+        """
+        cfg = ModelFactory.get_config()
+        margin = int(cfg.ROI_MARGIN * scale)
+        psm = cfg.ROI_PSM
+        regions = []
+        for index, (item, rc, _, _) in enumerate(rects):
+            rc2: Rect = Rect(rc.left - margin, rc.top - margin,
+                             rc.right + margin, rc.bottom + margin)
+            regions.append(OcrRegion(f"{index}:{item.id}", rc2, rc, psm, item.ocr))
+        return regions
+
+    def refine(self, image: Image, doc: HocrParser.Document, match: ModelMatch,
+               scale: float, output_format: str, osd: OcrScreenData,
+               deadline: Deadline = None) -> None:
+        """Re-OCR-s crops of low confidence words with single word
+        segmentation at higher scale (REFINE_PSM, REFINE_SCALE) and replaces
+        word text, confidence and glyphs when new result is more confident.
+        Data item OCR profile (whitelist, psm, oem, dpi, scale) is applied to
+        words of that item, unset values fall back to REFINE_PSM/REFINE_SCALE.
+        This is the only place item profiles apply in full/adaptive modes.
+        """
+        cfg = ModelFactory.get_config()
+        mode = cfg.REFINE_MODE
+        if mode not in (OcrService.REFINE_MODE_DATA, OcrService.REFINE_MODE_ALL):
+            return
+        if self.expired(deadline, osd, "refine"):
+            return
+
+        words = {}  # id(word) -> (word, item OCR profile)
+        if mode == OcrService.REFINE_MODE_DATA:
+            svc: ModelService = ModelFactory.get_service()
+            centers = [(w, Rect.from_bbox(w.bbox).center()) for w in doc.words]
+            for item, rc, _, _ in svc.get_data_rects(match):
+                for w, center in centers:
+                    if id(w) not in words and rc.contains(center) \
+                            and not self.is_confident([w]):
+                        words[id(w)] = (w, item.ocr)
+        else:
+            words = {id(w): (w, None) for w in doc.words if not self.is_confident([w])}
+
+        words = list(words.values())
+        if 0 < cfg.REFINE_MAX_WORDS < len(words):
+            words = sorted(words, key=lambda o: o[0].x_wconf)[:cfg.REFINE_MAX_WORDS]
+        osd.stats["refine_words"] = len(words)
+        if not words:
+            return
+
+        margin = int(cfg.ROI_MARGIN * scale)
+        regions = []
+        for index, (w, item_profile) in enumerate(words):
+            rc: Rect = Rect(w.bbox.left - margin, w.bbox.top - margin,
+                            w.bbox.right + margin, w.bbox.bottom + margin)
+            profile = OcrProfile(psm=cfg.REFINE_PSM, scale=cfg.REFINE_SCALE)
+            if item_profile:
+                profile.whitelist = item_profile.whitelist
+                profile.oem = item_profile.oem
+                profile.dpi = item_profile.dpi
+                if item_profile.psm is not None:
+                    profile.psm = item_profile.psm
+                if item_profile.scale:
+                    profile.scale = item_profile.scale
+            regions.append(OcrRegion(f"{index}:{w.id}", rc, None, None, profile))
+        docs = self.ocr_regions(image, regions, output_format, deadline)
+        if len(docs) < len(regions):
+            osd.set_timed_out("refine")
+
+        replaced = set()
+        for region, (w, _) in zip(regions, words):
+            if region.key not in docs:
+                continue
+            words2 = [w2 for w2 in docs[region.key].words if w2.text]
+            if not words2:
+                continue
+            conf = min(w2.x_wconf for w2 in words2)
+            if conf <= w.x_wconf:
+                continue
+            text = "".join(w2.text for w2 in words2)
+            logger.debug(f"refine {w.id}: {w.text} ({w.x_wconf}) -> {text} ({conf})")
+            w.text = text
+            w.x_wconf = conf
+            w.glyphs = [g for w2 in words2 for g in w2.glyphs]
+            replaced.add(id(w))
+
+        for line in doc.lines:
+            if any(id(w) in replaced for w in line.words):
+                line.text = " ".join([w.text for w in line.words if len(w.text) > 0])
+                line.glyphs = [g for w in line.words for g in w.glyphs]
+        osd.stats["refine_replaced"] = len(replaced)
+
+    def extract_full(self, path, chain, scale: float, border: int,
+                     caption_mode: str, output_format: str, osd: OcrScreenData,
+                     deadline: Deadline = None, screen: ModelMatch = None) -> tuple:
+        image = self.preprocess(path, chain)
+        if self.expired(deadline, osd, "ocr"):
+            return None, None
+        cfg = parse_tesseract_config(ModelFactory.get_config().TESSERACT_HOCR_CONFIG)
+        try:
+            doc: HocrParser.Document = self.ocr_doc(image, cfg, output_format, deadline)
+        except OcrTimeoutError:
+            osd.set_timed_out("ocr")
+            return None, None
         if not doc:
             logger.debug("hocr not found")
             osd.add_error("HOCR not found")
-            return osd
+            return None, None
 
-        match: ModelMatch = self.ocr_caption(path)
+        match: ModelMatch = None
         svc: ModelService = ModelFactory.get_service()
 
-        if match:
-            logger.debug("model found by caption")
-            match.offset_x = int(match.offset_x*scale)
-            match.offset_y = int(match.offset_y*scale)
-            match.scale_x = scale
-            match.scale_y = scale
-        else:
+        if screen:
+            width = self.imgProc.pil_load(path).width
+            border2 = self.calc_border(doc, width, scale)
+            match = self.rescale_match(screen, 0, 1.0, border2, scale)
+            self.set_match_stats(osd, match, "classifier")
+        elif caption_mode == OcrService.CAPTION_MODE_HOCR:
+            match = self.find_caption_in_hocr(path, doc, scale)
+            if match:
+                logger.debug("model found by caption in hocr")
+                self.set_match_stats(osd, match, "caption_hocr")
+        elif not self.expired(deadline, osd, "caption_ocr"):
+            try:
+                match = self.ocr_caption(path, deadline)
+            except OcrTimeoutError:
+                osd.set_timed_out("caption_ocr")
+            if match:
+                logger.debug("model found by caption")
+                match.offset_x = int(match.offset_x * scale)
+                match.offset_y = int(match.offset_y * scale)
+                match.scale_x = scale
+                match.scale_y = scale
+                self.set_match_stats(osd, match, "caption_ocr")
+
+        if not match:
             logger.debug("model not found by caption, try search by hocr")
             match: ModelMatch = svc.find_by_hocr(doc, scale)
+            if match:
+                self.set_match_stats(osd, match, "hocr")
 
         if border and match:
             match.offset_x = match.offset_x + border
@@ -172,9 +530,297 @@ class OcrService:
         if not match:
             logger.debug("model not found by hocr")
             osd.add_error("Model not found by HOCR")
-            return osd
+            return None, None
+
+        self.refine(image, doc, match, scale, output_format, osd, deadline)
+        return svc.get_data_as_dict(doc, match), match
+
+    def extract_roi(self, path, chain, scale: float, output_format: str,
+                    osd: OcrScreenData, deadline: Deadline = None,
+                    screen: ModelMatch = None) -> tuple:
+        """Matches model by caption OCR (unless screen is classified) and
+        then OCR-s only model data item regions of preprocessed image,
+        returns (None, None) when full screen OCR should be used instead.
+        """
+        if screen:
+            match: ModelMatch = screen.copy()
+            self.set_match_stats(osd, match, "classifier")
+        else:
+            try:
+                match: ModelMatch = self.ocr_caption(path, deadline)
+            except OcrTimeoutError:
+                osd.set_timed_out("caption_ocr")
+                return None, None
+            if not match:
+                logger.debug("model not found by caption, use full screen OCR")
+                return None, None
+            self.set_match_stats(osd, match, "caption_ocr")
+
+        width = self.imgProc.pil_load(path).width
+        image = self.preprocess(path, chain)
+
+        # real border added by preprocessing chain around scaled image
+        border = max(0, int((image.width - width * scale) / 2))
+        match.offset_x = int(match.offset_x * scale) + border
+        match.offset_y = int(match.offset_y * scale) + border
+        match.scale_x = scale
+        match.scale_y = scale
 
-        dad: dict = svc.get_data_as_dict(doc, match)
+        svc: ModelService = ModelFactory.get_service()
+        regions = self.make_regions(svc.get_data_rects(match), scale)
+        docs: dict = self.ocr_regions(image, regions, output_format, deadline)
+        if len(docs) < len(regions):
+            osd.set_timed_out("roi")
+        osd.stats["roi_count"] = len(regions)
+        rects = [region.rect for region in regions]
+        osd.stats["roi_pixels"] = sum((rc.right - rc.left) * (rc.bottom - rc.top)
+                                      for rc in rects)
+        osd.stats["full_pixels"] = image.width * image.height
+
+        doc: HocrParser.Document = HocrParser.Document()
+        for doc2 in docs.values():
+            doc.extend(doc2)
+
+        if not doc.words and not osd.timed_out:
+            logger.debug("no words found in regions, use full screen OCR")
+            osd.stats["roi_fallback"] = True
+            return None, None
+
+        self.refine(image, doc, match, scale, output_format, osd, deadline)
+        return svc.get_data_as_dict(doc, match), match
+
+    def adaptive_levels(self, chain, scale: float) -> list:
+        """Returns (scale, chain) list for adaptive extraction, ADAPTIVE_SCALES
+        lower than requested scale first and requested scale and chain last.
+        """
+        cfg = ModelFactory.get_config()
+        levels = [(float(s), cfg.ADAPTIVE_CHAIN.format(scale=s))
+                  for s in cfg.ADAPTIVE_SCALES]
+        levels = sorted(level for level in levels if level[0] < scale)
+        return levels + [(scale, chain)]
+
+    @staticmethod
+    def scaled_config(cfg: TesseractConfig, scale: float,
+                      full_scale: float) -> TesseractConfig:
+        """Configured dpi corresponds to full scale, so it is reduced
+        proportionally for images at lower scale.
+        """
+        if not cfg.dpi or scale == full_scale:
+            return cfg
+        cfg = cfg.copy()
+        cfg.dpi = int(cfg.dpi * scale / full_scale)
+        return cfg
+
+    def is_confident(self, words: list) -> bool:
+        """Same criteria as hOCR visualization uses for "green" words, glyph
+        average is checked only when glyphs are available (hOCR output).
+        """
+        threshold = OcrService.AVG_CONFIDENCE_THRESHOLD
+
+        def confident(w) -> bool:
+            if w.x_wconf <= OcrService.WORD_CONFIDENCE_THRESHOLD:
+                return False
+            return not w.glyphs or w.calc_avg_x_conf() > threshold
+        return all(confident(w) for w in words)
+
+    @staticmethod
+    def has_ink(image: Image, rc: Rect) -> bool:
+        crop = image.crop((rc.left, rc.top, rc.right, rc.bottom)).convert("L")
+        lo, hi = crop.getextrema()
+        return lo < 128
+
+    @staticmethod
+    def rescale_match(match: ModelMatch, border: int, scale: float,
+                      border2: int, scale2: float) -> ModelMatch:
+        """Converts match from image preprocessed at scale with border to
+        image preprocessed at scale2 with border2.
+        """
+        res: ModelMatch = match.copy()
+        res.offset_x = int((match.offset_x - border) / scale * scale2) + border2
+        res.offset_y = int((match.offset_y - border) / scale * scale2) + border2
+        res.scale_x = match.scale_x / scale * scale2
+        res.scale_y = match.scale_y / scale * scale2
+        return res
+
+    @staticmethod
+    def data_rect_name(item: Item, owner: Item, row: int) -> str:
+        if row is None:
+            return item.data_field
+        return f"{owner.data_field}[{row}].{item.data_field}"
+
+    def extract_adaptive(self, path, chain, scale: float, output_format: str,
+                         osd: OcrScreenData, deadline: Deadline = None,
+                         screen: ModelMatch = None) -> tuple:
+        """OCR-s full screen at the lowest adaptive scale, then re-OCR-s data
+        items with low confidence words (or with no words, but some ink) at
+        next scales, up to requested one. Returns (None, None) when model is
+        not matched at the lowest scale, so full screen OCR should be used.
+        Returned match is for requested scale and chain.
+        """
+        levels = self.adaptive_levels(chain, scale)
+        if len(levels) < 2:
+            return None, None
+
+        svc: ModelService = ModelFactory.get_service()
+        base = parse_tesseract_config(ModelFactory.get_config().TESSERACT_HOCR_CONFIG)
+        width = self.imgProc.pil_load(path).width
+
+        scale0, chain0 = levels[0]
+        image0 = self.preprocess(path, chain0)
+        border0 = max(0, int((image0.width - width * scale0) / 2))
+        try:
+            cfg0 = self.scaled_config(base, scale0, scale)
+            doc0: HocrParser.Document = self.ocr_doc(image0, cfg0, output_format,
+                                                     deadline)
+        except OcrTimeoutError:
+            osd.set_timed_out("ocr")
+            return None, None
+
+        if screen:
+            match0: ModelMatch = self.rescale_match(screen, 0, 1.0, border0, scale0)
+        else:
+            match0: ModelMatch = self.find_caption_in_hocr(path, doc0, scale0)
+        if match0:
+            self.set_match_stats(osd, match0, "classifier" if screen else "caption_hocr")
+        else:
+            match0 = svc.find_by_hocr(doc0, scale0)
+            if not match0:
+                logger.debug(f"model not found at scale {scale0}, use full screen OCR")
+                return None, None
+            self.set_match_stats(osd, match0, "hocr")
+
+        rects0 = svc.get_data_rects(match0)
+        scales = [scale0] * len(rects0)
+        pending = []
+        grid = WordGrid(doc0.words)
+        for index, (_, rc, _, _) in enumerate(rects0):
+            words = grid.query(rc)
+            if words and not self.is_confident(words):
+                pending.append(index)
+            elif not words and self.has_ink(image0, rc):
+                pending.append(index)
+
+        escalated = set()  # indexes of rects OCR-ed at higher scale
+        docs = {}  # rect index -> Document in image0 coordinates
+        match: ModelMatch = match0
+        for level_scale, level_chain in levels[1:]:
+            image = self.preprocess(path, level_chain)
+            border = max(0, int((image.width - width * level_scale) / 2))
+            match = self.rescale_match(match0, border0, scale0, border, level_scale)
+            if not pending:
+                continue
+            if self.expired(deadline, osd, f"adaptive({level_scale})"):
+                pending = []
+                continue
+
+            rects = svc.get_data_rects(match)
+            regions = self.make_regions([rects[index] for index in pending], level_scale)
+            dpi = self.scaled_config(base, level_scale, scale).dpi
+            for region in regions:
+                region.dpi = dpi
+            region_docs = self.ocr_regions(image, regions, output_format, deadline)
+            if len(region_docs) < len(regions):
+                osd.set_timed_out(f"adaptive({level_scale})")
+
+            last = level_scale == scale
+            pending2 = []
+            for region, index in zip(regions, pending):
+                doc = region_docs.get(region.key)
+                if doc is None:
+                    continue  # keep lower scale words
+                escalated.add(index)
+                doc.offset(-border, -border)
+                doc.scale(scale0 / level_scale, scale0 / level_scale)
+                doc.offset(border0, border0)
+                docs[index] = doc
+                scales[index] = level_scale
+                if not last and doc.words and not self.is_confident(doc.words):
+                    pending2.append(index)
+            pending = pending2
+
+        rcs = [rects0[index][1] for index in escalated]
+        doc: HocrParser.Document = doc0.filter(
+            lambda w: not any(rc.contains(Rect.from_bbox(w.bbox).center())
+                              for rc in rcs))
+        for index in sorted(docs.keys()):
+            doc.extend(docs[index])
+        doc.pages = doc0.pages
+
+        osd.stats["scales"] = {self.data_rect_name(item, owner, row): scales[index]
+                               for index, (item, rc, owner, row) in enumerate(rects0)}
+        osd.stats["adaptive_items"] = len(escalated)
+        return svc.get_data_as_dict(doc, match0), match
+
+    def ocr_screen(self, path, chain, scale: float, border: int,
+                   caption_mode: str = None, extract_mode: str = None,
+                   output_format: str = None,
+                   deadline: Deadline = None) -> OcrScreenData:
+        """OCR screen and extract data of matched model. When deadline is
+        specified, OCR stages are skipped or cut once it expires, optional
+        ones (caption OCR pass, refinement, adaptive escalation) included,
+        and data extracted so far is returned with timed_out set.
+        """
+        osd, _ = self.ocr_screen_ex(path, chain, scale, border, caption_mode,
+                                    extract_mode, output_format, deadline)
+        return osd
+
+    def ocr_screen_ex(self, path, chain, scale: float, border: int,
+                      caption_mode: str = None, extract_mode: str = None,
+                      output_format: str = None, deadline: Deadline = None) -> tuple:
+        """Same as ocr_screen, but returns (OcrScreenData, ModelMatch) tuple."""
+        logger.debug(f'ocr_screen(path={path})')
+        osd: OcrScreenData = OcrScreenData()
+        osd.success = False
+        osd.host = platform.node()
+        osd.ts = str(datetime.datetime.now())
+        osd.model_version = ModelFactory.get_service().version
+        if not caption_mode:
+            caption_mode = ModelFactory.get_config().CAPTION_MODE
+        if not extract_mode:
+            extract_mode = ModelFactory.get_config().EXTRACT_MODE
+        if not output_format:
+            output_format = ModelFactory.get_config().OCR_OUTPUT_FORMAT
+        osd.stats = {"caption_mode": caption_mode, "extract_mode": extract_mode,
+                     "output_format": output_format, "model_match": None}
+        dt = time.time()
+
+        dad: dict = None
+        match: ModelMatch = None
+        screen: ModelMatch = None
+        classifier_mode = ModelFactory.get_config().CLASSIFIER_MODE
+        if classifier_mode != ModelService.CLASSIFIER_MODE_OFF:
+            # frame is decoded once for classifier and preprocessing
+            path = self.imgProc.pil_load(path)
+            path.load()
+            screen = self.classify(path, osd)
+            if not screen and classifier_mode == ModelService.CLASSIFIER_MODE_FILTER:
+                osd.add_error("Screen not recognized")
+                osd.dt_ms = int((time.time() - dt) * 1000)
+                return osd, None
+
+        if self.expired(deadline, osd, "preprocess"):
+            osd.add_error("Deadline exceeded")
+            osd.dt_ms = int((time.time() - dt) * 1000)
+            return osd, None
+
+        if extract_mode == OcrService.EXTRACT_MODE_ROI:
+            dad, match = self.extract_roi(path, chain, scale, output_format, osd,
+                                          deadline, screen)
+        elif extract_mode == OcrService.EXTRACT_MODE_ADAPTIVE:
+            dad, match = self.extract_adaptive(path, chain, scale, output_format,
+                                               osd, deadline, screen)
+
+        if not dad and not osd.timed_out:
+            if extract_mode != OcrService.EXTRACT_MODE_FULL:
+                osd.stats["extract_mode"] = OcrService.EXTRACT_MODE_FULL
+            dad, match = self.extract_full(path, chain, scale, border, caption_mode,
+                                           output_format, osd, deadline, screen)
+
+        if not dad:
+            if osd.timed_out:
+                osd.add_error("Deadline exceeded")
+            osd.dt_ms = int((time.time() - dt) * 1000)
+            return osd, None
 
         osd.type = dad["type"]
         osd.items = dad["items"]
@@ -182,11 +828,159 @@ class OcrService:
         osd.dt_ms = int((time.time() - dt)*1000)
         if osd.type:
             osd.success = True
+        return osd, match
+
+    def ocr_screen_incremental(self, path, chain, scale: float, border: int,
+                               prev: FrameState, deadline: Deadline = None) -> tuple:
+        """OCR screen using previous frame of the same source, only data
+        items overlapping changed tiles are OCR-ed again, other items reuse
+        previous results. Returns (OcrScreenData, FrameState) tuple, state
+        is None when result is partial because of deadline.
+        """
+        logger.debug(f'ocr_screen_incremental(path={path})')
+        dt = time.time()
+        cfg = ModelFactory.get_config()
+        tile = cfg.INCREMENTAL_TILE_SIZE
+        frame = FrameDiff.load_gray(path)
+        svc: ModelService = ModelFactory.get_service()
+        state = FrameState(frame, chain, scale, svc.version)
+
+        tiles = None
+        key = (chain, scale, svc.version)
+        same = prev and (prev.chain, prev.scale, prev.version) == key
+        if same and prev.frame is not None and prev.frame.shape == frame.shape:
+            threshold = cfg.INCREMENTAL_DIFF_THRESHOLD
+            tiles = FrameDiff.tiles(prev.frame, frame, tile, threshold)
+
+        osd: OcrScreenData = None
+        if tiles is not None:
+            changed = int(tiles.sum())
+            ratio = changed / tiles.size
+            if changed == 0:
+                osd = copy.deepcopy(prev.osd)
+                osd.stats["incremental"] = "reuse"
+                osd.stats["reocr_items"] = 0
+            elif prev.match and ratio <= cfg.INCREMENTAL_MAX_CHANGE:
+                osd = self._ocr_changed_items(path, chain, scale, prev, tiles, tile,
+                                              deadline)
+            if osd:
+                osd.stats["changed_tiles"] = changed
+                state.match = prev.match
+
+        if not osd:
+            osd, state.match = self.ocr_screen_ex(path, chain, scale, border,
+                                                  deadline=deadline)
+            osd.stats["incremental"] = "full"
+
+        osd.host = platform.node()
+        osd.ts = str(datetime.datetime.now())
+        osd.dt_ms = int((time.time() - dt) * 1000)
+        if osd.timed_out:
+            # partial result must not be reused for next frames
+            return osd, None
+        state.osd = copy.deepcopy(osd)
+        return osd, state
+
+    def _ocr_changed_items(self, path, chain, scale: float, prev: FrameState,
+                           tiles, tile: int, deadline: Deadline = None) -> OcrScreenData:
+        match: ModelMatch = prev.match
+        image = self.preprocess(path, chain)
+        height, width = prev.frame.shape
+        border = max(0, int((image.width - width * scale) / 2))
+
+        def to_frame(rc: Rect) -> Rect:
+            return Rect(int((rc.left - border) / scale),
+                        int((rc.top - border) / scale),
+                        int((rc.right - border) / scale) + 1,
+                        int((rc.bottom - border) / scale) + 1)
+
+        # screen itself could be changed when control point area differs
+        svc: ModelService = ModelFactory.get_service()
+        cp = svc.get_control_point(match.model)
+        if cp:
+            rc: Rect = cp.rect.copy().scale(match.scale_x, match.scale_y)
+            rc.offset(match.offset_x, match.offset_y)
+            if FrameDiff.overlaps(tiles, tile, to_frame(rc)):
+                logger.debug("control point changed, full OCR")
+                return None
+
+        rects = [r for r in svc.get_data_rects(match)
+                 if FrameDiff.overlaps(tiles, tile, to_frame(r[1]))]
+        changed_items = {}  # owner item id -> set of changed row indexes
+        for _, _, owner, row in rects:
+            changed_items.setdefault(owner.id, set()).add(row)
+
+        doc: HocrParser.Document = HocrParser.Document()
+        timed_out = False
+        if rects:
+            regions = self.make_regions(rects, scale)
+            docs: dict = self.ocr_regions(image, regions, deadline=deadline)
+            timed_out = len(docs) < len(rects)
+            for doc2 in docs.values():
+                doc.extend(doc2)
+        dad: dict = svc.get_data_as_dict(doc, match)
+
+        osd: OcrScreenData = copy.deepcopy(prev.osd)
+        if timed_out:
+            osd.set_timed_out("roi")
+        items = osd.items if osd.items is not None else {}
+        data = osd.data if osd.data is not None else {}
+        for item in match.model.form.items:
+            rows = changed_items.get(item.id)
+            if rows is None:
+                continue
+            if item.type == ItemType.LIST and item.row_height:
+                if not item.data_field:
+                    continue
+                lst = [d for d in data.get(item.data_field) or []
+                       if d.get("index") not in rows]
+                lst += [d for d in dad["data"].get(item.data_field) or []
+                        if d.get("index") in rows]
+                data[item.data_field] = sorted(lst, key=lambda d: d.get("index"))
+            else:
+                items[item.id] = dad["items"].get(item.id)
+                if item.data_field:
+                    data[item.data_field] = dad["data"].get(item.data_field)
+
+        osd.items = items
+        osd.data = data
+        osd.stats["incremental"] = "partial"
+        osd.stats["reocr_items"] = len(rects)
         return osd
 
+    def warmup(self, chain, scale: float, border: int) -> list:
+        """Runs full pipeline over each registered model image, so that
+        traineddata, tesseract handles, pyvips and fonts are loaded before
+        the first real screen. Returns per model results, kept in
+        warmup_results, repeated calls return them without OCR. Model
+        errors are recorded in its result ("error") instead of raised.
+        """
+        if self.warmup_results is not None:
+            return self.warmup_results
+
+        res = []
+        svc: ModelService = ModelFactory.get_service()
+        for model in svc.models:
+            path = svc.get_image_path(model)
+            if not os.path.exists(path):
+                logger.warning(f"warm-up image not found: {path}")
+                continue
+            dt = time.time()
+            try:
+                osd: OcrScreenData = self.ocr_screen(path, chain, scale, border)
+            except Exception as ex:
+                logger.error(f"warm-up {model.id} failed: {str(ex)}")
+                res.append({"model": model.id, "success": False, "error": str(ex),
+                            "dt_ms": int((time.time() - dt) * 1000)})
+                continue
+            res.append({"model": model.id, "type": osd.type, "success": osd.success,
+                        "dt_ms": int((time.time() - dt) * 1000)})
+            logger.info(f"warm-up {model.id}: type={osd.type}, dt_ms={res[-1]['dt_ms']}")
+        self.warmup_results = res
+        return res
 
     def tesseract_version(self):
-        return "tesseract {}".format(pytesseract.get_tesseract_version())
+        return self.engine.version()
 
 
 class OcrFactory:
@@ -204,4 +998,4 @@ class OcrFactory:
         return OcrFactory.__ocr_service
 
 
-OcrFactory.init()
\ No newline at end of file
+OcrFactory.init()
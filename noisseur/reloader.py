@@ -0,0 +1,155 @@
+import datetime
+import logging
+import logging.config
+import os
+import threading
+import time
+
+from noisseur.cfg import AppConfig, app_reload
+from noisseur.model import ModelFactory, ModelService
+
+logger = logging.getLogger(__name__)
+
+
+class Reloader:
+    """Hot reload of configuration and models. Configuration files,
+    MODEL_LIST files and MODEL_BUNDLE are polled for changes in background
+    thread, new AppConfig and ModelService are built there and swapped in at
+    once (see ModelFactory.reload), requests in flight finish on snapshot
+    they started with (see ModelFactory.snapshot). Only server process
+    polls, OCR worker processes follow its reloads, see sync.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval  # seconds between checks, 0 - not watched
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._mtimes = self.scan(AppConfig.instance)
+        self.reloads = 0
+        self.generation = 0  # successful reloads, of server process in workers
+        self.listeners = []  # functions called after successful reload
+        self.failed = 0
+        self.last_error = None
+        self.ts = None    # last reload time
+        self.dt_ms = 0    # last reload duration
+
+    @staticmethod
+    def get_paths(cfg: AppConfig) -> list:
+        """Returns files which changes trigger reload."""
+        paths = list(cfg.INI_PATHS)
+        paths += [os.path.join(cfg.ROOT_PATH, path) for path in cfg.MODEL_LIST or []]
+        bundle = ModelFactory.get_bundle(cfg)
+        if bundle:
+            paths.append(bundle.path)
+        return paths
+
+    def scan(self, cfg: AppConfig) -> dict:
+        """Returns path -> (mtime, size) of watched files, None for missing
+        ones, so that created and deleted files are changes too.
+        """
+        res = {}
+        for path in self.get_paths(cfg):
+            try:
+                st = os.stat(path)
+                res[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                res[path] = None
+        return res
+
+    def check(self) -> bool:
+        """Reloads configuration and models when any of watched files
+        changed, returns True when they were reloaded.
+        """
+        if self.scan(AppConfig.instance) == self._mtimes:
+            return False
+        logger.info("configuration or models changed, reloading")
+        self.reload()
+        return True
+
+    def reload(self) -> ModelService:
+        """Reads configuration, loads models and swaps them in, returns new
+        model service. On error current ones are kept, the same files are
+        not tried again until they change.
+        """
+        with self._lock:
+            dt = time.time()
+            cfg: AppConfig = None
+            try:
+                cfg = app_reload()
+                self._mtimes = self.scan(cfg)
+                svc = ModelFactory.reload(cfg)
+            except BaseException as ex:
+                self.failed += 1
+                self.last_error = str(ex)
+                if not cfg:
+                    self._mtimes = self.scan(AppConfig.instance)
+                logger.error("reload failed, previous configuration and models "
+                             f"are kept: {str(ex)}")
+                raise
+            self.reloads += 1
+            self.generation += 1
+            self.last_error = None
+            self.ts = str(datetime.datetime.now())
+            self.dt_ms = int((time.time() - dt) * 1000)
+        for listener in self.listeners:
+            listener()
+        return svc
+
+    def sync(self, generation: int) -> None:
+        """Called by OCR worker process with generation of server process
+        before each task, checks watched files when it differs, so that
+        worker reloads the same changes server did, before the task.
+        """
+        if generation == self.generation:
+            return
+        try:
+            self.check()
+        except Exception:
+            pass  # logged by reload, previous configuration and models are kept
+        self.generation = generation
+
+    def start(self) -> None:
+        """Starts watching thread unless interval is 0."""
+        if self.interval <= 0 or self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="reloader", daemon=True)
+        self._thread.start()
+        logger.info(f"watching configuration and models every {self.interval} s")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                pass  # logged by reload, next change is tried again
+
+    def stats(self) -> dict:
+        svc: ModelService = ModelFactory.get_service()
+        return {
+            "version": svc.version,
+            "models": len(svc.models),
+            "watching": bool(self._thread and self._thread.is_alive()),
+            "reloads": self.reloads,
+            "failed": self.failed,
+            "last_error": self.last_error,
+            "ts": self.ts,
+            "dt_ms": self.dt_ms
+        }
+
+
+class ReloaderFactory:
+    __reloader = None
+
+    @staticmethod
+    def get_reloader() -> Reloader:
+        if not ReloaderFactory.__reloader:
+            ReloaderFactory.__reloader = Reloader(AppConfig.instance.RELOAD_INTERVAL_SEC)
+        return ReloaderFactory.__reloader
+
+    @staticmethod
+    def start() -> None:
+        ReloaderFactory.get_reloader().start()
@@ -4,9 +4,12 @@ from flask import Flask, render_template
 
 from noisseur.cfg import app_init
 from noisseur.cfg import AppConfig
+from noisseur.api import ApiFactory
 from noisseur.app import api_v1
+from noisseur.app import stream
 from noisseur.app import test
 from noisseur.model import ModelFactory
+from noisseur.reloader import ReloaderFactory
 
 logger = logging.getLogger(__name__)
 logger.debug("name=" + __name__)
@@ -31,6 +34,10 @@ def create_flask_app() -> Flask:
         logger.debug("Registering blueprint: api_v1 ...")
         app1.register_blueprint(api_v1.api_v1_bp, url_prefix='/api/1')
 
+        logger.debug("Registering blueprint: stream ...")
+        stream.sock.init_app(app1)
+        app1.register_blueprint(stream.stream_bp, url_prefix='/api/1')
+
         logger.debug("Registering blueprint: test ...")
         app1.register_blueprint(test.test_bp, url_prefix='/test')
 
@@ -39,6 +46,12 @@ def create_flask_app() -> Flask:
         logger.debug("home")
         return render_template('home.j2')
 
+    logger.debug("Starting configuration and models watcher ...")
+    ReloaderFactory.start()
+
+    logger.debug("Starting warm-up ...")
+    ApiFactory.get_service().start_warmup()
+
     return app1
 
 
@@ -0,0 +1,133 @@
+import datetime
+import hashlib
+import logging
+import logging.config
+import platform
+import time
+import uuid
+
+from noisseur.api import ApiFactory, ApiService
+from noisseur.cfg import AppConfig
+from noisseur.deadline import Deadline
+from noisseur.ocr import OcrScreenData
+from noisseur.worker import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+class StreamSession:
+    """State of one frame stream (e.g. capture client of one console).
+    Frames are OCRed incrementally against previous frame of the same
+    source, and an event is produced only when recognized screen type or
+    data changes, so consumers are not flooded by identical results.
+    Each frame is OCRed within deadline_ms (DEADLINE_MS when None), frames
+    timed out produce no event, so partial data is never reported as
+    change.
+    """
+
+    EVENT_OPEN: str = "open"
+    EVENT_CHANGE: str = "change"
+    EVENT_STATS: str = "stats"
+
+    def __init__(self, source: str = None, deadline_ms: int = None):
+        self.source = source if source else f"stream-{uuid.uuid4().hex[:12]}"
+        self.deadline_ms = deadline_ms
+        self.seq = 0               # number of events produced
+        self.frames = 0            # frames received
+        self.processed = 0         # frames OCRed
+        self.duplicates = 0        # byte identical to previous frame, OCR skipped
+        self.dropped = 0           # superseded by newer frame before processing
+        self.busy = 0              # rejected by OCR worker pool
+        self.timed_out = 0         # deadline expired, partial result dropped
+        self.started = time.time()
+        self._last_digest = None   # previous frame bytes digest
+        self._last_state = None    # (type, data) of last event
+
+    def _event(self, name: str, **kwargs) -> dict:
+        self.seq += 1
+        res = {
+            "event": name,
+            "seq": self.seq,
+            "source": self.source,
+            "host": platform.node(),
+            "ts": str(datetime.datetime.now()),
+            "frame": self.frames
+        }
+        res.update(kwargs)
+        return res
+
+    def open_event(self) -> dict:
+        return self._event(self.EVENT_OPEN)
+
+    def stats_event(self) -> dict:
+        return self._event(self.EVENT_STATS, stats=self.stats())
+
+    def drop(self, count: int = 1) -> None:
+        """Records frames received but skipped because newer frame arrived."""
+        self.frames += count
+        self.dropped += count
+
+    def process(self, image: bytes, path: str = None) -> dict:
+        """Processes next frame, returns change event or None when the
+        recognized type and data are the same as in the last event.
+        """
+        self.frames += 1
+
+        if image:
+            digest = hashlib.blake2b(image, digest_size=16).digest()
+            if digest == self._last_digest:
+                self.duplicates += 1
+                return None
+            self._last_digest = digest
+        else:
+            self._last_digest = None
+
+        svc: ApiService = ApiFactory.get_service()
+        dt = time.time()
+        deadline_ms = self.deadline_ms
+        if deadline_ms is None:
+            deadline_ms = AppConfig.instance.DEADLINE_MS
+        try:
+            osd: OcrScreenData = svc.ocr_screen(image, path, self.source,
+                                                Deadline.after_ms(deadline_ms))
+        except QueueFullError as ex:
+            logger.debug(f"[{self.source}] frame {self.frames} skipped: {str(ex)}")
+            self.busy += 1
+            # frame was not processed, do not treat next identical one as duplicate
+            self._last_digest = None
+            return None
+        except Exception as ex:
+            logger.error(f"[{self.source}] frame {self.frames} failed: {str(ex)}")
+            osd = OcrScreenData(platform.node(), str(datetime.datetime.now()))
+            osd.add_error(f"System error: {str(ex)}")
+        self.processed += 1
+        if osd.timed_out:
+            logger.debug(f"[{self.source}] frame {self.frames} timed out, dropped")
+            self.timed_out += 1
+            self._last_digest = None
+            return None
+
+        state = (osd.type, osd.data)
+        if state == self._last_state:
+            return None
+        self._last_state = state
+
+        return self._event(self.EVENT_CHANGE,
+                           dt_ms=int((time.time() - dt) * 1000),
+                           success=osd.success,
+                           errors=osd.errors,
+                           type=osd.type,
+                           data=osd.data,
+                           stats=osd.stats)
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "processed": self.processed,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "busy": self.busy,
+            "timed_out": self.timed_out,
+            "events": self.seq,
+            "uptime_sec": int(time.time() - self.started)
+        }
@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+
+def test_lru_eviction():
+    pytest.importorskip("PIL")
+    from noisseur.cache import LruCache
+
+    cache = LruCache(3, 0, 60)
+    for key in "abc":
+        cache.put(key, key.upper(), 1)
+    assert cache.get("a") == "A"  # b is least recently used now
+    cache.put("d", "D", 1)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    cache.put("c", "C2", 1)
+    assert cache.get("c") == "C2"
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["misses"]) == (3, 1, 1)
+
+
+def test_lru_max_bytes():
+    pytest.importorskip("PIL")
+    from noisseur.cache import LruCache
+
+    cache = LruCache(10, 100, 60)
+    cache.put("a", 1, 40)
+    cache.put("b", 2, 40)
+    cache.put("c", 3, 40)
+    assert cache.get("a") is None and cache.get("c") == 3
+    assert cache.stats()["bytes"] == 80
+    cache.put("big", 4, 101)  # larger than the whole cache, not stored
+    assert cache.get("big") is None and cache.get("b") == 2
+
+
+def test_lru_ttl(monkeypatch):
+    pytest.importorskip("PIL")
+    from noisseur import cache as cache_module
+    from noisseur.cache import LruCache
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LruCache(10, 0, 5)
+    cache.put("a", 1, 1)
+    now[0] += 4.9
+    assert cache.get("a") == 1
+    now[0] += 0.2
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["expirations"], stats["hits"]) == (0, 1, 1)
+
+
+def test_lru_disabled():
+    pytest.importorskip("PIL")
+    from noisseur.cache import LruCache
+
+    cache = LruCache(0, 0, 60)
+    cache.put("a", 1, 1)
+    assert not cache.enabled and cache.get("a") is None
+
+
+def test_frame_hash():
+    Image = pytest.importorskip("PIL.Image")
+    from noisseur.cache import frame_hash, pixel_hash
+
+    image = Image.new("RGB", (16, 8), (10, 20, 30))
+    image.putpixel((3, 4), (200, 0, 0))
+    png, bmp = io.BytesIO(), io.BytesIO()
+    image.save(png, format="PNG")
+    image.save(bmp, format="BMP")
+    key = frame_hash(png.getvalue(), "chain", 3.0)
+    assert key == frame_hash(png.getvalue(), "chain", 3.0)
+    assert key != frame_hash(png.getvalue(), "chain", 2.0)
+    # raw key differs by encoding, pixel key is shared
+    assert key != frame_hash(bmp.getvalue(), "chain", 3.0)
+    key = pixel_hash(Image.open(png), "chain", 3.0)
+    assert key == pixel_hash(Image.open(bmp), "chain", 3.0)
+    assert key != pixel_hash(Image.open(png), "chain", 2.0)
+    image.putpixel((0, 0), (0, 0, 0))
+    png2 = io.BytesIO()
+    image.save(png2, format="PNG")
+    assert frame_hash(png.getvalue()) != frame_hash(png2.getvalue())
+    assert pixel_hash(Image.open(png)) != pixel_hash(image)
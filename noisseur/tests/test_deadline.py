@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from noisseur.deadline import Deadline, OcrTimeoutError
+
+
+def test_deadline_after_ms():
+    assert Deadline.after_ms(None) is None
+    assert Deadline.after_ms(0) is None
+    assert Deadline.after_ms(-5) is None
+    deadline = Deadline.after_ms(10_000)
+    assert 9.9 < deadline.remaining() <= 10.0
+    assert not deadline.expired()
+
+
+def test_deadline_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    deadline = Deadline.after_ms(250)
+    assert deadline.at == pytest.approx(1000.25)
+    now[0] = 1000.2
+    assert not deadline.expired() and deadline.remaining() == pytest.approx(0.05)
+    now[0] = 1000.25
+    assert deadline.expired() and deadline.remaining() == pytest.approx(0.0)
+    now[0] = 1001.0
+    assert deadline.expired() and deadline.remaining() < 0
+
+
+def test_ocr_timeout_error():
+    with pytest.raises(TimeoutError):
+        raise OcrTimeoutError("Tesseract deadline expired")
+
+
+def test_expired_stage_is_recorded():
+    pytest.importorskip("pytesseract")
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("bs4")
+    from noisseur.ocr import OcrScreenData, OcrService
+
+    osd = OcrScreenData(stats={})
+    assert not OcrService.expired(None, osd, "roi")
+    assert not OcrService.expired(Deadline.after_ms(10_000), osd, "roi")
+    assert not osd.timed_out
+    assert OcrService.expired(Deadline(time.time() - 1), osd, "roi")
+    assert OcrService.expired(Deadline(time.time() - 1), osd, "refine")
+    assert osd.timed_out and osd.stats["deadline_skipped"] == ["roi", "refine"]
@@ -0,0 +1,179 @@
+import types
+
+import pytest
+
+
+def make_config(tmp_path, **options):
+    from noisseur.cfg import AppConfig
+
+    options.setdefault("TESSERACT_HOCR_CONFIG", "--psm 6 --oem 1 -l eng hocr")
+    options.setdefault("TESSERACT_POOL_SIZE", "2")
+    ini = tmp_path / "noisseur.ini"
+    ini.write_text("[noisseur]\n" + "".join(f"{k}={v}\n" for k, v in options.items()))
+    cfg = AppConfig()
+    cfg.load([str(ini)], None)
+    return cfg
+
+
+@pytest.fixture
+def app_config():
+    from noisseur.cfg import AppConfig
+
+    prev = AppConfig.instance
+    yield
+    AppConfig.instance = prev
+
+
+def test_tesseract_config_round_trip():
+    pytest.importorskip("pytesseract")
+    from noisseur.engine import TesseractConfig
+
+    s = ("--tessdata-dir /usr/share/tessdata -c hocr_char_boxes=1 "
+         "-c 'tessedit_char_whitelist=0123456789 .' "
+         "--psm 6 --oem 1 --dpi 288 -l prisma hocr")
+    cfg = TesseractConfig.parse(s)
+    assert cfg.tessdata_dir == "/usr/share/tessdata"
+    assert cfg.lang == "prisma"
+    assert (cfg.psm, cfg.oem, cfg.dpi) == (6, 1, 288)
+    assert isinstance(cfg.psm, int) and isinstance(cfg.oem, int)
+    assert cfg.variables == {"hocr_char_boxes": "1",
+                             "tessedit_char_whitelist": "0123456789 ."}
+    assert cfg.configs == ["hocr"]
+    assert cfg.to_args() == s
+
+    cfg2 = TesseractConfig.parse(cfg.to_args())
+    assert vars(cfg2) == vars(cfg)
+    cfg3 = cfg.copy()
+    cfg3.psm = 7
+    cfg3.variables["x"] = "1"
+    assert cfg.psm == 6 and "x" not in cfg.variables
+    assert TesseractConfig.parse("").to_args() == ""
+
+
+def test_engine_selection(tmp_path, monkeypatch, app_config):
+    pytest.importorskip("pytesseract")
+    from noisseur import engine
+    from noisseur.cfg import AppConfig
+    from noisseur.engine import (OcrEngineFactory, PytesseractEngine,
+                                 TesserocrEngine)
+
+    created = []
+
+    class FakeApi:
+        def __init__(self, **kwargs):
+            if kwargs.get("lang") == "broken":
+                raise RuntimeError("Failed to init API")
+            created.append(kwargs)
+
+        def End(self):
+            pass
+
+    fake = types.SimpleNamespace(PyTessBaseAPI=FakeApi,
+                                 PSM=types.SimpleNamespace(AUTO=3))
+    monkeypatch.setattr(engine, "tesserocr", fake)
+
+    AppConfig.instance = make_config(tmp_path, TESSERACT_ENGINE="tesserocr")
+    e = OcrEngineFactory.create()
+    assert isinstance(e, TesserocrEngine)
+    # tesserocr takes plain ints, not enum instances
+    assert created == [{"init": True, "lang": "eng", "oem": 1, "psm": 6}]
+    assert type(created[0]["oem"]) is int and type(created[0]["psm"]) is int
+
+    AppConfig.instance = make_config(tmp_path, TESSERACT_ENGINE="tesserocr",
+                                     TESSERACT_HOCR_CONFIG="-l broken hocr")
+    assert isinstance(OcrEngineFactory.create(), PytesseractEngine)
+
+    monkeypatch.setattr(engine, "tesserocr", None)
+    AppConfig.instance = make_config(tmp_path, TESSERACT_ENGINE="tesserocr")
+    assert isinstance(OcrEngineFactory.create(), PytesseractEngine)
+
+    for name in ("pytesseract", "unknown"):
+        AppConfig.instance = make_config(tmp_path, TESSERACT_ENGINE=name)
+        assert isinstance(OcrEngineFactory.create(), PytesseractEngine)
+
+
+def test_engine_text_defaults(monkeypatch):
+    pytest.importorskip("pytesseract")
+    from noisseur.engine import (PytesseractEngine, TesseractConfig,
+                                 TesserocrEngine)
+
+    configs = []
+    monkeypatch.setattr(TesserocrEngine, "_run",
+                        lambda self, image, cfg, func, timeout=None: configs.append(cfg))
+    e = TesserocrEngine(TesseractConfig.parse("--psm 6 -l prisma hocr"), 1)
+    e.text(b"")
+    # the same tesseract defaults as pytesseract without config
+    assert configs[0].to_args() == ""
+
+    args = []
+    monkeypatch.setattr("pytesseract.image_to_string",
+                        lambda image, **kwargs: args.append(kwargs))
+    PytesseractEngine().text("frame.png")
+    assert args == [{}]
+
+
+def test_tesserocr_pool_checkout_timeout(monkeypatch):
+    pytest.importorskip("pytesseract")
+    from noisseur.deadline import OcrTimeoutError
+    from noisseur.engine import TesseractConfig, TesserocrPool
+
+    pool = TesserocrPool(TesseractConfig(), 1)
+    monkeypatch.setattr(pool, "_create", lambda: object())
+    api = pool.checkout()
+    # the only handle is checked out, waiting for it is bounded by timeout
+    with pytest.raises(OcrTimeoutError):
+        pool.checkout(0.01)
+    with pytest.raises(OcrTimeoutError):
+        pool.checkout(-1)
+    pool.checkin(api)
+    assert pool.checkout(0.01) is api
+
+
+def test_tesserocr_restores_handle(monkeypatch):
+    pytest.importorskip("pytesseract")
+    Image = pytest.importorskip("PIL.Image")
+    from noisseur import engine
+    from noisseur.engine import TesseractConfig, TesserocrEngine
+
+    class FakeApi:
+        def __init__(self, **kwargs):
+            # tesseract defaults
+            self.variables = {"tessedit_char_whitelist": "", "hocr_char_boxes": "0"}
+            self.psm = kwargs.get("psm", 3)
+
+        def GetVariableAsString(self, name):
+            return self.variables.get(name)
+
+        def SetVariable(self, name, val):
+            if name not in self.variables:
+                return False
+            self.variables[name] = val
+            return True
+
+        def GetPageSegMode(self):
+            return self.psm
+
+        def SetPageSegMode(self, psm):
+            self.psm = psm
+
+        def SetImage(self, image):
+            pass
+
+        def Clear(self):
+            pass
+
+    fake = types.SimpleNamespace(PyTessBaseAPI=FakeApi)
+    monkeypatch.setattr(engine, "tesserocr", fake)
+    e = TesserocrEngine(TesseractConfig.parse("-l eng"), 1)
+    e._get_pool(e.cfg)
+    cfg = TesseractConfig.parse("--psm 7 -c hocr_char_boxes=1 "
+                                "-c tessedit_char_whitelist=0-9 -l eng")
+    res = e._run(Image.new("L", (4, 4)), cfg,
+                 lambda api: (api, api.psm, dict(api.variables)))
+    api, psm, variables = res
+    assert psm == 7
+    assert variables == {"tessedit_char_whitelist": "0-9",
+                         "hocr_char_boxes": "1"}
+    # per call overrides are reverted to values of the handle, not to ""
+    assert api.variables == {"tessedit_char_whitelist": "", "hocr_char_boxes": "0"}
+    assert api.psm == 3
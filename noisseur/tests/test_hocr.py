@@ -0,0 +1,242 @@
+import pytest
+
+pytest.importorskip("bs4")
+
+from noisseur.hocr import HocrParser  # noqa: E402
+
+PAGE = """<div class='ocr_page' id='page_1'
+ title='image "unknown"; bbox 0 0 600 200; ppageno 0'>
+ <div class='ocr_carea' id='block_1_1' title="bbox 10 10 590 190">
+  <p class='ocr_par' id='par_1_1' lang='eng' title="bbox 10 10 590 190">
+   <span class='ocr_line' id='line_1_1'
+    title="bbox 10 10 300 40; baseline 0 -5; x_size 30; x_descenders 5; x_ascenders 8">
+    <span class='ocrx_word' id='word_1_1' title='bbox 10 10 100 40; x_wconf 91'>
+     <span class='ocrx_cinfo' title='x_bboxes 10 10 40 40; x_conf 99.5'>A</span>
+     <span class='ocrx_cinfo' title='x_bboxes 40 10 70 40; x_conf 80.25'>&amp;</span>
+     <span class='ocrx_cinfo' title='x_bboxes 70 10 100 40; x_conf 97'>&lt;</span>
+    </span>
+    <span class='ocrx_word' id='word_1_2'
+     title='bbox 120 10 300 40; x_wconf 64'><strong>Bo&#39;ld</strong></span>
+   </span>
+   <span class='ocr_caption' id='line_1_2'
+    title="bbox 10 50 300 80; baseline 0 -5; x_size 30">
+    <span class='ocrx_word' id='word_1_3'
+     title='bbox 10 50 300 80; x_wconf 88'>Caption</span>
+   </span>
+   <span class='ocr_header' id='line_1_3' title="bbox 10 90 300 120">
+    <span class='ocrx_word' id='word_1_4'
+     title='bbox 10 90 150 120; x_wconf 77'>Head</span>
+    <span class='ocrx_word' id='word_1_5' title='bbox 160 90 300 120; x_wconf 0'> </span>
+   </span>
+  </p>
+ </div>
+ <div class='ocr_carea' id='block_1_2' title="bbox 10 130 590 190">
+  <p class='ocr_par' id='par_1_2' lang='eng' title="bbox 10 130 590 190">
+   <span class='ocr_line extra' id='line_1_4' title="bbox 10 130 590 190">
+    <span class='ocrx_word' id='word_1_6'
+     title='bbox 10 130 590 190; x_wconf 95'>12/03/1980</span>
+   </span>
+  </p>
+ </div>
+</div>
+"""
+
+XHTML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
+    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">
+ <head><title></title><meta name='ocr-system' content='tesseract' /></head>
+ <body>
+""" + PAGE + PAGE.replace("page_1", "page_2") + """ </body>
+</html>
+"""
+
+
+def dump(o):
+    if isinstance(o, list):
+        return [dump(x) for x in o]
+    if isinstance(o, dict):
+        return {k: dump(v) for k, v in o.items()}
+    if hasattr(o, "__slots__"):
+        # lazy glyphs are compared decoded, unset slots are skipped
+        slots = [k for cls in type(o).__mro__ for k in getattr(cls, "__slots__", ())]
+        keys = [k.lstrip("_") for k in slots if k != "glyphs_loader" and hasattr(o, k)]
+        return type(o).__name__, dump({k: getattr(o, k) for k in keys})
+    return o
+
+
+def assert_same(a: HocrParser.Document, b: HocrParser.Document):
+    assert dump(a.pages) == dump(b.pages)
+    assert dump(a.lines) == dump(b.lines)
+    assert dump(a.words) == dump(b.words)
+    assert a.hocr == b.hocr
+
+
+@pytest.mark.parametrize("hocr", [PAGE, XHTML, PAGE + "<br>"],
+                         ids=["fragment", "xhtml", "not-xml"])
+def test_parse_stream_same_as_parse(hocr):
+    assert_same(HocrParser().parse(hocr), HocrParser().parse_stream(hocr))
+
+
+def test_parse_stream_structure():
+    doc = HocrParser().parse_stream(PAGE)
+    # par lines are ordered as captions, headers, then lines
+    assert [line.id for line in doc.lines] == ["line_1_2", "line_1_3", "line_1_1",
+                                               "line_1_4"]
+    assert [type(line).__name__ for line in doc.lines] == ["OcrCaption", "OcrHeader",
+                                                           "OcrLine", "OcrLine"]
+    assert [w.text for w in doc.words] == ["Caption", "Head", "", "A&<", "Bo'ld",
+                                           "12/03/1980"]
+    line = doc.lines[2]
+    assert line.text == "A&< Bo'ld"
+    # glyphs are decoded on first access
+    assert line.words[0].glyphs_loader and not line.words[1].glyphs_loader
+    assert [g.char_ for g in line.glyphs] == ["A", "&", "<"]
+    assert line.words[0].glyphs[1].x_conf == 80.25
+    assert line.words[0].glyphs[1].x_bboxes.left == 40
+    assert line.baseline.shift == -5.0
+    words = [w for line in doc.lines for w in line.words]
+    assert all(w is w2 for w, w2 in zip(doc.words, words))
+
+
+TSV = "\t".join(["level", "page_num", "block_num", "par_num", "line_num", "word_num",
+                 "left", "top", "width", "height", "conf", "text"]) + """
+1\t1\t0\t0\t0\t0\t0\t0\t600\t200\t-1\t
+2\t1\t1\t0\t0\t0\t10\t10\t580\t180\t-1\t
+3\t1\t1\t1\t0\t0\t10\t10\t580\t180\t-1\t
+4\t1\t1\t1\t1\t0\t10\t10\t290\t30\t-1\t
+5\t1\t1\t1\t1\t1\t10\t10\t90\t30\t91.5\tA&lt;
+5\t1\t1\t1\t1\t2\t120\t10\t180\t30\t64.2\t\x20
+4\t1\t1\t1\t2\t0\t10\t50\t290\t30\t-1\t
+5\t1\t1\t1\t2\t1\t10\t50\t290\t30\t88.9\t12/03/1980
+"""
+
+
+def values(doc: HocrParser.Document):
+    """Node values of document, columnar documents have node views instead of objects."""
+    def bbox(b):
+        return b and (b.left, b.top, b.right, b.bottom)
+
+    def glyph(g):
+        return bbox(g.bbox), bbox(g.x_bboxes), g.x_conf, g.char_
+
+    def word(w):
+        return w.id, bbox(w.bbox), w.x_wconf, w.text, [glyph(g) for g in w.glyphs]
+
+    def line(o):
+        classes = (HocrParser.OcrCaption, HocrParser.OcrHeader, HocrParser.OcrLine)
+        kind = next(c.__name__ for c in classes if isinstance(o, c))
+        baseline = o.baseline and (o.baseline.slope, o.baseline.shift)
+        return (kind, o.id, bbox(o.bbox), baseline, o.x_size, o.x_descenders,
+                o.x_ascenders, getattr(o, "lang", None), o.text,
+                [word(w) for w in o.words], [glyph(g) for g in o.glyphs])
+
+    def par(o):
+        return o.id, bbox(o.bbox), [line(o2) for o2 in o.lines]
+
+    def area(o):
+        return o.id, bbox(o.bbox), [par(o2) for o2 in o.pars]
+
+    pages = [(p.id, bbox(p.bbox), [area(a) for a in p.areas]) for p in doc.pages]
+    return pages, [line(o) for o in doc.lines], [word(w) for w in doc.words]
+
+
+@pytest.mark.parametrize("hocr", [PAGE, XHTML, PAGE + "<br>"],
+                         ids=["fragment", "xhtml", "not-xml"])
+def test_columnar_same_as_parse_stream(hocr):
+    columnar = pytest.importorskip("noisseur.columnar")
+    a = HocrParser().parse_stream(hocr)
+    b = columnar.ColumnarDocument.parse(hocr)
+    assert values(a) == values(b)
+    for doc in (a, b):
+        doc.offset(5, -3)
+        doc.scale(0.5, 1 / 3)
+    assert values(a) == values(b)
+    assert values(a.crop(0, 0, 150, 30)) == values(b.crop(0, 0, 150, 30))
+    a.extend(a.filter(lambda w: w.x_wconf > 80))
+    b.extend(b.filter(lambda w: w.x_wconf > 80))
+    assert values(a)[1:] == values(b)[1:]
+
+
+def test_columnar_tsv():
+    columnar = pytest.importorskip("noisseur.columnar")
+    doc = columnar.ColumnarDocument.parse_tsv(TSV)
+    assert values(HocrParser().parse_tsv(TSV)) == values(doc)
+
+
+def test_columnar_views():
+    columnar = pytest.importorskip("noisseur.columnar")
+    doc = columnar.ColumnarDocument.parse(PAGE)
+    doc.offset(1, 2)
+    assert doc.glyph_titles is not None
+    assert doc.lines[2].words[0].glyphs[0].x_bboxes.top == 12
+    assert doc.glyph_titles is None
+    assert [type(line).__name__ for line in doc.lines] == ["CaptionView", "HeaderView",
+                                                           "LineView", "LineView"]
+    assert isinstance(doc.lines[0], HocrParser.OcrCaption)
+    words = [w for line in doc.lines for w in line.words]
+    assert all(w is w2 for w, w2 in zip(doc.words, words))
+    # words are writable, lines text is derived from words
+    w = doc.lines[2].words[1]
+    w.text = "Bold"
+    w.x_wconf = 99.0
+    w.glyphs = []
+    assert doc.lines[2].text == "A&< Bold"
+    assert doc.words[4].x_wconf == 99.0
+    assert doc.word_conf.dtype.name == "float64" and doc.word_bbox.shape == (6, 4)
+    # views have no instance dict, bbox views are cached until columns change
+    assert not hasattr(w, "__dict__") and w.bbox is w.bbox
+    bbox = w.bbox
+    doc.extend(columnar.ColumnarDocument.parse(PAGE))
+    doc.offset(1, 0)
+    assert w.bbox is not bbox and w.bbox.left == bbox.left + 1
+
+
+def test_transform_keeps_glyphs_lazy():
+    a = HocrParser().parse_stream(PAGE)
+    b = HocrParser().parse_stream(PAGE)
+    lazy = [w for w in b.words if w.glyphs_loader]
+    assert lazy
+    values(a)  # decodes all glyphs
+    for doc in (a, b):
+        doc.offset(5, -3)
+        doc.scale(0.5, 1 / 3)
+        doc.offset(-1, 2)
+    cropped = b.crop(0, 0, 150, 30)
+    assert all(w.glyphs_loader for w in lazy)
+    assert values(a) == values(b)
+    assert not any(w.glyph_ops for w in b.words)
+    assert values(a.crop(0, 0, 150, 30)) == values(cropped)
+
+
+def test_parse_glyphs_loader_keeps_no_tree():
+    import bs4
+    doc = HocrParser().parse(PAGE)
+    cinfos = [c for w in doc.words if w.glyphs_loader for c in w.glyphs_loader.args[0]]
+    assert cinfos
+    assert not any(isinstance(node, bs4.Tag) for node, text in cinfos)
+
+
+def test_crop_offset_round_trip():
+    doc = HocrParser().parse_stream(PAGE)
+    original = values(doc)
+    doc.offset(7, -4)
+    doc.offset(-7, 4)
+    assert values(doc) == original
+    doc.scale(2.0, 4.0)
+    doc.scale(0.5, 0.25)
+    assert values(doc) == original
+
+    # words by bbox center, lines are copies with filtered words
+    cropped = doc.crop(0, 0, 150, 45)
+    assert [w.id for w in cropped.words] == ["word_1_1"]
+    assert [line.text for line in cropped.lines] == ["A&<"]
+    assert doc.lines[2].text == "A&< Bo'ld"
+    assert cropped.pages is doc.pages
+    # region OCR coordinates converted to frame ones select the same words
+    region = HocrParser().parse_stream(PAGE)
+    region.offset(100, 50)
+    moved = region.crop(100, 50, 250, 95)
+    assert values(moved)[2] != values(cropped)[2]
+    moved.offset(-100, -50)
+    assert values(moved)[1:] == values(cropped)[1:]
@@ -0,0 +1,60 @@
+import pytest
+
+
+def import_incremental():
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+    from noisseur import incremental
+    return incremental
+
+
+def test_frame_diff_tiles():
+    incremental = import_incremental()
+    import numpy as np
+
+    prev = np.full((50, 70), 100, dtype=np.uint8)
+    cur = prev.copy()
+    cur[5, 5] = 110       # below threshold
+    cur[20, 33] = 200     # tile (1, 2)
+    cur[49, 69] = 0       # last partial tile (3, 4)
+    tiles = incremental.FrameDiff.tiles(prev, cur, 16, 20)
+    assert tiles.shape == (4, 5)
+    assert sorted(zip(*np.nonzero(tiles))) == [(1, 2), (3, 4)]
+    assert not incremental.FrameDiff.tiles(prev, prev, 16, 0).any()
+
+
+def test_frame_diff_overlaps():
+    incremental = import_incremental()
+    import numpy as np
+
+    from noisseur.model import Rect
+
+    tiles = np.zeros((4, 5), dtype=bool)
+    tiles[1, 2] = True
+    overlaps = incremental.FrameDiff.overlaps
+    assert overlaps(tiles, 16, Rect(32, 16, 48, 32))
+    assert overlaps(tiles, 16, Rect(0, 0, 33, 17))      # corner pixel of tile
+    assert not overlaps(tiles, 16, Rect(0, 0, 32, 16))  # right/bottom exclusive
+    assert not overlaps(tiles, 16, Rect(48, 0, 80, 64))
+    assert not overlaps(tiles, 16, Rect(100, 100, 120, 120))  # outside frame
+    assert overlaps(tiles, 16, Rect(-10, -10, 40, 20))
+    assert overlaps(tiles, 16, Rect(40, 20, 40, 20))    # empty rect, its tile
+
+
+def test_incremental_tracker():
+    incremental = import_incremental()
+
+    tracker = incremental.IncrementalTracker(2)
+    a, b, c = (incremental.FrameState(version=v) for v in "abc")
+    tracker.put("s1", a)
+    tracker.put("s2", b)
+    assert tracker.get("s1") is a  # s2 is least recently used now
+    tracker.put("s3", c)
+    assert tracker.get("s2") is None
+    assert tracker.get("s1") is a and tracker.get("s3") is c
+    assert a.ts > 0
+    # partial results drop source state
+    tracker.put("s1", None)
+    assert tracker.get("s1") is None
+    assert tracker.stats() == {"sources": 1, "max_sources": 2}
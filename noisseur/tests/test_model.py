@@ -1,5 +1,382 @@
+import os
+
 import pytest
 
+RECTS = [(0, 0, 100, 50), (-30, -20, 10, 10), (0, 0, 1000, 1000), (250, 100, 250, 400),
+         (900, 900, 950, 950)]
+
+
 def test_1():
     print("test_1")
     assert True
+
+
+def make_words(n: int) -> list:
+    from noisseur.hocr import HocrParser
+
+    words = []
+    for i in range(n):
+        w = HocrParser.OcrxWord()
+        w.text = str(i)
+        w.bbox = HocrParser.BBox()
+        w.bbox.left, w.bbox.top = (i * 37) % 500 - 20, (i * 53) % 400 - 10
+        w.bbox.right, w.bbox.bottom = w.bbox.left + 30 + i % 7, w.bbox.top + 15
+        words.append(w)
+    return words
+
+
+def scan(words: list, rc) -> list:
+    from noisseur.model import Rect
+
+    return [w for w in words if rc.contains(Rect.from_bbox(w.bbox).center())]
+
+
+def test_word_grid_same_as_scan():
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("PIL")
+    from noisseur.model import Rect, WordGrid
+
+    words = make_words(200)
+    grid = WordGrid(words, cell_size=16)
+    for rc in RECTS:
+        assert grid.query(Rect(*rc)) == scan(words, Rect(*rc))
+
+
+def test_extract_texts_same_as_scan():
+    pytest.importorskip("dataclasses_json")
+    np = pytest.importorskip("numpy")
+    from noisseur.extract import extract_texts
+    from noisseur.hocr import HocrParser
+    from noisseur.model import Rect
+
+    doc = HocrParser.Document()
+    doc.words = make_words(200)
+    expected = [" ".join(w.text for w in scan(doc.words, Rect(*rc))) or None
+                for rc in RECTS]
+    assert extract_texts(doc, np.array(RECTS)) == expected
+    assert expected[-1] is None
+
+
+def test_registry_engines_same_as_scan():
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+    from noisseur.hocr import HocrParser
+    from noisseur.model import ModelMatch, ModelService
+
+    root = os.path.join(os.path.dirname(__file__), "..", "..")
+    svc = ModelService()
+    for path in ["data/model/s_010.json", "data/model/s_011.json"]:
+        svc.register(os.path.join(root, path))
+    model = svc.find_by_screen_type("dot-cockpit-editor")
+    assert svc.find_by_id(model.id) is model
+    assert svc.get_control_point(model).id == "title"
+
+    doc = HocrParser.Document()
+    doc.words = make_words(300)
+    match = ModelMatch(model, 7, -3, 0.5, 0.5)
+    expected = svc.get_data_as_dict(doc, match, ModelService.EXTRACT_ENGINE_SCAN)
+    assert expected["data"]["list_1"]
+    for engine in (ModelService.EXTRACT_ENGINE_GRID, ModelService.EXTRACT_ENGINE_VECTOR):
+        assert svc.get_data_as_dict(doc, match, engine) == expected
+    # layouts are cached per model and scale
+    assert svc.get_layout(model, 0.5, 0.5) is svc.get_layout(model, 0.5, 0.5)
+
+
+def test_match_engines_same_as_scan():
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+    from noisseur.hocr import HocrParser
+    from noisseur.model import (ControlPointType, Form, Item, Model,
+                                ModelService, Rect)
+
+    def model(model_id: str, text: list) -> Model:
+        item = Item(id="title", rect=Rect(10, 5, 110, 25), text=text,
+                    control_point=ControlPointType.TOP_LEFT)
+        return Model(id=model_id, screen_type=model_id, form=Form(items=[item]))
+
+    def doc(*lines: str) -> HocrParser.Document:
+        doc = HocrParser.Document()
+        for y, s in enumerate(lines):
+            line = HocrParser.OcrLine()
+            line.text = s
+            for x, text in enumerate(s.split()):
+                w = HocrParser.OcrxWord()
+                w.text = text
+                w.bbox = HocrParser.BBox()
+                w.bbox.left, w.bbox.top = x * 50, y * 20
+                w.bbox.right, w.bbox.bottom = x * 50 + 40, y * 20 + 15
+                line.add_word(w)
+                doc.add_word(w)
+            doc.add_line(line)
+        return doc
+
+    svc = ModelService()
+    models = [model("missing", ["Zzz Yyy"]), model("empty", ["", "Main Menu"]),
+              model("short", ["ok"]), model("menu", ["Nothing", "main menu"]),
+              model("editor", ["Program Editor"])]
+    for m in models:
+        svc.add(m)
+
+    docs = [doc("File Edit", "Main Menu Program Editor"),
+            doc("Program Editor", "Press Enter"), doc("xx ok"), doc("Zzz", "Yyy"), doc()]
+    expected = ["menu", "editor", "short", None, None]
+    first = ModelService.MATCH_MODE_FIRST
+    for d, model_id in zip(docs, expected):
+        match = svc.find_by_hocr(d, 0.5, ModelService.MATCH_ENGINE_SCAN, first)
+        assert (match.model.id if match else None) == model_id
+        assert svc.find_by_hocr(d, 0.5, ModelService.MATCH_ENGINE_INDEX, first) == match
+
+
+def test_find_best():
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+    from concurrent.futures import ThreadPoolExecutor
+
+    from noisseur.hocr import HocrParser
+    from noisseur.model import (ControlPointType, Form, Item, ItemType, Model,
+                                ModelService, Rect)
+
+    def model(model_id: str, labels: list) -> Model:
+        items = [Item(id="title", type=ItemType.CAPTION, rect=Rect(0, 0, 200, 20),
+                      text=["Editor"], control_point=ControlPointType.TOP_LEFT)]
+        items += [Item(id=f"label_{k}", type=ItemType.LABEL,
+                       rect=Rect(0, 20 * k + 20, 200, 20 * k + 40), text=[s])
+                  for k, s in enumerate(labels)]
+        return Model(id=model_id, screen_type=model_id, form=Form(items=items))
+
+    doc = HocrParser.Document()
+    for y, s in enumerate(["Editor", "Name", "Speed Limit", "Depth"]):
+        line = HocrParser.OcrLine()
+        line.text = s
+        for x, text in enumerate(s.split()):
+            w = HocrParser.OcrxWord()
+            w.text = text
+            w.bbox = HocrParser.BBox()
+            w.bbox.left, w.bbox.top = x * 60 + 5, y * 20 + 2
+            w.bbox.right, w.bbox.bottom = x * 60 + 55, y * 20 + 17
+            line.add_word(w)
+            doc.add_word(w)
+        doc.add_line(line)
+
+    svc = ModelService()
+    svc._executor = ThreadPoolExecutor(max_workers=2)
+    models = [model("other", ["Name", "Width"]),
+              model("tie", ["Name", "speed limit", "Nothing"]),
+              model("editor", ["Name", "Speed limit", "Depth"]),
+              model("same", ["Name", "Speed", "Depth"])]
+    for m in models:
+        svc.add(m)
+
+    for workers in (0, 2):
+        match = svc.find_best(doc, svc.models, 1.0, workers=workers)
+        assert match.model.id == "editor"
+        assert match.score == 4
+        models = [c["model"] for c in match.candidates]
+        assert models == ["other", "tie", "editor", "same"]
+        assert all(c["ms"] >= 0 for c in match.candidates)
+    # serially "same" can't beat equal score of "editor" registered before it,
+    # "other" has fewer labels
+    match = svc.find_best(doc, svc.models, 1.0, workers=0)
+    scores = [(c["score"], c["pruned"]) for c in match.candidates]
+    assert scores == [(None, True), (3, False), (4, False), (None, True)]
+
+
+def test_screen_classifier():
+    pytest.importorskip("numpy")
+    pytest.importorskip("PIL")
+    from PIL import Image
+
+    from noisseur.classifier import ScreenClassifier
+
+    class Screen:
+        def __init__(self, model_id: str):
+            self.id = model_id
+
+    root = os.path.join(os.path.dirname(__file__), "..", "..")
+    classifier = ScreenClassifier(0.8)
+    for name in ["s_007", "s_010"]:
+        path = os.path.join(root, f"data/model/{name}.png")
+        classifier.add(Screen(name), ScreenClassifier.load_gray(path))
+
+    classifier.prepare([(1280, 1024)])
+    # reference image sizes and configured frame sizes, in cells
+    assert sorted(classifier.spectra) == [(89, 129), (100, 119), (128, 160)]
+
+    reference = ScreenClassifier.load_gray(os.path.join(root, "data/model/s_007.png"))
+    frame = Image.new("L", (1280, 1024), 20)
+    frame.paste(reference, (83, 61))
+    screen = classifier.classify(frame)
+    assert (screen.model.id, screen.x, screen.y) == ("s_007", 83, 61)
+    assert screen.score >= 0.8
+    assert classifier.classify(Image.new("L", (1280, 1024), 20)) is None
+    assert classifier.classify(Image.effect_noise((1280, 1024), 60)) is None
+
+    # frame size without precomputed spectra
+    frame2 = Image.new("L", (1200, 1000), 20)
+    frame2.paste(reference, (83, 61))
+    screen = classifier.classify(frame2)
+    assert (screen.model.id, screen.x, screen.y) == ("s_007", 83, 61)
+    assert (125, 150) not in classifier.spectra
+
+    # only the best screen by coarse cells is searched in cells
+    classifier.COARSE_CANDIDATES = 1
+    for f in (frame, frame2):
+        screen = classifier.classify(f)
+        assert (screen.model.id, screen.x, screen.y) == ("s_007", 83, 61)
+
+
+def test_model_bundle(tmp_path, monkeypatch):
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+    import shutil
+
+    from noisseur.bundle import ModelBundle
+    from noisseur.hocr import HocrParser
+    from noisseur.model import ModelService
+
+    root = os.path.join(os.path.dirname(__file__), "..", "..")
+    inputs = ["s_010.json", "s_011.json"]
+    for name in inputs:
+        shutil.copy(os.path.join(root, "data/model", name), tmp_path / name)
+    svc = ModelService()
+    for name in inputs:
+        svc.register(str(tmp_path / name))
+    assert svc.validate() == []
+    model = svc.find_by_screen_type("dot-cockpit-editor")
+    layout = svc.get_layout(model, 3.0, 3.0)
+
+    bundle = ModelBundle(str(tmp_path / "models.bundle"), str(tmp_path))
+    header = bundle.write(svc, inputs, inputs, "schema")
+    assert header["buffers"]
+    svc2: ModelService = bundle.load(inputs, "schema")
+    assert svc2.version == svc.version
+    assert [m.to_dict() for m in svc2.models] == [m.to_dict() for m in svc.models]
+    model2 = svc2.find_by_screen_type("dot-cockpit-editor")
+    layout2 = svc2.get_layout(model2, 3.0, 3.0)
+    assert layout2.model is model2 and layout2.plan == layout.plan
+    # rects are memory mapped
+    assert (layout2.rects == layout.rects).all() and not layout2.rects.flags.writeable
+    engine, mode = ModelService.MATCH_ENGINE_INDEX, ModelService.MATCH_MODE_FIRST
+    assert svc2.find_by_hocr(HocrParser.Document(), 1.0, engine, mode) is None
+
+    # memory map of bundle not loaded is closed
+    maps = []
+    close = ModelBundle.close
+
+    def close_spy(mm, views):
+        maps.append(mm)
+        close(mm, views)
+
+    monkeypatch.setattr(ModelBundle, "close", staticmethod(close_spy))
+    assert bundle.load(inputs, "schema2") is None
+    assert bundle.load(inputs[:1], "schema") is None
+    # corrupted payload is not unpickled
+    offset = header["payload"][0] + header["payload"][1] // 2
+    with open(bundle.path, "r+b") as f:
+        f.seek(offset)
+        b = f.read(1)
+        f.seek(offset)
+        f.write(bytes([b[0] ^ 0xFF]))
+    assert bundle.load(inputs, "schema") is None
+    assert len(maps) == 3 and all(mm.closed for mm in maps)
+
+    with open(tmp_path / inputs[1], "a") as f:
+        f.write("\n")
+    assert bundle.load(inputs, "schema") is None
+
+
+def test_model_factory_reload_snapshot(tmp_path, monkeypatch):
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+    import threading
+
+    from noisseur.cfg import AppConfig
+    from noisseur.model import ModelFactory
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+    def config(names: list) -> AppConfig:
+        ini = tmp_path / "noisseur.ini"
+        models = "".join(f"\n    {root}/data/model/{name}" for name in names)
+        ini.write_text(f"[noisseur]\nMODEL_LIST={models}\nMODEL_SCALES=3\n"
+                       "ADAPTIVE_SCALES=\nMODEL_BUNDLE=\n"
+                       "CLASSIFIER_MODE=off\nCLASSIFIER_THRESHOLD=0.8\n")
+        cfg = AppConfig()
+        cfg.load([str(ini)], None)
+        return cfg
+
+    # models of this test are not left to others
+    monkeypatch.setattr(ModelFactory, "_ModelFactory__state", None)
+    prev = AppConfig.instance
+    try:
+        cfg1 = config(["s_010.json"])
+        svc1 = ModelFactory.reload(cfg1)
+        assert AppConfig.instance is cfg1 and ModelFactory.get_service() is svc1
+        with ModelFactory.snapshot() as snapshot:
+            assert snapshot is svc1
+            cfg2 = config(["s_010.json", "s_011.json"])
+            svc2 = ModelFactory.reload(cfg2)
+            # request in flight keeps its models, other threads see new ones
+            assert AppConfig.instance is cfg2 and ModelFactory.get_service() is svc1
+            assert ModelFactory.get_config() is cfg1
+            with ModelFactory.snapshot() as nested:
+                assert nested is svc1
+            seen = []
+
+            def task():
+                seen.append((ModelFactory.get_service(), ModelFactory.get_config()))
+            bound = ModelFactory.bind(task)
+            for target in (task, bound):
+                thread = threading.Thread(target=target)
+                thread.start()
+                thread.join()
+            assert seen == [(svc2, cfg2), (svc1, cfg1)]
+        assert ModelFactory.get_service() is svc2 and ModelFactory.get_config() is cfg2
+        assert len(svc2.models) == 2 and svc2.version != svc1.version
+    finally:
+        AppConfig.instance = prev
+
+
+def test_model_factory_reload_doesnt_block_requests(monkeypatch):
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+    import threading
+    from types import SimpleNamespace
+
+    from noisseur.cfg import AppConfig
+    from noisseur.model import ModelFactory
+
+    svc1 = SimpleNamespace(version="1", models=[])
+    svc2 = SimpleNamespace(version="2", models=[])
+    cfg1, cfg2 = AppConfig(), AppConfig()
+    loading, release = threading.Event(), threading.Event()
+
+    def load(cfg=None):
+        if cfg is not cfg2:
+            return svc1
+        loading.set()
+        release.wait(10)
+        return svc2
+
+    monkeypatch.setattr(ModelFactory, "load", load)
+    monkeypatch.setattr(ModelFactory, "_ModelFactory__state", None)
+    prev = AppConfig.instance
+    try:
+        ModelFactory.reload(cfg1)
+        thread = threading.Thread(target=ModelFactory.reload, args=(cfg2,))
+        thread.start()
+        assert loading.wait(10)
+        # requests keep reading current models while new ones are loaded
+        assert ModelFactory.get_snapshot() == (svc1, cfg1)
+        release.set()
+        thread.join()
+        assert ModelFactory.get_snapshot() == (svc2, cfg2)
+    finally:
+        release.set()
+        AppConfig.instance = prev
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+
+def import_stream():
+    for name in ("flask_sock", "pytesseract", "dataclasses_json", "bs4"):
+        pytest.importorskip(name)
+    from noisseur import stream
+    from noisseur.app import stream as app_stream
+    return stream, app_stream
+
+
+def test_parse_frame():
+    stream, app_stream = import_stream()
+
+    assert app_stream.parse_frame(b"png") == (b"png", None, None)
+    assert app_stream.parse_frame(json.dumps({"cmd": "stats"})) == (None, None, "stats")
+    image, path, cmd = app_stream.parse_frame(json.dumps({"path": "/"}))
+    assert (image, path, cmd) == (None, "/", None)
+    for message in ("[1, 2]", "5", '"frame.png"', "null", '{"path": 5}', "{not json"):
+        with pytest.raises(ValueError):
+            app_stream.parse_frame(message)
+
+
+def test_stream_session_deadline(monkeypatch):
+    stream, app_stream = import_stream()
+    from noisseur.ocr import OcrScreenData
+
+    calls = []
+
+    class FakeApiService:
+        def ocr_screen(self, image, path, source=None, deadline=None):
+            calls.append(deadline)
+            osd = OcrScreenData(type="screen", data={"n": len(calls)}, success=True)
+            osd.timed_out = len(calls) == 2
+            return osd
+
+    monkeypatch.setattr(stream.ApiFactory, "get_service", lambda: FakeApiService())
+    session = stream.StreamSession("console", 5000)
+    assert session.process(b"a")["data"] == {"n": 1}
+    # partial result is not reported as change, identical frame is retried
+    assert session.process(b"b") is None
+    assert session.process(b"b")["data"] == {"n": 3}
+    assert all(0 < d.remaining() <= 5.0 for d in calls)
+    assert session.stats()["timed_out"] == 1 and session.stats()["processed"] == 3
+
+    session = stream.StreamSession("console", 0)
+    session.process(b"a")
+    assert calls[-1] is None
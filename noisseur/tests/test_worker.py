@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+
+def test_worker_pool_rejects_when_full():
+    pytest.importorskip("pytesseract")
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("bs4")
+    from noisseur.worker import OcrWorkerPool, QueueFullError
+
+    pool = OcrWorkerPool(OcrWorkerPool.TYPE_THREAD, 1, 1)
+    release = threading.Event()
+    try:
+        running = pool.submit(release.wait, 10)
+        queued = pool.submit(lambda x: x * 2, 21)
+        with pytest.raises(QueueFullError):
+            pool.submit(lambda: None)
+        with pytest.raises(QueueFullError):
+            pool.submit(lambda: None, block=True, timeout=0.05)
+        stats = pool.stats()
+        assert (stats["in_flight"], stats["queue_depth"], stats["rejected"]) == (2, 1, 2)
+
+        release.set()
+        assert running.result(5)[0] is True
+        res, wait_ms = queued.result(5)
+        assert res == 42 and wait_ms >= 0
+        # slots are released by completed tasks
+        assert pool.submit(lambda: "ok").result(5)[0] == "ok"
+        stats = pool.stats()
+        assert (stats["in_flight"], stats["completed"], stats["failed"]) == (0, 3, 0)
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_worker_pool_failed_task():
+    pytest.importorskip("pytesseract")
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("bs4")
+    from noisseur.worker import OcrWorkerPool
+
+    pool = OcrWorkerPool(OcrWorkerPool.TYPE_THREAD, 1, 0)
+    try:
+        with pytest.raises(ZeroDivisionError):
+            pool.submit(lambda: 1 / 0).result(5)
+        assert pool.submit(lambda: 1).result(5)[0] == 1
+        stats = pool.stats()
+        assert (stats["failed"], stats["completed"], stats["in_flight"]) == (1, 1, 0)
+    finally:
+        pool.shutdown()
+
+
+def test_init_worker_never_raises(monkeypatch):
+    pytest.importorskip("pytesseract")
+    pytest.importorskip("dataclasses_json")
+    pytest.importorskip("bs4")
+    from noisseur import worker
+
+    def broken():
+        raise RuntimeError("no config")
+
+    monkeypatch.setattr(worker, "_worker", {})
+    monkeypatch.setattr(worker, "app_init", broken)
+    worker.init_worker(("chain", 3.0, 0), threading.Barrier(1))
+    assert worker._worker["error"] == "no config"
+    # reported by warm-up, so that server is not ready
+    with pytest.raises(RuntimeError, match="no config"):
+        worker.warmup_status_task(1)
+
+    del worker._worker["error"]
+    worker._worker["warmup"] = [{"model": "s_001", "success": True}]
+    pid, results = worker.warmup_status_task(1)
+    assert results == [{"model": "s_001", "success": True}]
@@ -0,0 +1,75 @@
+import logging
+import logging.config
+
+from noisseur.hocr import HocrParser
+
+logger = logging.getLogger(__name__)
+
+
+def trigrams(s: str) -> set:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class DocumentTextIndex:
+    """Lowercase trigram index of document lines text, built once per
+    document, so substring search is done only in lines containing all
+    trigrams of searched text.
+    """
+
+    def __init__(self, doc: HocrParser.Document):
+        self.lines = [line for line in doc.lines if line.text]  # OcrLine[] with text
+        self.texts = [line.text.lower() for line in self.lines]
+        self.trigrams = {}  # trigram -> line indexes
+        for i, s in enumerate(self.texts):
+            for g in trigrams(s):
+                self.trigrams.setdefault(g, []).append(i)
+
+    def find_lines(self, text: str) -> list:
+        """Returns lines which lowercase text contains text (lowercase) in
+        document order.
+        """
+        grams = trigrams(text)
+        if grams:
+            postings = sorted((self.trigrams.get(g, []) for g in grams), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            indexes = sorted(candidates)
+        else:
+            indexes = range(len(self.texts))
+        return [self.lines[i] for i in indexes if text in self.texts[i]]
+
+
+class TrigramIndex:
+    """Inverted trigram index of texts by key, e.g. model control point
+    texts, returns keys of texts which trigrams are all present in text
+    set searched, i.e. keys of texts document could contain.
+    """
+
+    def __init__(self):
+        self.postings = {}  # trigram -> keys
+        self.counts = {}    # key -> trigrams count
+        self.short = []     # keys of texts shorter than trigram, always returned
+
+    def add(self, key, text: str) -> None:
+        grams = trigrams(text)
+        if not grams:
+            self.short.append(key)
+            return
+        self.counts[key] = len(grams)
+        for g in grams:
+            self.postings.setdefault(g, []).append(key)
+
+    def candidates(self, grams) -> set:
+        """Returns keys of texts which trigrams are all in grams (set or
+        dict keys).
+        """
+        hits = {}  # key -> matched trigrams count
+        if len(self.postings) < len(grams):
+            items = ((g, keys) for g, keys in self.postings.items() if g in grams)
+        else:
+            items = ((g, self.postings[g]) for g in grams if g in self.postings)
+        for _, keys in items:
+            for key in keys:
+                hits[key] = hits.get(key, 0) + 1
+        res = {key for key, n in hits.items() if n == self.counts[key]}
+        res.update(self.short)
+        return res
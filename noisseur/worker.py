@@ -0,0 +1,199 @@
+import logging
+import logging.config
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from noisseur.cfg import app_init
+from noisseur.engine import OcrEngineFactory
+from noisseur.model import ModelFactory
+from noisseur.ocr import OcrFactory
+from noisseur.reloader import ReloaderFactory
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when OCR worker pool queue has no free slots."""
+    pass
+
+
+#: per process worker state set by init_worker: "barrier", "warmup"
+#: (per model warm-up results) and "error" (initialization error)
+_worker = {}
+
+
+def init_worker(warmup: tuple = None, barrier=None) -> None:
+    """Worker process initializer, loads configuration, models and OCR
+    engine once per process, configuration and models are reloaded after
+    server process reloaded them (see Reloader.sync). When warmup (chain,
+    scale, border) is specified, full pipeline is run over model images
+    before first task. Never raises, failed initializer breaks the whole
+    pool, errors are recorded and reported by warmup_status_task instead.
+    """
+    _worker["barrier"] = barrier
+    try:
+        app_init()
+        ModelFactory.init()
+        ReloaderFactory.get_reloader()
+        OcrFactory.get_service()
+        OcrEngineFactory.get_engine()
+        if warmup:
+            _worker["warmup"] = OcrFactory.get_service().warmup(*warmup)
+        logger.info("OCR worker initialized")
+    except Exception as ex:
+        _worker["error"] = str(ex)
+        logger.error(f"OCR worker initialization failed: {str(ex)}")
+
+
+def warmup_task(chain, scale: float, border: int) -> tuple:
+    """Warm-up task executed in request thread or thread pool worker,
+    returns (process id, per model warm-up results) tuple.
+    """
+    with ModelFactory.snapshot():
+        return os.getpid(), OcrFactory.get_service().warmup(chain, scale, border)
+
+
+def warmup_status_task(timeout: float) -> tuple:
+    """Process pool worker task, returns (process id, per model warm-up
+    results of init_worker) tuple. Waits on barrier until every worker
+    process took one such task, so each of them reports exactly once.
+    """
+    _worker["barrier"].wait(timeout)
+    if "error" in _worker:
+        raise RuntimeError(f"OCR worker {os.getpid()} initialization failed: "
+                           f"{_worker['error']}")
+    return os.getpid(), _worker.get("warmup")
+
+
+def _run_task(fn, args, generation: int = None):
+    if generation is not None:
+        ReloaderFactory.get_reloader().sync(generation)
+    started = time.time()
+    return started, fn(*args)
+
+
+class OcrWorkerPool:
+    """Bounded OCR worker pool, at most workers + queue_size tasks can be
+    submitted at once, otherwise QueueFullError is raised, so callers
+    reject fast instead of piling up requests.
+    """
+    TYPE_PROCESS: str = "process"
+    TYPE_THREAD: str = "thread"
+
+    #: max seconds worker processes wait for each other in warm-up
+    WARMUP_TIMEOUT_SEC: float = 600
+
+    def __init__(self, pool_type: str, workers: int, queue_size: int,
+                 warmup: tuple = None):
+        logger.debug(f"OcrWorkerPool(pool_type={pool_type}, workers={workers}, "
+                     f"queue_size={queue_size})")
+        self.pool_type = pool_type
+        self.workers = workers
+        self.queue_size = queue_size
+        self.warmup_args = warmup
+        if pool_type == OcrWorkerPool.TYPE_THREAD:
+            self._executor = ThreadPoolExecutor(max_workers=workers,
+                                                thread_name_prefix="ocr-worker")
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            barrier = ctx.Barrier(workers) if warmup else None
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                                 initializer=init_worker,
+                                                 initargs=(warmup, barrier))
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_ms_total = 0
+        self.wait_ms_max = 0
+        self.wait_ms_last = 0
+
+    def submit(self, fn, *args, block: bool = False, timeout: float = None) -> Future:
+        """Submits fn(*args) to pool, returned future result is
+        (fn result, queue wait time in ms) tuple. When block is False and
+        the queue is full QueueFullError is raised immediately.
+        """
+        if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError(f"OCR queue is full ({self.workers} workers, "
+                                 f"{self.queue_size} queued)")
+
+        submitted = time.time()
+        with self._lock:
+            self.in_flight += 1
+            self.submitted += 1
+
+        future = Future()
+
+        def done(f):
+            self._slots.release()
+            try:
+                started, res = f.result()
+                wait_ms = max(0, int((started - submitted) * 1000))
+                with self._lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+                    self.wait_ms_total += wait_ms
+                    self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+                    self.wait_ms_last = wait_ms
+                future.set_result((res, wait_ms))
+            except Exception as ex:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.failed += 1
+                future.set_exception(ex)
+
+        # worker processes reload configuration and models with server
+        generation = None
+        if self.pool_type == OcrWorkerPool.TYPE_PROCESS:
+            generation = ReloaderFactory.get_reloader().generation
+        try:
+            task = self._executor.submit(_run_task, fn, args, generation)
+            task.add_done_callback(done)
+        except BaseException:
+            self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        return future
+
+    def warmup(self) -> list:
+        """Warms up every worker process (or thread pool once), returns
+        (process id, per model warm-up results) list, one per process.
+        Process workers warm up in init_worker, warmup_status_task collects
+        their results, raises when any of them failed or timed out.
+        """
+        if self.pool_type == OcrWorkerPool.TYPE_THREAD:
+            futures = [self.submit(warmup_task, *self.warmup_args, block=True)]
+        else:
+            futures = [self.submit(warmup_status_task, self.WARMUP_TIMEOUT_SEC,
+                                   block=True) for _ in range(self.workers)]
+        return [future.result()[0] for future in futures]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "type": self.pool_type,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_ms_avg": (int(self.wait_ms_total / self.completed)
+                                if self.completed else 0),
+                "wait_ms_max": self.wait_ms_max,
+                "wait_ms_last": self.wait_ms_last
+            }
@@ -0,0 +1,92 @@
+import logging.config
+import os
+import sys
+import time
+from pathlib import Path
+
+import click
+
+_root_path = str(Path(__file__).parent.parent)
+if _root_path not in sys.path:
+    sys.path.insert(0, _root_path)
+
+from noisseur.cfg import AppConfig, app_init  # noqa: E402
+from noisseur.model import ModelFactory, ModelService  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def init(quiet: bool) -> None:
+    app_init()
+    if quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+
+
+@click.group(help='Compiles MODEL_LIST models to MODEL_BUNDLE loaded by server instead '
+                  'of model files.')
+def main():
+    pass
+
+
+@main.command("compile",
+              help='Validate MODEL_LIST models, precompute layouts, indexes and screen '
+                   'fingerprints and write them to MODEL_BUNDLE.')
+@click.option('--verbose', is_flag=True,
+              help='Keep application logging at configured level')
+def compile_models(verbose):
+    init(not verbose)
+    dt = time.time()
+    svc, errors, header = ModelFactory.compile()
+    t = time.time() - dt
+    for error in errors:
+        click.echo(f"ERROR: {error}")
+    if errors:
+        raise click.ClickException(f"{len(errors)} model error(s), "
+                                   "bundle is not written")
+    bundle = ModelFactory.get_bundle()
+    screens = len(svc.classifier.fingerprints) if svc.classifier else 0
+    click.echo(f"Models: {len(svc.models)}, layouts: {len(svc._layouts)}, "
+               f"screens: {screens}, version: {svc.version}")
+    click.echo(f"Bundle: {bundle.path}, {os.path.getsize(bundle.path)} bytes, "
+               f"buffers: {len(header['buffers'])}, compiled in {t * 1000:.1f} ms")
+    click.echo("Done.")
+
+
+@main.command("check",
+              help='Validate MODEL_LIST models and check whether MODEL_BUNDLE is up to '
+                   'date, compare model files and bundle load time.')
+@click.option('--verbose', is_flag=True,
+              help='Keep application logging at configured level')
+def check(verbose):
+    init(not verbose)
+    cfg = AppConfig.instance
+    dt = time.time()
+    classify = cfg.CLASSIFIER_MODE != ModelService.CLASSIFIER_MODE_OFF
+    svc: ModelService = ModelFactory.build(classify)
+    t = time.time() - dt
+    errors = svc.validate()
+    for error in errors:
+        click.echo(f"ERROR: {error}")
+    click.echo(f"Models: {len(svc.models)}, errors: {len(errors)}, "
+               f"model files loaded in {t * 1000:.1f} ms")
+
+    bundle = ModelFactory.get_bundle()
+    if not bundle:
+        click.echo("MODEL_BUNDLE is not configured")
+    else:
+        dt = time.time()
+        schema = ModelFactory.get_bundle_schema()
+        svc2: ModelService = bundle.load(cfg.MODEL_LIST or [], schema)
+        t = time.time() - dt
+        if svc2:
+            click.echo(f"Bundle: {bundle.path} is up to date, version: {svc2.version}, "
+                       f"loaded in {t * 1000:.1f} ms")
+        else:
+            click.echo(f"Bundle: {bundle.path} is missing or stale, run compile")
+    if errors:
+        raise click.ClickException(f"{len(errors)} model error(s)")
+    click.echo("Done.")
+
+
+if __name__ == "__main__":
+    main()
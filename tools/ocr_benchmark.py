@@ -0,0 +1,385 @@
+import copy
+import logging.config
+import os
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+import click
+
+_root_path = str(Path(__file__).parent.parent)
+if _root_path not in sys.path:
+    sys.path.insert(0, _root_path)
+
+from noisseur.cfg import AppConfig, app_init  # noqa: E402
+from noisseur.classifier import ScreenClassifier  # noqa: E402
+from noisseur.engine import parse_tesseract_config  # noqa: E402
+from noisseur.hocr import HocrParser  # noqa: E402
+from noisseur.model import (Item, ItemType, Model, ModelFactory,  # noqa: E402
+                            ModelMatch, ModelService, Rect)
+from noisseur.ocr import OcrFactory, OcrService  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+SCREEN_CHAIN: str = "prisma(3,30)"
+SCREEN_SCALE: float = 3.0
+
+
+def list_images(path_data: str) -> list:
+    if not os.path.exists(path_data):
+        path_data = os.path.join(_root_path, path_data)
+    images = [filename for filename in os.listdir(path_data)
+              if filename.endswith(('.png', '.tiff', '.tif', '.jpg', '.jpeg'))]
+    return [os.path.join(path_data, filename) for filename in sorted(images)]
+
+
+def word_keys(doc: HocrParser.Document) -> list:
+    return [(w.id, w.text, w.bbox.left, w.bbox.top, w.bbox.right, w.bbox.bottom,
+             w.x_wconf) for w in doc.words]
+
+
+def dump(o):
+    """Converts document node tree to plain lists/dicts/tuples for comparison."""
+    if isinstance(o, list):
+        return [dump(x) for x in o]
+    if isinstance(o, dict):
+        return {k: dump(v) for k, v in o.items()}
+    if hasattr(o, "__dict__"):
+        # lazy glyphs are compared decoded
+        keys = [k.lstrip("_") for k in vars(o) if k != "glyphs_loader"]
+        return type(o).__name__, dump({k: getattr(o, k) for k in keys})
+    return o
+
+
+def init(quiet: bool) -> None:
+    app_init()
+    if quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+
+
+@click.group(help='OCR pipeline benchmarks, run in-process against data/screen_data.')
+def main():
+    pass
+
+
+@main.command("output-format",
+              help='Compare hOCR and TSV tesseract output: OCR and parse time, output '
+                   'size, parsed words and extracted screen data.')
+@click.option('--path-data', default='data/screen_data',
+              help='Path to screen data directory. Default is data/screen_data')
+@click.option('--repeat', type=int, default=3,
+              help='Number of OCR runs per image and format. Default is 3.')
+@click.option('--max-count', type=int, default=-1,
+              help='Specify max screen images to be processed. Default is -1.')
+@click.option('--verbose', is_flag=True,
+              help='Keep application logging at configured level')
+def output_format(path_data, repeat, max_count, verbose):
+    init(not verbose)
+    svc: OcrService = OcrFactory.get_service()
+    cfg = parse_tesseract_config(AppConfig.instance.TESSERACT_HOCR_CONFIG)
+    formats = [OcrService.OUTPUT_FORMAT_HOCR, OcrService.OUTPUT_FORMAT_TSV]
+    images = list_images(path_data)
+    if max_count > 0:
+        images = images[:max_count]
+
+    click.echo(f"Engine: {svc.engine.name}, images count: {len(images)}, "
+               f"repeat: {repeat}")
+    totals = {fmt: {"ocr": 0.0, "parse": 0.0, "size": 0, "screen": 0.0}
+              for fmt in formats}
+    mismatches = 0
+
+    for path in images:
+        click.echo(f"{os.path.basename(path)}")
+        image = svc.preprocess(path, SCREEN_CHAIN)
+        image.load()
+        words = {}
+        data = {}
+        for fmt in formats:
+            t_ocr = t_parse = 0.0
+            for _ in range(repeat):
+                dt = time.time()
+                if fmt == OcrService.OUTPUT_FORMAT_TSV:
+                    s = svc.engine.tsv(image, cfg)
+                else:
+                    s = svc.engine.hocr(image, cfg)
+                t_ocr += time.time() - dt
+
+                dt = time.time()
+                if fmt == OcrService.OUTPUT_FORMAT_TSV:
+                    doc = HocrParser().parse_tsv(s)
+                else:
+                    doc = HocrParser().parse(s)
+                t_parse += time.time() - dt
+
+            dt = time.time()
+            osd = svc.ocr_screen(path, SCREEN_CHAIN, SCREEN_SCALE, 0, output_format=fmt)
+            t_screen = time.time() - dt
+
+            words[fmt] = word_keys(doc)
+            data[fmt] = (osd.type, osd.data)
+            totals[fmt]["ocr"] += t_ocr / repeat
+            totals[fmt]["parse"] += t_parse / repeat
+            totals[fmt]["size"] += len(s)
+            totals[fmt]["screen"] += t_screen
+            click.echo(f"    {fmt:5} ocr={t_ocr * 1000 / repeat:8.1f} ms, "
+                       f"parse={t_parse * 1000 / repeat:7.1f} ms, "
+                       f"size={len(s):7} bytes, words={len(doc.words):4}, "
+                       f"ocr_screen={t_screen * 1000:8.1f} ms")
+
+        same_words = words[formats[0]] == words[formats[1]]
+        same_data = data[formats[0]] == data[formats[1]]
+        if not same_words or not same_data:
+            mismatches += 1
+        click.echo(f"    words match: {same_words}, screen data match: {same_data}")
+
+    click.echo("--------------------------------------")
+    count = max(1, len(images))
+    for fmt in formats:
+        t = totals[fmt]
+        click.echo(f"{fmt:5} avg ocr={t['ocr'] * 1000 / count:8.1f} ms, "
+                   f"parse={t['parse'] * 1000 / count:7.1f} ms, "
+                   f"size={int(t['size'] / count):7} bytes, "
+                   f"ocr_screen={t['screen'] * 1000 / count:8.1f} ms")
+    click.echo(f"Mismatched images: {mismatches}")
+    click.echo("--------------------------------------")
+    click.echo("Done.")
+
+
+@main.command("parser",
+              help='Compare BeautifulSoup (parse) and single pass expat (parse_stream) '
+                   'hOCR parsers on prisma hOCR of screen images: parse time and '
+                   'document equality.')
+@click.option('--path-data', default='data/screen_data',
+              help='Path to screen data directory. Default is data/screen_data')
+@click.option('--repeat', type=int, default=10,
+              help='Number of parse runs per image and parser. Default is 10.')
+@click.option('--max-count', type=int, default=-1,
+              help='Specify max screen images to be processed. Default is -1.')
+@click.option('--verbose', is_flag=True,
+              help='Keep application logging at configured level')
+def parser(path_data, repeat, max_count, verbose):
+    init(not verbose)
+    svc: OcrService = OcrFactory.get_service()
+    cfg = parse_tesseract_config(AppConfig.instance.TESSERACT_HOCR_CONFIG)
+    parsers = {"soup": lambda s: HocrParser().parse(s),
+               "stream": lambda s: HocrParser().parse_stream(s)}
+    images = list_images(path_data)
+    if max_count > 0:
+        images = images[:max_count]
+
+    click.echo(f"Engine: {svc.engine.name}, images count: {len(images)}, "
+               f"repeat: {repeat}")
+    totals = {name: 0.0 for name in parsers}
+    mismatches = 0
+
+    for path in images:
+        s = svc.engine.hocr(svc.preprocess(path, SCREEN_CHAIN), cfg)
+        docs = {}
+        for name, parse in parsers.items():
+            dt = time.time()
+            for _ in range(repeat):
+                docs[name] = parse(s)
+            t = (time.time() - dt) / repeat
+            totals[name] += t
+            click.echo(f"{os.path.basename(path)} {name:6} parse={t * 1000:7.1f} ms, "
+                       f"size={len(s):7} bytes, words={len(docs[name].words):4}")
+
+        same = all(dump(getattr(docs["soup"], a)) == dump(getattr(docs["stream"], a))
+                   for a in ("pages", "lines", "words"))
+        if not same:
+            mismatches += 1
+        click.echo(f"    documents match: {same}")
+
+    click.echo("--------------------------------------")
+    count = max(1, len(images))
+    for name in parsers:
+        click.echo(f"{name:6} avg parse={totals[name] * 1000 / count:7.1f} ms")
+    click.echo(f"Mismatched images: {mismatches}")
+    click.echo("--------------------------------------")
+    click.echo("Done.")
+
+
+def tile_rows(doc: HocrParser.Document, match: ModelMatch, item: Item,
+              copies: int) -> tuple:
+    """Returns document with LIST item rows tiled copies times below each
+    other and model copy with LIST item extended to all tiled rows.
+    """
+    rc: Rect = item.rect.copy().scale(match.scale_x, match.scale_y)
+    rc.offset(match.offset_x, match.offset_y)
+    rows = HocrParser.Document()
+    height = rc.bottom - rc.top
+    for k in range(copies):
+        for w in doc.words:
+            if k and not rc.contains(Rect.from_bbox(w.bbox).center()):
+                continue
+            w2 = HocrParser.OcrxWord()
+            w2.id, w2.text, w2.x_wconf = w.id, w.text, w.x_wconf
+            w2.bbox = HocrParser.BBox()
+            w2.bbox.left, w2.bbox.right = w.bbox.left, w.bbox.right
+            dy = k * height
+            w2.bbox.top, w2.bbox.bottom = w.bbox.top + dy, w.bbox.bottom + dy
+            rows.add_word(w2)
+
+    model: Model = copy.deepcopy(match.model)
+    item2 = next(item2 for item2 in model.form.items if item2.id == item.id)
+    item2.rect.bottom = item2.rect.top + (item2.rect.bottom - item2.rect.top) * copies
+    match2 = match.copy()
+    match2.model = model
+    return rows, match2
+
+
+@main.command("extract",
+              help='Compare word to model item assignment engines (EXTRACT_ENGINE) by '
+                   'ModelService.get_data_as_dict time on LIST model with many rows.')
+@click.option('--model', 'screen_type', default='dot-cockpit-editor',
+              help='Screen type of model with LIST item, its image is OCR-ed. '
+                   'Default is dot-cockpit-editor')
+@click.option('--copies', type=int, default=20,
+              help='LIST rows are tiled this number of times. Default is 20.')
+@click.option('--repeat', type=int, default=20,
+              help='Number of get_data_as_dict runs per engine. Default is 20.')
+@click.option('--verbose', is_flag=True,
+              help='Keep application logging at configured level')
+def extract(screen_type, copies, repeat, verbose):
+    init(not verbose)
+    svc: OcrService = OcrFactory.get_service()
+    models: ModelService = ModelFactory.get_service()
+    model: Model = models.find_by_screen_type(screen_type)
+    if not model:
+        raise click.BadParameter(f"model not found: {screen_type}")
+    path = models.get_image_path(model)
+    cfg = parse_tesseract_config(AppConfig.instance.TESSERACT_HOCR_CONFIG)
+    doc = svc.ocr_doc(svc.preprocess(path, SCREEN_CHAIN), cfg)
+    match: ModelMatch = models.find_by_hocr(doc, SCREEN_SCALE)
+    if not match:
+        raise click.ClickException(f"model is not matched on its image: {path}")
+    items = [item for item in model.form.items if item.type == ItemType.LIST]
+    item = next((item for item in items if item.row_height), None)
+    if not item:
+        raise click.BadParameter(f"model has no LIST item: {screen_type}")
+    doc, match = tile_rows(doc, match, item, copies)
+    rows = len(range(item.rect.top, item.rect.bottom, item.row_height)) * copies
+    click.echo(f"Model: {screen_type}, words: {len(doc.words)}, list rows: {rows}, "
+               f"items: {len(models.get_data_rects(match))}, repeat: {repeat}")
+
+    engines = [ModelService.EXTRACT_ENGINE_SCAN, ModelService.EXTRACT_ENGINE_GRID,
+               ModelService.EXTRACT_ENGINE_VECTOR]
+    results = {}
+    for engine in engines:
+        dt = time.time()
+        for _ in range(repeat):
+            results[engine] = models.get_data_as_dict(doc, match, engine)
+        t = (time.time() - dt) / repeat
+        click.echo(f"{engine:6} get_data_as_dict={t * 1000:8.2f} ms")
+
+    same = all(results[engine] == results[engines[0]] for engine in engines)
+    click.echo("--------------------------------------")
+    click.echo(f"Results match: {same}")
+    click.echo("Done.")
+
+
+def synthetic_models(models: list, count: int) -> list:
+    """Returns count copies of models with random control point texts, so
+    they are never matched.
+    """
+    rnd = random.Random(count)
+    res = []
+    for k in range(count):
+        model: Model = copy.deepcopy(models[k % len(models)])
+        model.id = model.screen_type = f"synthetic-{k}"
+        item = model.form.find_control_point() if model.form else None
+        if item:
+            words = ["".join(rnd.choice(string.ascii_lowercase) for _ in range(6))
+                     for _ in range(2)]
+            item.text = [" ".join(words)]
+        res.append(model)
+    return res
+
+
+@main.command("match",
+              help='Compare control point match engines (MATCH_ENGINE) and modes '
+                   '(MATCH_MODE) by ModelService.find_by_hocr time on model images '
+                   'while model library grows with never matched models.')
+@click.option('--sizes', default='0,100,1000',
+              help='Comma separated numbers of synthetic models registered before real '
+                   'ones. Default is 0,100,1000')
+@click.option('--repeat', type=int, default=5,
+              help='Number of find_by_hocr runs per image, size and engine. '
+                   'Default is 5.')
+@click.option('--verbose', is_flag=True,
+              help='Keep application logging at configured level')
+def match(sizes, repeat, verbose):
+    init(not verbose)
+    svc: OcrService = OcrFactory.get_service()
+    models: ModelService = ModelFactory.get_service()
+    cfg = parse_tesseract_config(AppConfig.instance.TESSERACT_HOCR_CONFIG)
+    docs = [svc.ocr_doc(svc.preprocess(models.get_image_path(model), SCREEN_CHAIN), cfg)
+            for model in models.models]
+    click.echo(f"Models: {len(models.models)}, images: {len(docs)}, repeat: {repeat}")
+
+    runs = [(ModelService.MATCH_ENGINE_SCAN, ModelService.MATCH_MODE_FIRST),
+            (ModelService.MATCH_ENGINE_INDEX, ModelService.MATCH_MODE_FIRST),
+            (ModelService.MATCH_ENGINE_INDEX, ModelService.MATCH_MODE_BEST)]
+    same = True
+    for size in [int(size) for size in sizes.split(",")]:
+        library = ModelService()
+        for model in synthetic_models(models.models, size) + models.models:
+            library.add(model)
+        results = {}
+        for engine, mode in runs:
+            dt = time.time()
+            for _ in range(repeat):
+                find = library.find_by_hocr
+                results[mode, engine] = [find(doc, SCREEN_SCALE, engine, mode)
+                                         for doc in docs]
+            t = (time.time() - dt) / repeat / len(docs)
+            click.echo(f"models={len(library.models):6} {engine:5} {mode:5} "
+                       f"find_by_hocr={t * 1000:8.2f} ms")
+        # the same models are matched in all modes, model images differ enough
+        keys = {run: [m and (m.model.id, m.offset_x, m.offset_y) for m in matches]
+                for run, matches in results.items()}
+        same = same and all(v == keys[runs[0][::-1]] for v in keys.values())
+
+    click.echo("--------------------------------------")
+    click.echo(f"Results match: {same}")
+    click.echo("Done.")
+
+
+@main.command("classify",
+              help='Compare screen classification by reference image fingerprints '
+                   '(CLASSIFIER_MODE) with caption OCR by time and found model '
+                   'position.')
+@click.option('--path-data', default='data/screen_data',
+              help='Path to screen data directory. Default is data/screen_data')
+@click.option('--repeat', type=int, default=20,
+              help='Number of classifications per image. Default is 20.')
+@click.option('--verbose', is_flag=True,
+              help='Keep application logging at configured level')
+def classify(path_data, repeat, verbose):
+    init(not verbose)
+    svc: OcrService = OcrFactory.get_service()
+    models: ModelService = ModelFactory.get_service()
+    models.build_classifier(AppConfig.instance.CLASSIFIER_THRESHOLD,
+                            ModelFactory.get_frame_sizes())
+    click.echo(f"Screens: {len(models.classifier.fingerprints)}, repeat: {repeat}")
+    for path in list_images(path_data):
+        image = ScreenClassifier.load_gray(path)
+        dt = time.time()
+        for _ in range(repeat):
+            screen = models.classifier.classify(image)
+        t = (time.time() - dt) / repeat
+        dt = time.time()
+        match: ModelMatch = svc.ocr_caption(path)
+        t2 = time.time() - dt
+        found = screen and (screen.model.id, screen.x, screen.y, round(screen.score, 3))
+        found2 = match and (match.model.id, match.offset_x, match.offset_y)
+        click.echo(f"{Path(path).name}: classify={t * 1000:6.2f} ms {found}, "
+                   f"caption OCR={t2 * 1000:7.2f} ms {found2}")
+    click.echo("--------------------------------------")
+    click.echo("Done.")
+
+
+if __name__ == "__main__":
+    main()
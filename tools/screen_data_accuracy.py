@@ -16,6 +16,15 @@ logger.setLevel(logging.INFO)
 logger.debug(f"name={__name__}")
 
 
+MIMETYPES = {
+    '.png': 'image/png',
+    '.tif': 'image/tiff',
+    '.tiff': 'image/tiff',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+}
+
+
 def calc_str_mismatch(v0, v1) -> float:
     res: float = 0.0
     if v0 and v1 and isinstance(v0, str) and isinstance(v1, str):
@@ -47,19 +56,11 @@ def validate_screen(noisseur_api_url: str, upload_image: bool,
 
     if upload_image:
         ext = os.path.splitext(path_image)[1]
-        mimetypes = {
-            '.png': 'image/png',
-            '.tif': 'image/tiff',
-            '.tiff': 'image/tiff',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-        }
-
         params = None
         files = {
             "screen": (os.path.basename(path_image),
                        open(path_image, 'rb'),
-                       mimetypes[ext])
+                       MIMETYPES[ext])
         }
     else:
         files = None
@@ -91,6 +92,14 @@ def validate_screen(noisseur_api_url: str, upload_image: bool,
     logger.debug(dts)
     dt = int(dt * 1000) / 1000.0
 
+    res = response.json() if response.status_code == 200 else None
+    return compare_screen_data(res, data0, dt, verbose)
+
+
+def compare_screen_data(res: dict, data0: dict, dt: float, verbose: bool):
+    """Compares get_screen_data response (None on HTTP error) with
+    expected screen data.
+    """
     c_all: int = 1
     c_match: float = 0
 
@@ -100,8 +109,7 @@ def validate_screen(noisseur_api_url: str, upload_image: bool,
     c_nn_field: int = 0
     c_nn_strict_match: int = 0
 
-    if response.status_code == 200:
-        res = response.json()
+    if res:
         model_type1 = res["type"]
         model_data1 = res["data"]
         logger.debug(f"model type: {model_type1}")
@@ -159,6 +167,65 @@ def validate_screen(noisseur_api_url: str, upload_image: bool,
     }
 
 
+def validate_batch(noisseur_api_url: str, upload_image: bool,
+                   cases: list, verbose: bool):
+    """Validates list of (path_image, path_json) cases with one
+    get_screen_data_batch request, results are read from JSON Lines
+    stream as they arrive, time of each case is time since previous line.
+    """
+    logger.debug(f"validate_batch(..., count={len(cases)})")
+
+    if upload_image:
+        params = None
+        files = [("screens", (os.path.basename(path_image),
+                              open(path_image, 'rb'),
+                              MIMETYPES[os.path.splitext(path_image)[1]]))
+                 for path_image, _ in cases]
+    else:
+        files = None
+        params = {
+            "paths": [path_image for path_image, _ in cases]
+        }
+
+    url = f"{noisseur_api_url}/get_screen_data_batch"
+
+    if verbose:
+        click.echo(f"    POST {url}, count={len(cases)}")
+
+    dt = time.time()
+    response = requests.post(f"{url}",
+                             params=params,
+                             headers={'accept': 'application/x-ndjson'},
+                             files=files,
+                             stream=True,
+                             verify=False  # NOTE: This should be only used
+                             # with local self-signed
+                             # certificates and not in
+                             # production environment
+                             )
+
+    lines = response.iter_lines() if response.status_code == 200 else []
+    for line in lines:
+        if not line:
+            continue
+        res = json.loads(line)
+        t = time.time()
+        dt, dt1 = t, t - dt
+        dt1 = int(dt1 * 1000) / 1000.0
+        path_image, path_json = cases[res["index"]]
+        if verbose:
+            click.echo(f"    {path_image}")
+            click.echo(f"    {path_json}")
+        with open(path_json, 'r') as json_file:
+            data0 = json.load(json_file)
+        yield res["index"], compare_screen_data(res, data0, dt1, verbose)
+
+    if response.status_code != 200:
+        click.echo(f"    batch failed: HTTP {response.status_code}", err=True)
+        for index in range(len(cases)):
+            yield index, compare_screen_data(None, {}, 0.0, verbose)
+
+
 @click.command(help='OCR screen_data accuracy measure tool. '
                     'Works against running con/noisseur server.')
 @click.option('--noisseur-api-url',
@@ -175,9 +242,15 @@ def validate_screen(noisseur_api_url: str, upload_image: bool,
               help='Specify max screen data cases to be processed. Default is -1.',
               type=int,
               default=-1)
+@click.option('--batch-size',
+              help='Send screens in batches of specified size via '
+                   'get_screen_data_batch. Default is 1, i.e. one get_screen_data '
+                   'request per screen.',
+              type=int,
+              default=1)
 @click.option('--verbose', is_flag=True,
               help='Provide detailed information to output console')
-def main(noisseur_api_url, path_data, upload_image, max_count, verbose):
+def main(noisseur_api_url, path_data, upload_image, max_count, batch_size, verbose):
     logger.debug("screen_data_accuracy.py tool")
     logger.debug(f" noisseur_api_url={noisseur_api_url}")
     logger.debug(f" path_data={path_data}")
@@ -201,15 +274,28 @@ def main(noisseur_api_url, path_data, upload_image, max_count, verbose):
     total_nn_strict_match: float = 0.0
     total_time_sec: float = 0.0
 
-    for index, image in enumerate(images):
-        if 0 < max_count <= index:
-            break
-        click.echo(f"[{index}]: {image}")
-        path_image = os.path.join(path_data, image)
-        path_json = os.path.join(path_data, os.path.splitext(image)[0] + '.json')
-        logger.debug(f" {path_image}, {path_json}")
-        res = validate_screen(noisseur_api_url, bool(upload_image),
-                              path_image, path_json, bool(verbose))
+    if max_count > 0:
+        images = images[:max_count]
+
+    cases = [(os.path.join(path_data, image),
+              os.path.join(path_data, os.path.splitext(image)[0] + '.json'))
+             for image in images]
+
+    def results():
+        if batch_size > 1:
+            for start in range(0, len(cases), batch_size):
+                batch = cases[start:start + batch_size]
+                for index, res in validate_batch(noisseur_api_url, bool(upload_image),
+                                                 batch, bool(verbose)):
+                    yield start + index, res
+        else:
+            for index, (path_image, path_json) in enumerate(cases):
+                logger.debug(f" {path_image}, {path_json}")
+                yield index, validate_screen(noisseur_api_url, bool(upload_image),
+                                             path_image, path_json, bool(verbose))
+
+    for index, res in results():
+        click.echo(f"[{index}]: {images[index]}")
         accuracy = res["accuracy"]
         strict_match = res["strict_match"]
         nn_strict_match = res["nn_strict_match"]